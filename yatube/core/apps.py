@@ -1,5 +1,21 @@
 from django.apps import AppConfig
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .auth import invalidate_user
+        from .holes import register_hole
+        from .sessions import write_behind
+        from .sqlite import configure_connection
+        register_hole('header_nav', 'includes/header_nav.html')
+        connection_created.connect(configure_connection)
+        request_finished.connect(write_behind)
+        User = get_user_model()
+        post_save.connect(invalidate_user, sender=User)
+        post_delete.connect(invalidate_user, sender=User)
@@ -0,0 +1,34 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .caches import is_shared
+
+USER_CACHE_TIMEOUT: int = 60 * 60
+
+
+def _user_key(user_id) -> str:
+    return f'core:user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берёт пользователя сессии из кеша.
+
+    Запись сбрасывается при сохранении и удалении пользователя
+    (см. invalidate_user). Сброс должен дойти до всех процессов, поэтому
+    с локальным LocMemCache пользователь читается из базы.
+    """
+
+    def get_user(self, user_id):
+        if not is_shared(cache):
+            return super().get_user(user_id)
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, USER_CACHE_TIMEOUT)
+        return user
+
+
+def invalidate_user(sender, instance, **kwargs):
+    cache.delete(_user_key(instance.pk))
@@ -0,0 +1,26 @@
+"""Общие и локальные кеши.
+
+LocMemCache живёт в памяти процесса: запись или удаление ключа в одном
+процессе сервера не видны остальным. Данные, которые сбрасываются из
+любого процесса, в таком кеше держатся не дольше LOCAL_CACHE_TIMEOUT
+секунд (shared_timeout) или не кешируются вовсе (is_shared).
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, DefaultCacheProxy, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(cache) -> bool:
+    """Видят ли записи в cache все процессы сервера."""
+    if isinstance(cache, DefaultCacheProxy):
+        cache = caches[DEFAULT_CACHE_ALIAS]
+    return not isinstance(cache, LocMemCache)
+
+
+def shared_timeout(cache, timeout):
+    """Таймаут записи, которую могут сбросить в другом процессе."""
+    if is_shared(cache):
+        return timeout
+    if timeout is None:
+        return settings.LOCAL_CACHE_TIMEOUT
+    return min(timeout, settings.LOCAL_CACHE_TIMEOUT)
@@ -0,0 +1,65 @@
+"""Персональные «дырки» в общих страницах.
+
+Шаблоны выводят вместо персональных кусков (шапка, форма комментария,
+кнопка подписки) метку-заглушку, а HoleMiddleware заполняет метки для
+текущего пользователя. Поэтому остальная страница одинакова для всех
+и может целиком лежать в кеше (см. posts.conditional.skeleton_cache).
+"""
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+
+HOLE_RE = re.compile(r'<!--hole:(?P<name>[\w-]+):(?P<params>[^>]*)-->')
+
+_holes = {}
+
+
+def register_hole(name, template_name, get_context=None):
+    """Регистрирует дырку.
+
+    get_context(request, **params) возвращает контекст шаблона дырки.
+    Параметры приходят строками из метки.
+    """
+    _holes[name] = (template_name, get_context)
+
+
+def placeholder(name, params=None) -> str:
+    if name not in _holes:
+        raise KeyError(f'Неизвестная дырка {name!r}')
+    return f'<!--hole:{name}:{urlencode(params or {})}-->'
+
+
+def render_hole(request, name, params) -> str:
+    template_name, get_context = _holes[name]
+    context = get_context(request, **params) if get_context else {}
+    return render_to_string(template_name, context, request=request)
+
+
+def fill_holes(content: str, request) -> str:
+    return HOLE_RE.sub(
+        lambda match: render_hole(
+            request, match['name'], dict(parse_qsl(match['params']))
+        ),
+        content
+    )
+
+
+class HoleMiddleware:
+    """Заполняет дырки в HTML-ответах."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            not response.streaming
+            and response.get('Content-Type', '').startswith('text/html')
+            and b'<!--hole:' in response.content
+        ):
+            charset = response.charset
+            response.content = fill_holes(
+                response.content.decode(charset), request
+            ).encode(charset)
+        return response
@@ -0,0 +1,154 @@
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+BENCH_USERNAME = 'sqlite-benchmark'
+
+# Настройки SQLite по умолчанию для сравнения.
+BASELINE_SETTINGS = {
+    'SQLITE_PRAGMAS': {'journal_mode': 'DELETE', 'busy_timeout': 0},
+    'SQLITE_SERIALIZE_WRITES': False,
+}
+
+# Прогон идёт в одной временной базе: без реплик и шардов, со своими
+# кешами и без кеша каркасов, чтобы чтение профиля доходило до базы.
+RUN_SETTINGS = {
+    'DATABASE_REPLICAS': [],
+    'POSTS_SHARDS': [DEFAULT_DB_ALIAS],
+    'PAGE_SKELETON_CACHE_TIMEOUT': 0,
+}
+
+
+def run_caches() -> dict:
+    return {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'sqlite-benchmark-{alias}',
+        }
+        for alias in settings.CACHES
+    }
+
+
+class Command(BaseCommand):
+    help = ('Нагружает базу параллельными комментариями и чтением профиля, '
+            'выводит пропускную способность записи и p99 чтения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность в секундах.'
+        )
+        parser.add_argument(
+            '--baseline', action='store_true',
+            help='Без WAL, busy_timeout, очереди и повторов записи.'
+        )
+
+    def handle(self, *args, **options):
+        overrides = BASELINE_SETTINGS if options['baseline'] else {}
+        database = connections.databases[DEFAULT_DB_ALIAS]
+        name = database['NAME']
+        directory = tempfile.mkdtemp()
+        # Прагмы ставятся на новые соединения.
+        connections.close_all()
+        database['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        try:
+            with override_settings(ALLOWED_HOSTS=['*'], CACHES=run_caches(),
+                                   **RUN_SETTINGS, **overrides):
+                call_command('migrate', verbosity=0)
+                user = User.objects.create_user(username=BENCH_USERNAME)
+                post = Post.objects.create(
+                    author=user, text='Нагрузочный тест'
+                )
+                results = self.run(user, post, options)
+        finally:
+            connections.close_all()
+            database['NAME'] = name
+            shutil.rmtree(directory)
+        self.report(results, options['duration'])
+
+    def run(self, user, post, options):
+        self.results = {'writes': 0, 'write_errors': 0, 'read_errors': 0,
+                        'reads': []}
+        self.lock = threading.Lock()
+        comment_url = reverse('posts:add_comment', args=(post.pk,))
+        profile_url = reverse('posts:profile', args=(user.username,))
+        writers = []
+        for _ in range(options['writers']):
+            client = Client()
+            client.force_login(user)
+            writers.append(threading.Thread(
+                target=self.worker, args=(self.write, client, comment_url)
+            ))
+        readers = [
+            threading.Thread(
+                target=self.worker, args=(self.read, Client(), profile_url)
+            )
+            for _ in range(options['readers'])
+        ]
+        self.deadline = time.monotonic() + options['duration']
+        for thread in writers + readers:
+            thread.start()
+        for thread in writers + readers:
+            thread.join()
+        return self.results
+
+    def worker(self, target, client, url):
+        try:
+            while time.monotonic() < self.deadline:
+                target(client, url)
+        finally:
+            connections.close_all()
+
+    def write(self, client, url):
+        try:
+            client.post(url, {'text': 'Комментарий'})
+        except Exception:
+            outcome = 'write_errors'
+        else:
+            outcome = 'writes'
+        with self.lock:
+            self.results[outcome] += 1
+
+    def read(self, client, url):
+        started = time.perf_counter()
+        try:
+            client.get(url)
+        except Exception:
+            with self.lock:
+                self.results['read_errors'] += 1
+            return
+        with self.lock:
+            self.results['reads'].append(time.perf_counter() - started)
+
+    def report(self, results, duration):
+        reads = sorted(results['reads'])
+        self.stdout.write(
+            f'Записей: {results["writes"]} '
+            f'({results["writes"] / duration:.1f}/с), '
+            f'ошибок записи: {results["write_errors"]}, '
+            f'ошибок чтения: {results["read_errors"]}'
+        )
+        if len(reads) > 1:
+            p99 = statistics.quantiles(reads, n=100)[98]
+            self.stdout.write(
+                f'Чтений: {len(reads)}, '
+                f'p50 {statistics.median(reads) * 1000:.1f} мс, '
+                f'p99 {p99 * 1000:.1f} мс'
+            )
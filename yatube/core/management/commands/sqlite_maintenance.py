@@ -0,0 +1,88 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Обслуживает SQLite-базы: ANALYZE, инкрементальный VACUUM '
+            'и контрольные точки WAL по расписанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить все задачи один раз и выйти.'
+        )
+        parser.add_argument(
+            '--analyze-every', type=float, default=60 * 60,
+            help='Период ANALYZE в секундах.'
+        )
+        parser.add_argument(
+            '--vacuum-every', type=float, default=24 * 60 * 60,
+            help='Период инкрементального VACUUM в секундах.'
+        )
+        parser.add_argument(
+            '--vacuum-pages', type=int, default=1000,
+            help='Сколько свободных страниц освобождать за раз.'
+        )
+        parser.add_argument(
+            '--checkpoint-every', type=float, default=5 * 60,
+            help='Период контрольной точки WAL в секундах.'
+        )
+
+    def handle(self, *args, **options):
+        tasks = {
+            self.analyze: options['analyze_every'],
+            self.vacuum: options['vacuum_every'],
+            self.checkpoint: options['checkpoint_every'],
+        }
+        due = dict.fromkeys(tasks, 0)
+        while True:
+            for task, period in tasks.items():
+                if time.monotonic() >= due[task]:
+                    for alias in self.get_aliases():
+                        task(alias, options)
+                    due[task] = time.monotonic() + period
+            if options['once']:
+                break
+            time.sleep(max(min(due.values()) - time.monotonic(), 1))
+
+    def get_aliases(self):
+        """SQLite-базы, кроме реплик: их перезаписывает sync_replicas."""
+        return [
+            alias for alias in connections
+            if connections[alias].vendor == 'sqlite'
+            and alias not in settings.DATABASE_REPLICAS
+        ]
+
+    def execute_pragma(self, alias, sql):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchall()
+
+    def analyze(self, alias, options):
+        self.execute_pragma(alias, 'ANALYZE')
+        self.stdout.write(f'{alias}: ANALYZE')
+
+    def vacuum(self, alias, options):
+        (mode,), = self.execute_pragma(alias, 'PRAGMA auto_vacuum')
+        if mode != 2:
+            # Режим INCREMENTAL включается только полным VACUUM.
+            self.execute_pragma(alias, 'PRAGMA auto_vacuum = INCREMENTAL')
+            self.execute_pragma(alias, 'VACUUM')
+            self.stdout.write(f'{alias}: включён инкрементальный VACUUM')
+            return
+        self.execute_pragma(
+            alias, f'PRAGMA incremental_vacuum({options["vacuum_pages"]})'
+        )
+        self.stdout.write(f'{alias}: инкрементальный VACUUM')
+
+    def checkpoint(self, alias, options):
+        (busy, log, done), = self.execute_pragma(
+            alias, 'PRAGMA wal_checkpoint(TRUNCATE)'
+        )
+        self.stdout.write(
+            f'{alias}: контрольная точка WAL, страниц {done}/{log}'
+            + (' (база занята)' if busy else '')
+        )
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replicas import sync_replicas
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную SQLite-базу в реплики (замена репликации).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять копирование каждые N секунд.'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                'Реплики не настроены, см. YATUBE_DB_REPLICAS в settings.py'
+            )
+        while True:
+            sync_replicas()
+            self.stdout.write(
+                f'Реплики обновлены: {", ".join(settings.DATABASE_REPLICAS)}'
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
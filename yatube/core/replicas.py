@@ -0,0 +1,129 @@
+"""Чтение с реплик базы данных.
+
+ReplicaRouter отправляет чтения моделей posts и auth на реплики из
+settings.DATABASE_REPLICAS, а запись - в основную базу. Весь запрос
+читает одну реплику (current_replica), поэтому данные страницы и
+отметки лент (posts.markers) берутся из одного снимка базы. После
+записи пользователь на REPLICA_PIN_SECONDS закрепляется за основной
+базой (cookie ставит ReplicaPinningMiddleware), чтобы сразу видеть свои
+изменения, даже если реплики ещё не догнали основную базу.
+"""
+import random
+import sqlite3
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_state = threading.local()
+
+
+def is_pinned() -> bool:
+    return getattr(_state, 'pinned', False)
+
+
+def pin_primary() -> None:
+    """Читать из основной базы до конца запроса."""
+    _state.pinned = True
+
+
+def current_replica():
+    """Реплика, которую читает текущий запрос; None - основная база."""
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas or is_pinned():
+        return None
+    replica = getattr(_state, 'replica', None)
+    if replica not in replicas:
+        replica = _state.replica = random.choice(replicas)
+    return replica
+
+
+def reset_state(pinned=False) -> None:
+    _state.pinned = pinned
+    _state.wrote = False
+    _state.replica = None
+
+
+def has_written() -> bool:
+    return getattr(_state, 'wrote', False)
+
+
+class ReplicaRouter:
+    route_app_labels = {'posts', 'auth'}
+    # Служебные строки пишутся и при чтении страниц: отметки лент,
+    # просмотры и популярное. Запись в них не закрепляет клиента.
+    internal_models = {
+        'posts.changemarker', 'posts.viewcounter', 'posts.trendingentry',
+    }
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in self.route_app_labels:
+            return current_replica()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in self.route_app_labels:
+            return None
+        if model._meta.label_lower not in self.internal_models:
+            pin_primary()
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """Закрепляет клиента за основной базой после записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset_state(
+            pinned=(
+                request.method not in SAFE_METHODS
+                or PIN_COOKIE in request.COOKIES
+            )
+        )
+        try:
+            response = self.get_response(request)
+            if has_written():
+                response.set_cookie(
+                    PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_PIN_SECONDS,
+                    httponly=True,
+                    samesite='Lax',
+                )
+            return response
+        finally:
+            reset_state()
+
+
+def sync_replicas(source=DEFAULT_DB_ALIAS, replicas=None):
+    """Копирует основную SQLite-базу в файлы реплик.
+
+    Заменяет настоящую репликацию при локальной проверке: реплики
+    отстают от основной базы до следующего вызова.
+    """
+    source_name = connections[source].settings_dict['NAME']
+    for alias in replicas or settings.DATABASE_REPLICAS:
+        replica_name = connections[alias].settings_dict['NAME']
+        src = sqlite3.connect(source_name)
+        dst = sqlite3.connect(replica_name)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
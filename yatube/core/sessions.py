@@ -0,0 +1,66 @@
+"""Сессии в кеше с отложенной записью в базу.
+
+Сессия читается из кеша, а в базу пишется после отправки ответа
+(сигнал request_finished), поэтому запрос не ждёт записи. База нужна,
+чтобы сессия пережила вытеснение из кеша или его перезапуск.
+
+Кеш сессий должен быть общим для процессов сервера: выход и сброс
+сессии в одном процессе должны действовать во всех. С локальным
+LocMemCache сессия читается и пишется прямо в базе.
+"""
+import threading
+
+from django.contrib.sessions.backends.cached_db import (
+    SessionStore as CachedDBStore
+)
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+from .caches import is_shared
+
+_pending = threading.local()
+
+
+def _get_pending() -> dict:
+    if not hasattr(_pending, 'stores'):
+        _pending.stores = {}
+    return _pending.stores
+
+
+class SessionStore(CachedDBStore):
+    def load(self):
+        if not is_shared(self._cache):
+            return DBStore.load(self)
+        data = super().load()
+        self._loaded_data = dict(data)
+        return data
+
+    def save(self, must_create=False):
+        if not is_shared(self._cache):
+            return DBStore.save(self, must_create=must_create)
+        if self.session_key is None or must_create:
+            # Новый ключ должен быть уникальным в базе - пишем сразу.
+            return super().save(must_create=must_create)
+        data = self._get_session()
+        if data == getattr(self, '_loaded_data', None):
+            return None
+        self._cache.set(self.cache_key, data, self.get_expiry_age())
+        self._loaded_data = dict(data)
+        _get_pending()[self.session_key] = self
+        return None
+
+    def delete(self, session_key=None):
+        _get_pending().pop(session_key or self.session_key, None)
+        super().delete(session_key)
+
+
+def write_behind(sender, **kwargs):
+    """Обработчик request_finished: записывает сессии запроса в базу."""
+    stores = _get_pending()
+    while stores:
+        _, store = stores.popitem()
+        try:
+            DBStore.save(store)
+        except UpdateError:
+            # Строки в базе нет: сессия была только в кеше.
+            DBStore.save(store, must_create=True)
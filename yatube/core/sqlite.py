@@ -0,0 +1,67 @@
+"""SQLite под конкурентной нагрузкой.
+
+configure_connection ставит на каждое новое соединение прагмы из
+settings.SQLITE_PRAGMAS: WAL не даёт читателям ждать писателей,
+busy_timeout заставляет писателя ждать блокировку, а не падать сразу.
+serialized_write выстраивает записи процесса в очередь и повторяет
+запись, если базу всё же занял другой процесс.
+"""
+import random
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+_write_lock = threading.Lock()
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked_error(error) -> bool:
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def _writable_databases() -> list:
+    return [alias for alias in connections
+            if alias not in settings.DATABASE_REPLICAS]
+
+
+def serialized_write(write):
+    """Выполняет запись в транзакции, по одной записи в процессе.
+
+    Оборачивает только саму запись в ORM, а не весь view: чтение и
+    отрисовка страницы не ждут блокировку и не держат транзакцию.
+    Транзакции открываются во всех базах, кроме реплик, - запись может
+    уйти в шард. При ошибке «database is locked» транзакции
+    откатываются и запись повторяется до SQLITE_WRITE_RETRIES раз с
+    растущей паузой. SQLITE_SERIALIZE_WRITES = False отключает обёртку.
+    """
+
+    @wraps(write)
+    def wrapper(*args, **kwargs):
+        if not settings.SQLITE_SERIALIZE_WRITES:
+            return write(*args, **kwargs)
+        retries = settings.SQLITE_WRITE_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                with _write_lock, ExitStack() as stack:
+                    for alias in _writable_databases():
+                        stack.enter_context(transaction.atomic(using=alias))
+                    return write(*args, **kwargs)
+            except OperationalError as error:
+                if attempt == retries or not is_locked_error(error):
+                    raise
+            time.sleep(0.05 * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    return wrapper
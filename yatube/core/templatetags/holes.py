@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import placeholder
+
+register = template.Library()
+
+
+@register.simple_tag
+def hole(name, **params):
+    """Метка персонального куска страницы, см. core.holes."""
+    return mark_safe(placeholder(name, params))
@@ -0,0 +1,20 @@
+"""Запуск тестов manage.py test."""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner с выключенным кешем каркасов страниц.
+
+    Тесты проверяют шаблоны и контекст ответов, которых нет у каркаса из
+    кеша. Тесты самого кеша включают его через override_settings.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._skeleton_timeout = settings.PAGE_SKELETON_CACHE_TIMEOUT
+        settings.PAGE_SKELETON_CACHE_TIMEOUT = 0
+
+    def teardown_test_environment(self, **kwargs):
+        settings.PAGE_SKELETON_CACHE_TIMEOUT = self._skeleton_timeout
+        super().teardown_test_environment(**kwargs)
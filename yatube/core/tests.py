@@ -0,0 +1,312 @@
+import shutil
+import tempfile
+from http import HTTPStatus
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import OperationalError, connection
+from django.test import (
+    Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+)
+from django.urls import reverse
+
+from posts.models import ChangeMarker, Post, TrendingEntry, ViewCounter
+
+from .auth import CachedModelBackend
+from .replicas import (PIN_COOKIE, ReplicaRouter, has_written, pin_primary,
+                       reset_state)
+from .sessions import SessionStore
+from .sqlite import serialized_write
+from .warmup import PHASES, warm_up
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        reset_state()
+        self.addCleanup(reset_state)
+        self.router = ReplicaRouter()
+
+    def test_reads_go_to_replicas(self):
+        """Чтение постов и пользователей идёт с реплик."""
+        for model in (Post, User):
+            with self.subTest(model=model):
+                self.assertIn(self.router.db_for_read(model),
+                              ('replica_1', 'replica_2'))
+
+    def test_writes_go_to_primary_and_pin(self):
+        """После записи чтение идёт из основной базы."""
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_request_reads_one_replica(self):
+        """Все чтения запроса идут в одну реплику."""
+        replica = self.router.db_for_read(Post)
+        for _ in range(10):
+            self.assertEqual(self.router.db_for_read(User), replica)
+
+    def test_internal_writes_do_not_pin(self):
+        """Отметки, счётчики и популярное не закрепляют клиента."""
+        for model in (ChangeMarker, TrendingEntry, ViewCounter):
+            with self.subTest(model=model):
+                self.assertEqual(self.router.db_for_write(model), 'default')
+        self.assertFalse(has_written())
+        self.assertIsNotNone(self.router.db_for_read(Post))
+
+    def test_pinned_reads_go_to_primary(self):
+        pin_primary()
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_replicas_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica_1', 'posts'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+
+class ReplicaPinningMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_write_sets_pin_cookie(self):
+        """Запрос с записью закрепляет клиента за основной базой."""
+        response = self.client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_read_does_not_pin(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class SQLiteTests(TestCase):
+    def test_pragmas_applied(self):
+        """Соединение получает прагмы из настроек."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    @override_settings(SQLITE_WRITE_RETRIES=2)
+    @mock.patch('core.sqlite.time.sleep')
+    def test_locked_write_retried(self, sleep):
+        """Запись, упавшая из-за блокировки, повторяется."""
+        view = mock.Mock(side_effect=[
+            OperationalError('database is locked'), 'ok'
+        ])
+        request = RequestFactory().post('/')
+        self.assertEqual(serialized_write(view)(request), 'ok')
+        self.assertEqual(view.call_count, 2)
+
+    @override_settings(SQLITE_WRITE_RETRIES=2)
+    @mock.patch('core.sqlite.time.sleep')
+    def test_retries_limited(self, sleep):
+        view = mock.Mock(side_effect=OperationalError('database is locked'))
+        request = RequestFactory().post('/')
+        with self.assertRaises(OperationalError):
+            serialized_write(view)(request)
+        self.assertEqual(view.call_count, 3)
+
+    def test_lock_held_only_for_write(self):
+        """Форма поста отрисовывается без блокировки записи."""
+        client = Client()
+        client.force_login(User.objects.create_user(username='writer'))
+        with mock.patch('core.sqlite._write_lock') as lock:
+            client.get(reverse('posts:post_create'))
+            lock.__enter__.assert_not_called()
+            client.post(reverse('posts:post_create'), {'text': 'Пост'})
+            lock.__enter__.assert_called_once_with()
+        self.assertTrue(Post.objects.filter(text='Пост').exists())
+
+    @mock.patch('core.sqlite.time.sleep')
+    def test_get_write_retried(self, sleep):
+        """Запись защищена и при GET (подписка по ссылке)."""
+        view = mock.Mock(side_effect=[
+            OperationalError('database is locked'), 'ok'
+        ])
+        request = RequestFactory().get('/')
+        self.assertEqual(serialized_write(view)(request), 'ok')
+        self.assertEqual(view.call_count, 2)
+
+    def test_other_errors_not_retried(self):
+        view = mock.Mock(side_effect=OperationalError('no such table'))
+        request = RequestFactory().post('/')
+        with self.assertRaises(OperationalError):
+            serialized_write(view)(request)
+        self.assertEqual(view.call_count, 1)
+
+
+# Общий для процессов кеш: файловый, как у нескольких воркеров на одной
+# машине.
+SHARED_CACHE_DIR = tempfile.mkdtemp()
+SHARED_CACHES = {
+    **settings.CACHES,
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SHARED_CACHE_DIR,
+    },
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class SessionQueriesTests(TestCase):
+    """Экономия запросов есть только с общим кешем по умолчанию."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(shutil.rmtree, SHARED_CACHE_DIR, True)
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.author, text='Тестовый текст')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_query_budget(self):
+        """Сессия и пользователь не читаются из базы."""
+        budgets = {
+            reverse('posts:index'): 1,
+            reverse('posts:follow_index'): 1,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                # Первый запрос наполняет кеш фрагментов.
+                self.client.get(url)
+                with self.assertNumQueries(budget):
+                    self.client.get(url)
+
+    def test_user_cache_invalidated(self):
+        """После сохранения пользователь перечитывается из базы."""
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        self.assertEqual(
+            backend.get_user(self.user.pk).first_name, 'Новое имя'
+        )
+
+    def test_session_written_behind(self):
+        """Изменённая сессия попадает в базу после ответа."""
+        store = SessionStore(self.client.session.session_key)
+        store['key'] = 'value'
+        store.save()
+        session = Session.objects.get(session_key=store.session_key)
+        self.assertNotIn('key', session.get_decoded())
+        self.client.get(reverse('posts:index'))
+        session.refresh_from_db()
+        self.assertEqual(session.get_decoded()['key'], 'value')
+
+    def test_unmodified_session_not_saved(self):
+        store = SessionStore(self.client.session.session_key)
+        store['_auth_user_id'] = store['_auth_user_id']
+        with self.assertNumQueries(0):
+            store.save()
+
+    def test_invalidated_from_other_process(self):
+        """Выход и смена пароля в другом процессе действуют сразу."""
+        session_key = self.client.session.session_key
+        self.client.get(reverse('posts:index'))
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        # Другой процесс: свой экземпляр того же общего кеша.
+        other_cache = FileBasedCache(SHARED_CACHE_DIR, {})
+        other = SessionStore(session_key)
+        other._cache = other_cache
+        other.delete()
+        user = User.objects.get(pk=self.user.pk)
+        with mock.patch('core.auth.cache', other_cache):
+            user.set_password('new-password')
+            user.save()
+        self.assertEqual(SessionStore(session_key).load(), {})
+        self.assertEqual(backend.get_user(user.pk).password, user.password)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+
+class LocalCacheSessionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+
+    def test_query_budget(self):
+        """По умолчанию сессия и пользователь читаются из базы."""
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('posts:index')
+        client.get(url)
+        with self.assertNumQueries(3):
+            client.get(url)
+
+    def test_local_cache_not_used(self):
+        """С LocMemCache сессия и пользователь читаются из базы."""
+        client = Client()
+        client.force_login(self.user)
+        session_key = client.session.session_key
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        with self.assertNumQueries(1):
+            backend.get_user(self.user.pk)
+        SessionStore(session_key).load()
+        # Выход в другом процессе удаляет сессию из базы.
+        Session.objects.filter(session_key=session_key).delete()
+        self.assertEqual(SessionStore(session_key).load(), {})
+
+
+class WarmupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_phases_are_timed(self):
+        """Каждая фаза прогрева выполняется и попадает в журнал."""
+        with self.assertLogs('core.warmup', 'INFO') as logs:
+            timings = warm_up(WSGIHandler())
+        self.assertEqual(list(timings), list(PHASES))
+        self.assertIn('200 OK', '\n'.join(logs.output))
+
+    @override_settings(WARMUP_PHASES=['broken', 'urls'])
+    def test_failed_phase_does_not_stop_warmup(self):
+        broken = mock.Mock(side_effect=RuntimeError)
+        with mock.patch.dict(PHASES, broken=broken), \
+                self.assertLogs('core.warmup', 'INFO') as logs:
+            timings = warm_up(WSGIHandler())
+        self.assertEqual(list(timings), ['broken', 'urls'])
+        self.assertIn('фаза broken не удалась', logs.output[0])
+
+
+# Фаза pages рисует страницы в своём потоке, ему нужны данные в базе.
+@override_settings(WARMUP_PHASES=['pages'])
+class PagesWarmupTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_phase_fills_local_cache(self):
+        """Фаза pages кладёт главную в LocMemCache самого процесса."""
+        Post.objects.create(
+            author=User.objects.create_user(username='warm'), text='Пост'
+        )
+        with self.assertLogs('core.warmup', 'INFO'):
+            warm_up(WSGIHandler())
+        self.assertIsNotNone(
+            cache.get(make_template_fragment_key('index_page', [1]))
+        )
+        with override_settings(CACHES=SHARED_CACHES), \
+                self.assertLogs('core.warmup', 'INFO') as logs:
+            warm_up(WSGIHandler())
+        self.assertIn('prewarm_cache', logs.output[0])
@@ -0,0 +1,169 @@
+"""Прогрев процесса до приёма запросов.
+
+warm_up вызывается из yatube/wsgi.py и по очереди выполняет фазы из
+settings.WARMUP_PHASES: загружает шаблоны (а с ними библиотеки тегов),
+заполняет URL-резолверы, поднимает sorl-thumbnail и плагины Pillow,
+открывает соединения с базами и кешами, один раз отдаёт главную
+страницу через WSGI-приложение и, если кеш по умолчанию - LocMemCache,
+заполняет его самыми посещаемыми страницами (posts.prewarm): команда
+prewarm_cache в таком кеше ничего не оставит. При gunicorn --preload
+прогретый кеш достаётся рабочим процессам от родителя, без --preload
+каждый процесс прогревает свой. Время каждой фазы пишется в журнал
+core.warmup. Ошибка фазы не мешает запуску: она только попадает в журнал.
+"""
+import io
+import logging
+import os
+import sys
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import connections
+from django.template import engines
+from django.urls import (
+    NoReverseMatch, URLPattern, URLResolver, get_resolver, reverse
+)
+
+logger = logging.getLogger(__name__)
+
+# По нему счётчики (posts.counters) отличают прогрев от посетителей.
+USER_AGENT = 'yatube-warmup'
+
+
+def load_templates(application):
+    """Загружает все шаблоны из каталогов шаблонов проекта."""
+    count = 0
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            if not str(directory).startswith(settings.BASE_DIR):
+                continue
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if name.endswith('.html'):
+                        path = os.path.join(root, name)
+                        engine.get_template(os.path.relpath(path, directory))
+                        count += 1
+    return count
+
+
+def _walk_patterns(resolver, namespace=''):
+    # Резолвер заполняет обратные словари при первом обращении.
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            prefix = (
+                f'{namespace}{pattern.namespace}:' if pattern.namespace
+                else namespace
+            )
+            yield from _walk_patterns(pattern, prefix)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f'{namespace}{pattern.name}'
+
+
+def resolve_urls(application):
+    """Компилирует шаблоны URL и разворачивает имена без аргументов."""
+    names = set(_walk_patterns(get_resolver()))
+    for name in names:
+        try:
+            reverse(name)
+        except NoReverseMatch:
+            pass
+    return len(names)
+
+
+def load_thumbnails(application):
+    from PIL import Image
+    from sorl.thumbnail import default
+    Image.init()
+    return [
+        backend.__class__.__name__
+        for backend in (default.backend, default.engine, default.kvstore)
+    ]
+
+
+def open_connections(application):
+    for alias in connections:
+        connections[alias].ensure_connection()
+    for alias in settings.CACHES:
+        caches[alias].get('core:warmup')
+    return len(connections.databases)
+
+
+def wsgi_get(application, path):
+    """GET path через WSGI-приложение; возвращает статус и размер тела."""
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'HTTP_HOST': settings.ALLOWED_HOSTS[0],
+        'HTTP_USER_AGENT': USER_AGENT,
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    result = application(
+        environ, lambda status, headers, exc_info=None: statuses.append(status)
+    )
+    try:
+        size = sum(len(chunk) for chunk in result)
+    finally:
+        result.close()
+    return statuses[0], size
+
+
+def render_index(application):
+    """GET главной страницы через всю цепочку middleware."""
+    status, size = wsgi_get(application, reverse('posts:index'))
+    return f'{status}, {size} байт'
+
+
+def prewarm_pages(application):
+    """Горячие страницы в кеш процесса, если кеш не общий."""
+    from core.caches import is_shared
+    from posts.prewarm import hot_paths, prewarm
+    if is_shared(caches[DEFAULT_CACHE_ALIAS]):
+        return 'общий кеш, см. manage.py prewarm_cache'
+    paths = hot_paths(**settings.WARMUP_PAGES)
+    results = prewarm(paths, concurrency=1, application=application)
+    return f"{sum(result['pages'] for result in results.values())} стр."
+
+
+PHASES = {
+    'templates': load_templates,
+    'urls': resolve_urls,
+    'thumbnails': load_thumbnails,
+    'connections': open_connections,
+    'index': render_index,
+    'pages': prewarm_pages,
+}
+
+
+def close_connections():
+    """Обработчик перед fork, его ставит yatube/wsgi.py после прогрева."""
+    connections.close_all()
+
+
+def warm_up(application) -> dict:
+    """Выполняет фазы прогрева, возвращает их время в секундах."""
+    timings = {}
+    started = time.perf_counter()
+    for name in settings.WARMUP_PHASES:
+        phase_started = time.perf_counter()
+        try:
+            result = PHASES[name](application)
+        except Exception:
+            logger.exception('Прогрев: фаза %s не удалась', name)
+            result = 'ошибка'
+        timings[name] = time.perf_counter() - phase_started
+        logger.info(
+            'Прогрев: %s - %.1f мс (%s)', name, timings[name] * 1000, result
+        )
+    logger.info(
+        'Прогрев завершён за %.1f мс', (time.perf_counter() - started) * 1000
+    )
+    return timings
@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from .models import RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Последние профили запросов по view."""
+    list_display = ('created', 'view_name', 'method', 'path', 'status',
+                    'duration_ms', 'mode', 'samples')
+    list_filter = ('view_name', 'mode', 'status')
+    search_fields = ('path',)
+    readonly_fields = [field.name for field in RequestProfile._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class DiagnosticsConfig(AppConfig):
+    name = 'diagnostics'
+    verbose_name = 'Диагностика'
+
+    def ready(self):
+        from .sqllog import install
+        connection_created.connect(install)
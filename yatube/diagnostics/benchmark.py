@@ -0,0 +1,201 @@
+"""Нагрузочный прогон страниц posts через WSGI-приложение.
+
+Каждый сценарий - запрос к одному view. Для него измеряются задержка
+(p50/p95/p99), число SQL-запросов, размер ответа и пик выделенной
+памяти. Память считается отдельным проходом: tracemalloc заметно
+замедляет запросы.
+"""
+import math
+import random
+import statistics
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import ExitStack
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.sharding import is_sharded, sharded_posts
+from posts.trending import rebuild
+
+from .drivers import WSGIDriver, session_for
+
+User = get_user_model()
+
+SIZES = {
+    'small': {'users': 20, 'groups': 5, 'posts': 200, 'comments': 1000,
+              'follows': 50},
+    'medium': {'users': 100, 'groups': 20, 'posts': 2000,
+               'comments': 10000, 'follows': 500},
+    'large': {'users': 500, 'groups': 50, 'posts': 20000,
+              'comments': 100000, 'follows': 5000},
+}
+# Метрики, рост которых считается регрессией, и минимальный заметный рост.
+COMPARED_METRICS = {
+    'p95_ms': 1.0,
+    'p99_ms': 1.0,
+    'bytes': 0,
+    'alloc_peak_kb': 16,
+}
+
+Scenario = namedtuple('Scenario', 'name method path data auth')
+
+
+def create_dataset(users, groups, posts, comments, follows, seed=0):
+    """Заполняет базу пользователями bench-N, группами, постами и т.д."""
+    rnd = random.Random(seed)
+    User.objects.bulk_create(
+        User(username=f'bench-{number}') for number in range(users)
+    )
+    Group.objects.bulk_create(
+        Group(title=f'Группа {number}', slug=f'bench-{number}',
+              description='Группа для нагрузочного теста')
+        for number in range(groups)
+    )
+    authors = list(User.objects.filter(username__startswith='bench-'))
+    group_list = [*Group.objects.filter(slug__startswith='bench-'), None]
+    new_posts = [
+        Post(author=rnd.choice(authors), group=rnd.choice(group_list),
+             text=f'Пост {number} ' * rnd.randint(1, 30))
+        for number in range(posts)
+    ]
+    if is_sharded():
+        # bulk_create не выдаёт сквозные id и пишет в одну базу.
+        for post in new_posts:
+            post.save()
+    else:
+        Post.objects.bulk_create(new_posts)
+    post_list = list(sharded_posts(lambda posts: posts)[:posts])
+    new_comments = [
+        Comment(post=rnd.choice(post_list), author=rnd.choice(authors),
+                text=f'Комментарий {number}')
+        for number in range(comments)
+    ]
+    if is_sharded():
+        for comment in new_comments:
+            comment.save()
+    else:
+        Comment.objects.bulk_create(new_comments)
+    pairs = {
+        (rnd.choice(authors), rnd.choice(authors)) for _ in range(follows)
+    }
+    Follow.objects.bulk_create(
+        Follow(user=user, author=author)
+        for user, author in pairs if user != author
+    )
+    # Посты и комментарии из bulk_create не попали в популярное.
+    rebuild()
+
+
+def get_scenarios():
+    """Сценарии для данных из create_dataset."""
+    post = sharded_posts(lambda posts: posts.filter(group__isnull=False))[0]
+    follower = Follow.objects.select_related('user').first().user
+    return [
+        Scenario('index', 'GET', reverse('posts:index'), None, False),
+        Scenario('group_posts', 'GET',
+                 reverse('posts:group_list', args=(post.group.slug,)),
+                 None, False),
+        Scenario('profile', 'GET',
+                 reverse('posts:profile', args=(post.author.username,)),
+                 None, False),
+        Scenario('post_detail', 'GET',
+                 reverse('posts:post_detail', args=(post.pk,)), None, False),
+        Scenario('follow_index', 'GET', reverse('posts:follow_index'),
+                 None, follower),
+        Scenario('post_create', 'POST', reverse('posts:post_create'),
+                 {'text': 'Новый пост', 'group': post.group_id}, follower),
+        Scenario('add_comment', 'POST',
+                 reverse('posts:add_comment', args=(post.pk,)),
+                 {'text': 'Новый комментарий'}, follower),
+        Scenario('profile_follow', 'GET',
+                 reverse('posts:profile_follow',
+                         args=(post.author.username,)),
+                 None, follower),
+    ]
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def measure(driver, scenario, iterations, alloc_iterations=5, warmup=2):
+    session = session_for(scenario.auth) if scenario.auth else None
+
+    def request():
+        return driver.request(
+            scenario.method, scenario.path, scenario.data, session
+        )
+
+    for _ in range(warmup):
+        request()
+    latencies, queries, sizes, statuses = [], [], [], set()
+    for _ in range(iterations):
+        with ExitStack() as stack:
+            captures = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in connections
+            ]
+            started = time.perf_counter()
+            status, size = request()
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(sum(len(capture) for capture in captures))
+        sizes.append(size)
+        statuses.add(status)
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            request()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        'requests': iterations,
+        'status': sorted(statuses),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'queries': round(statistics.mean(queries), 2),
+        'bytes': round(statistics.mean(sizes)),
+        'alloc_peak_kb': round(statistics.mean(peaks) / 1024, 1),
+    }
+
+
+def run(scenarios, iterations):
+    driver = WSGIDriver()
+    return {
+        scenario.name: measure(driver, scenario, iterations)
+        for scenario in scenarios
+    }
+
+
+def compare(baseline, current, threshold):
+    """Регрессии current относительно baseline.
+
+    Метрика регрессирует, если выросла больше чем на threshold (доля) и
+    на заметную величину. Число запросов не должно расти совсем.
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append(
+                (name, 'queries', base['queries'], result['queries'])
+            )
+        for metric, min_delta in COMPARED_METRICS.items():
+            old, new = base[metric], result[metric]
+            if new > old * (1 + threshold) and new - old > min_delta:
+                regressions.append((name, metric, old, new))
+    return regressions
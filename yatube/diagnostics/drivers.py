@@ -0,0 +1,120 @@
+"""Отправка запросов в приложение без внешних инструментов.
+
+WSGIDriver вызывает WSGI-приложение в том же процессе, HTTPDriver ходит
+на локальный сервер. Оба принимают ключ сессии, созданной session_for,
+и подставляют CSRF-токен, поэтому POST-запросы проходят проверки.
+"""
+import abc
+import http.client
+import io
+import sys
+from urllib.parse import urlencode, urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth import SESSION_KEY
+from django.core.handlers.wsgi import WSGIHandler
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.utils.module_loading import import_string
+
+
+def session_for(user) -> str:
+    """Создаёт в базе сессию, в которой user вошёл на сайт."""
+    store = import_string(f'{settings.SESSION_ENGINE}.SessionStore')()
+    store[SESSION_KEY] = str(user.pk)
+    store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    store.create()
+    return store.session_key
+
+
+class Driver(abc.ABC):
+    def __init__(self):
+        request = HttpRequest()
+        self.csrf_token = get_token(request)
+        self.csrf_cookie = request.META['CSRF_COOKIE']
+
+    def get_headers(self, session=None) -> dict:
+        cookies = {settings.CSRF_COOKIE_NAME: self.csrf_cookie}
+        if session:
+            cookies[settings.SESSION_COOKIE_NAME] = session
+        return {
+            'Cookie': '; '.join(f'{k}={v}' for k, v in cookies.items()),
+            'X-CSRFToken': self.csrf_token,
+            'Content-Type': 'application/x-www-form-urlencoded',
+        }
+
+    @abc.abstractmethod
+    def request(self, method, path, data=None, session=None):
+        """Возвращает статус ответа и число байт тела."""
+
+
+class WSGIDriver(Driver):
+    """Запросы в обработчик Django в том же процессе.
+
+    Обработчик создаётся напрямую, а не из yatube.wsgi: импорт модуля
+    запустил бы прогрев и поток сброса счётчиков.
+    """
+
+    def __init__(self, application=None):
+        super().__init__()
+        self.application = application or WSGIHandler()
+
+    def request(self, method, path, data=None, session=None):
+        body = urlencode(data or {}).encode()
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'HTTP_HOST': 'localhost',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+        }
+        for name, value in self.get_headers(session).items():
+            key = name.upper().replace('-', '_')
+            if key != 'CONTENT_TYPE':
+                key = f'HTTP_{key}'
+            environ[key] = value
+        setup_testing_defaults(environ)
+        statuses = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+
+        result = self.application(environ, start_response)
+        try:
+            size = sum(len(chunk) for chunk in result)
+        finally:
+            result.close()
+        return statuses[0], size
+
+
+class HTTPDriver(Driver):
+    """Запросы к локальному серверу, например manage.py runserver."""
+
+    def __init__(self, base_url):
+        super().__init__()
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = None
+
+    def request(self, method, path, data=None, session=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=30
+            )
+        body = urlencode(data or {}) if method == 'POST' else None
+        try:
+            self.connection.request(
+                method, path, body=body, headers=self.get_headers(session)
+            )
+            response = self.connection.getresponse()
+            return response.status, len(response.read())
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
@@ -0,0 +1,87 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from diagnostics import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет страницы posts через WSGI-приложение на тестовой '
+            'базе и выводит задержки, запросы, байты и память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', choices=benchmark.SIZES, default='small',
+            help='Объём тестовых данных.'
+        )
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Запустить только этот сценарий (можно повторять).'
+        )
+        parser.add_argument('--output', help='Записать результат в JSON.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост метрики при сравнении (доля).'
+        )
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(ALLOWED_HOSTS=['localhost']):
+                benchmark.create_dataset(
+                    **benchmark.SIZES[options['size']], seed=options['seed']
+                )
+                scenarios = [
+                    scenario for scenario in benchmark.get_scenarios()
+                    if not options['scenarios']
+                    or scenario.name in options['scenarios']
+                ]
+                results = benchmark.run(scenarios, options['iterations'])
+        finally:
+            runner.teardown_databases(old_config)
+        report = {
+            'meta': {
+                'size': options['size'],
+                'iterations': options['iterations'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+            regressions = benchmark.compare(
+                baseline, report, options['threshold']
+            )
+            for name, metric, old, new in regressions:
+                self.stderr.write(f'{name}: {metric} {old} -> {new}')
+            if regressions:
+                raise CommandError(f'Регрессий: {len(regressions)}')
+            self.stdout.write('Регрессий нет')
+
+    def print_results(self, results):
+        columns = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'bytes',
+                   'alloc_peak_kb')
+        self.stdout.write(
+            f'{"сценарий":<16}' + ''.join(f'{c:>14}' for c in columns)
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<16}'
+                + ''.join(f'{result[c]:>14}' for c in columns)
+            )
@@ -0,0 +1,83 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from diagnostics import replay
+
+
+class Command(BaseCommand):
+    help = ('Воспроизводит access-лог или синтетическую смесь запросов '
+            'и выводит пропускную способность, задержки и ошибки по '
+            'маршрутам. Запросы идут в настроенную базу данных.')
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--log', help='Access-лог для воспроизведения.')
+        source.add_argument(
+            '--synthetic', type=int, metavar='N',
+            help='Сгенерировать N запросов по смеси --mix.'
+        )
+        parser.add_argument(
+            '--mix', type=json.loads,
+            help='Доли маршрутов, JSON вида {"posts:index": 40, ...}.'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Для синтетики: запросов в секунду, 0 - без пауз.'
+        )
+        parser.add_argument('--limit', type=int, help='Не больше N строк.')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Пул процессов вместо пула потоков.'
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес локального сервера, например http://127.0.0.1:8000. '
+                 'Без него запросы идут в WSGI-приложение в этом процессе.'
+        )
+        parser.add_argument(
+            '--speed', type=float, default=0,
+            help='Соблюдать интервалы лога, ускорив их в N раз; '
+                 '0 - без пауз.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Записать сводку в JSON.')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        if options['log']:
+            with open(options['log']) as lines:
+                entries = replay.read_log(lines, rnd, options['limit'])
+        else:
+            entries = replay.synthetic_entries(
+                options['synthetic'], rnd, options['mix'], options['rate']
+            )
+        if not entries:
+            raise CommandError('Нет запросов к маршрутам yatube')
+        records, elapsed = replay.replay(
+            entries, options['workers'], options['processes'],
+            options['url'], options['speed']
+        )
+        summary = replay.summarize(records, elapsed)
+        self.print_summary(summary, elapsed)
+        for record in records:
+            if record.error:
+                self.stderr.write(f'{record.route}: {record.error}')
+                break
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(summary, file, indent=2, ensure_ascii=False)
+
+    def print_summary(self, summary, elapsed):
+        columns = ('requests', 'rps', 'p50_ms', 'p95_ms', 'p99_ms',
+                   'error_rate')
+        self.stdout.write(f'Прогон занял {elapsed:.1f} с')
+        self.stdout.write(
+            f'{"маршрут":<24}' + ''.join(f'{c:>12}' for c in columns)
+        )
+        for route, row in summary.items():
+            self.stdout.write(
+                f'{route:<24}' + ''.join(f'{row[c]:>12}' for c in columns)
+            )
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from diagnostics.sqllog import stats
+
+SORT_KEYS = {
+    'total': lambda row: row[3],
+    'count': lambda row: row[2],
+    'max': lambda row: row[4],
+    'mean': lambda row: row[3] / row[2],
+}
+
+
+class Command(BaseCommand):
+    help = ('Самые дорогие SQL-запросы по отпечаткам и view из сводок '
+            'процессов в SQL_STATS_DIR.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sort', choices=sorted(SORT_KEYS), default='total',
+            help='Порядок: общее время, число вызовов, max или среднее.'
+        )
+        parser.add_argument('--view', help='Только этот view.')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Не обрезать отпечатки запросов.'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.SQL_STATS_DIR:
+            raise CommandError(
+                'Сводки не сохраняются: задайте YATUBE_SQL_STATS_DIR для '
+                'сервера и этой команды.'
+            )
+        rows = [
+            row for row in stats.collect()
+            if options['view'] in (None, row[0])
+        ]
+        rows.sort(key=SORT_KEYS[options['sort']], reverse=True)
+        self.stdout.write(
+            f"{'всего, мс':>11} {'число':>8} {'сред., мс':>10} "
+            f"{'max, мс':>9}  view / запрос"
+        )
+        for view, key, count, total, longest in rows[:options['limit']]:
+            if not options['full'] and len(key) > 160:
+                key = key[:157] + '...'
+            self.stdout.write(
+                f'{total:>11.1f} {count:>8} {total / count:>10.2f} '
+                f'{longest:>9.1f}  {view}\n{"":>42}{key}'
+            )
@@ -0,0 +1,59 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from diagnostics.tracing import read_traces, summarize
+
+
+class Command(BaseCommand):
+    help = ('Сводка по записанным трассам: время ответа и самые дорогие '
+            'span для каждого маршрута.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', help='Файл трасс, по умолчанию TRACING_FILE.'
+        )
+        parser.add_argument('--route', help='Только этот маршрут.')
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Сколько span выводить для маршрута.'
+        )
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести сводку в JSON.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['file'] or settings.TRACING_FILE
+        try:
+            traces = [
+                trace for trace in read_traces(path)
+                if options['route'] in (None, trace['route'])
+            ]
+        except OSError as exc:
+            raise CommandError(f'Не удалось прочитать {path}: {exc}')
+        summary = summarize(traces, options['top'])
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        routes = sorted(summary.items(), key=lambda item: -item[1]['p95_ms'])
+        for route, data in routes:
+            self.stdout.write(
+                f"{route}: трасс {data['traces']}, "
+                f"p50 {data['p50_ms']} мс, p95 {data['p95_ms']} мс, "
+                f"max {data['max_ms']} мс"
+            )
+            self.stdout.write(
+                '  самые медленные: ' + ', '.join(data['slowest_traces'])
+            )
+            self.stdout.write(
+                f"  {'span':<50} {'число':>7} {'своё, мс':>10} "
+                f"{'всего, мс':>10} {'max, мс':>9}"
+            )
+            for record in data['spans']:
+                name = f"{record['kind']} {record['name']}"[:50]
+                self.stdout.write(
+                    f"  {name:<50} {record['count']:>7} "
+                    f"{record['self_ms']:>10} {record['total_ms']:>10} "
+                    f"{record['max_ms']:>9}"
+                )
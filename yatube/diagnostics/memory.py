@@ -0,0 +1,170 @@
+"""Память, выделяемая запросами, по view.
+
+MemoryProfilingMiddleware включается настройкой MEMORY_PROFILING_ENABLED
+и запускает tracemalloc. tracemalloc считает выделения всего процесса,
+поэтому в каждый момент измеряется только один запрос, остальные
+проходят без замеров. Для запроса записываются пик выделенной памяти
+(гистограмма yatube_request_alloc_peak_bytes в /metrics/) и места
+выделений по разнице снимков до и после (/memory/).
+
+Если пик превысил бюджет view из MEMORY_BUDGETS (или
+MEMORY_DEFAULT_BUDGET), в журнал diagnostics.memory пишется
+предупреждение с главными местами выделений.
+"""
+import logging
+import os
+import threading
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import read_process_files, registry, write_process_file
+
+logger = logging.getLogger(__name__)
+
+PEAK_BUCKETS = tuple(2 ** power * 1024 for power in range(4, 16, 2))
+SITES_KEPT: int = 50
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+_measuring = threading.Lock()
+
+
+def budget_for(view) -> int:
+    return settings.MEMORY_BUDGETS.get(view, settings.MEMORY_DEFAULT_BUDGET)
+
+
+def allocation_sites(before, after, limit):
+    """Места с наибольшим приростом памяти между снимками."""
+    differences = after.filter_traces(SNAPSHOT_FILTERS).compare_to(
+        before.filter_traces(SNAPSHOT_FILTERS), 'lineno'
+    )
+    sites = []
+    for difference in differences[:limit]:
+        if difference.size_diff <= 0:
+            break
+        frame = difference.traceback[0]
+        filename = os.path.relpath(frame.filename, settings.BASE_DIR)
+        sites.append((f'{filename}:{frame.lineno}', difference.size_diff))
+    return sites
+
+
+class MemoryStats:
+    """Число замеров, пики и места выделений по view."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.views = {}
+
+    def _views(self):
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.views = {}
+        return self.views
+
+    def add(self, view, peak, sites):
+        with self.lock:
+            data = self._views().setdefault(view, {
+                'requests': 0, 'peak_total': 0, 'peak_max': 0,
+                'sites': Counter(),
+            })
+            data['requests'] += 1
+            data['peak_total'] += peak
+            data['peak_max'] = max(data['peak_max'], peak)
+            data['sites'].update(dict(sites))
+            if len(data['sites']) > SITES_KEPT * 2:
+                data['sites'] = Counter(
+                    dict(data['sites'].most_common(SITES_KEPT))
+                )
+
+    def _rows(self):
+        return {
+            view: {**data, 'sites': dict(data['sites'])}
+            for view, data in self._views().items()
+        }
+
+    def flush(self):
+        directory = settings.METRICS_DIR
+        if directory:
+            with self.lock:
+                rows = self._rows()
+            write_process_file(
+                os.path.join(directory, 'memory'), self.pid, rows
+            )
+
+    def collect(self, top=10):
+        """Сводка всех процессов по view, пики в байтах."""
+        with self.lock:
+            processes = [self._rows()]
+        if settings.METRICS_DIR:
+            processes.extend(read_process_files(
+                os.path.join(settings.METRICS_DIR, 'memory'), self.pid
+            ))
+        total = {}
+        for views in processes:
+            for view, data in views.items():
+                row = total.setdefault(view, {
+                    'requests': 0, 'peak_total': 0, 'peak_max': 0,
+                    'sites': Counter(),
+                })
+                row['requests'] += data['requests']
+                row['peak_total'] += data['peak_total']
+                row['peak_max'] = max(row['peak_max'], data['peak_max'])
+                row['sites'].update(data['sites'])
+        return {
+            view: {
+                'requests': row['requests'],
+                'peak_mean': round(row['peak_total'] / row['requests']),
+                'peak_max': row['peak_max'],
+                'budget': budget_for(view),
+                'top_sites': row['sites'].most_common(top),
+            }
+            for view, row in sorted(total.items())
+        }
+
+
+stats = MemoryStats()
+
+
+class MemoryProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.MEMORY_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+
+    def __call__(self, request):
+        if not tracemalloc.is_tracing() or not _measuring.acquire(False):
+            return self.get_response(request)
+        try:
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            response = self.get_response(request)
+            peak = tracemalloc.get_traced_memory()[1] - start
+            after = tracemalloc.take_snapshot()
+        finally:
+            _measuring.release()
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        sites = allocation_sites(before, after, settings.MEMORY_TOP_SITES)
+        stats.add(view, peak, sites)
+        stats.flush()
+        registry.observe('yatube_request_alloc_peak_bytes', {'view': view},
+                         peak, buckets=PEAK_BUCKETS)
+        budget = budget_for(view)
+        if budget is not None and peak > budget:
+            logger.warning(
+                'Запрос %s (%s) выделил %d КБ при бюджете %d КБ:\n%s',
+                request.path, view, peak // 1024, budget // 1024,
+                '\n'.join(f'{site}: {size // 1024} КБ'
+                          for site, size in sites)
+            )
+        return response
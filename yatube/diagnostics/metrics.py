@@ -0,0 +1,381 @@
+"""Метрики запросов в формате Prometheus.
+
+MetricsMiddleware собирает по каждому запросу время ответа, число и время
+SQL-запросов, время отрисовки шаблонов (бэкенд DjangoTemplates) и
+попадания в кеш (бэкенд MeteredCache, фрагменты {% cache %} - отдельно).
+Всё это записывается в registry с меткой view - именем маршрута.
+
+Каждый процесс копит значения в памяти. Если задан METRICS_DIR, процесс
+раз в METRICS_FLUSH_INTERVAL секунд сбрасывает их в свой файл
+<pid>.json, а страница /metrics/ складывает файлы всех процессов. Все
+значения - счётчики, поэтому файлы завершившихся процессов остаются в
+сумме; каталог нужно очищать при запуске сервера.
+"""
+import functools
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+from django.utils.module_loading import import_string
+
+from .tracing import span
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+METRICS = {
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа по view.'
+    ),
+    'yatube_responses_total': ('counter', 'Ответы по view и статусу.'),
+    'yatube_db_queries_total': ('counter', 'SQL-запросы по view.'),
+    'yatube_db_query_seconds_total': (
+        'counter', 'Время SQL-запросов по view.'
+    ),
+    'yatube_template_render_seconds': (
+        'histogram', 'Время отрисовки шаблонов по view.'
+    ),
+    'yatube_request_alloc_peak_bytes': (
+        'histogram', 'Пик выделенной памяти по view (diagnostics.memory).'
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Чтения из кеша по view, кешу, виду ключа и результату.'
+    ),
+    'yatube_emails_total': (
+        'counter', 'Исходящие письма: в очередь, отправлено, отложено, '
+                   'не доставлено (mailer).'
+    ),
+    'yatube_email_batch_size': ('histogram', 'Писем в пачке отправки.'),
+    'yatube_email_batch_seconds': (
+        'histogram', 'Время отправки пачки писем.'
+    ),
+}
+SESSION_KEY_PREFIX = 'django.contrib.sessions.'
+FRAGMENT_KEY_PREFIX = 'template.cache.'
+
+_local = threading.local()
+
+
+def write_process_file(directory, pid, data):
+    """Атомарно заменяет файл процесса <pid>.json в directory."""
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as file:
+        json.dump(data, file)
+    os.replace(temp_path, os.path.join(directory, f'{pid}.json'))
+
+
+def read_process_files(directory, skip_pid=None):
+    """Данные из файлов процессов, кроме skip_pid; битые пропускаются."""
+    skipped = os.path.join(directory, f'{skip_pid}.json')
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        if path == skipped:
+            continue
+        try:
+            with open(path) as file:
+                yield json.load(file)
+        except (OSError, ValueError):
+            continue
+
+
+class Registry:
+    """Сумма значений вида (имя, метки) -> число по процессам."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.values = defaultdict(float)
+        self.flushed = 0
+
+    def _values(self):
+        if os.getpid() != self.pid:
+            # После fork значения родителя уже лежат в его файле.
+            self.pid = os.getpid()
+            self.values = defaultdict(float)
+        return self.values
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._values()[key] += amount
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        """Наблюдение для гистограммы: бакеты, _sum и _count."""
+        with self.lock:
+            values = self._values()
+            for bound in (*buckets, float('inf')):
+                if value <= bound:
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    values[(f'{name}_bucket',
+                            tuple(sorted({**labels, 'le': le}.items())))] += 1
+            labels = tuple(sorted(labels.items()))
+            values[(f'{name}_sum', labels)] += value
+            values[(f'{name}_count', labels)] += 1
+
+    def flush(self, force=False):
+        """Пишет значения процесса в METRICS_DIR/<pid>.json."""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (
+            not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL
+        ):
+            return
+        with self.lock:
+            samples = [
+                [name, list(labels), value]
+                for (name, labels), value in self._values().items()
+            ]
+            self.flushed = now
+        write_process_file(directory, self.pid, samples)
+
+    def collect(self):
+        """Значения всех процессов: своего из памяти, прочих из файлов."""
+        with self.lock:
+            total = Counter(self._values())
+        directory = settings.METRICS_DIR
+        if directory:
+            for samples in read_process_files(directory, self.pid):
+                for name, labels, value in samples:
+                    total[(name, tuple(tuple(pair) for pair in labels))] += (
+                        value
+                    )
+        return total
+
+
+registry = Registry()
+
+
+def _family(sample_name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        base = sample_name[:-len(suffix)]
+        if sample_name.endswith(suffix) and base in METRICS:
+            return base
+    return sample_name
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n')
+        )
+        for key, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+def _sort_key(item):
+    (name, labels), _ = item
+    return name, [
+        (key, float(value) if key == 'le' else value)
+        for key, value in labels
+    ]
+
+
+def exposition(values) -> str:
+    """Текстовый формат Prometheus 0.0.4."""
+    families = defaultdict(list)
+    for (name, labels), value in sorted(values.items(), key=_sort_key):
+        families[_family(name)].append((name, labels, value))
+    lines = []
+    for family, samples in families.items():
+        kind, help_text = METRICS.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        for name, labels, value in samples:
+            lines.append(f'{name}{_format_labels(labels)} {value!r}')
+    return '\n'.join(lines) + '\n'
+
+
+def key_group(key) -> str:
+    """Вид ключа кеша без переменной части: posts:marker, session, ..."""
+    if key.startswith(FRAGMENT_KEY_PREFIX):
+        return 'fragment:' + key[len(FRAGMENT_KEY_PREFIX):].split('.')[0]
+    if key.startswith(SESSION_KEY_PREFIX):
+        return 'session'
+    parts = key.split(':')
+    return ':'.join(parts[:2]) if len(parts) > 1 else 'other'
+
+
+class RequestStats:
+    """Значения одного запроса; view известен только в конце."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.templates = []
+        self.cache = Counter()
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+
+    def record(self, view, status, duration):
+        labels = {'view': view}
+        registry.observe('yatube_request_duration_seconds', labels, duration)
+        registry.inc('yatube_responses_total',
+                     {'view': view, 'status': str(status)})
+        registry.inc('yatube_db_queries_total', labels, self.queries)
+        registry.inc('yatube_db_query_seconds_total', labels,
+                     self.query_seconds)
+        for template, seconds in self.templates:
+            registry.observe('yatube_template_render_seconds',
+                             {'view': view, 'template': template}, seconds)
+        for (alias, group, result), count in self.cache.items():
+            registry.inc('yatube_cache_requests_total', {
+                'view': view, 'cache': alias, 'key': group, 'result': result,
+            }, count)
+
+
+def current_stats():
+    return getattr(_local, 'stats', None)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        _local.stats = stats
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(stats.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        match = request.resolver_match
+        stats.record(
+            match.view_name if match else 'unresolved',
+            response.status_code, time.perf_counter() - started
+        )
+        registry.flush()
+        return response
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, context=None, request=None):
+        name = self.origin.template_name or 'string'
+        started = time.perf_counter()
+        try:
+            with span('template', name):
+                return super().render(context, request)
+        finally:
+            stats = current_stats()
+            if stats is not None:
+                stats.templates.append(
+                    (name, time.perf_counter() - started)
+                )
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """DjangoTemplates, который замеряет отрисовку шаблонов."""
+
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return TimedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+_missing = object()
+
+
+class CacheMetricsMixin:
+    """Считает попадания и промахи кеша любого бэкенда.
+
+    get_many учитывается по ключам; если бэкенд сводит его к get (как
+    LocMemCache), ключи внутри не считаются второй раз. Операции
+    попадают в трассу запроса как span вида cache.
+    """
+
+    def __init__(self, location, params, *args, metrics_alias='', **kwargs):
+        super().__init__(location, params, *args, **kwargs)
+        self.alias = metrics_alias or location or 'default'
+
+    def _count(self, key, hit):
+        stats = current_stats()
+        if stats is not None and not getattr(_local, 'cache_batch', False):
+            result = 'hit' if hit else 'miss'
+            stats.cache[(self.alias, key_group(key), result)] += 1
+
+    def get(self, key, default=None, version=None):
+        with span('cache', f'get {key_group(key)}', cache=self.alias):
+            value = super().get(key, _missing, version)
+        self._count(key, value is not _missing)
+        return default if value is _missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with span('cache', 'get_many', cache=self.alias):
+            batch, _local.cache_batch = (
+                getattr(_local, 'cache_batch', False), True
+            )
+            try:
+                values = super().get_many(keys, version)
+            finally:
+                _local.cache_batch = batch
+        for key in keys:
+            self._count(key, key in values)
+        return values
+
+    def set(self, key, *args, **kwargs):
+        with span('cache', f'set {key_group(key)}', cache=self.alias):
+            return super().set(key, *args, **kwargs)
+
+    def add(self, key, *args, **kwargs):
+        with span('cache', f'add {key_group(key)}', cache=self.alias):
+            return super().add(key, *args, **kwargs)
+
+    def delete(self, key, *args, **kwargs):
+        with span('cache', f'delete {key_group(key)}', cache=self.alias):
+            return super().delete(key, *args, **kwargs)
+
+    def set_many(self, data, *args, **kwargs):
+        with span('cache', 'set_many', cache=self.alias):
+            return super().set_many(data, *args, **kwargs)
+
+    def delete_many(self, keys, *args, **kwargs):
+        with span('cache', 'delete_many', cache=self.alias):
+            return super().delete_many(keys, *args, **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def metered(backend):
+    """Класс бэкенда кеша с CacheMetricsMixin."""
+    return type(backend.__name__, (CacheMetricsMixin, backend),
+                {'__module__': __name__})
+
+
+class MeteredCache:
+    """Бэкенд для CACHES: METERED_BACKEND с метриками и трассировкой.
+
+    METERED_ALIAS - имя кеша в метках, по умолчанию LOCATION.
+    """
+
+    def __new__(cls, location, params):
+        params = dict(params)
+        backend = import_string(params.pop('METERED_BACKEND'))
+        alias = params.pop('METERED_ALIAS', '')
+        return metered(backend)(location, params, metrics_alias=alias)
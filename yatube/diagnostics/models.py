@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class RequestProfile(models.Model):
+    """Профиль одного запроса, снятый ProfilingMiddleware."""
+    created = models.DateTimeField('Дата', auto_now_add=True, db_index=True)
+    method = models.CharField('Метод', max_length=10)
+    path = models.CharField('Адрес', max_length=500)
+    view_name = models.CharField('View', max_length=200, db_index=True)
+    status = models.PositiveSmallIntegerField('Статус ответа')
+    duration_ms = models.FloatField('Длительность, мс')
+    mode = models.CharField('Профилировщик', max_length=20)
+    samples = models.PositiveIntegerField('Сэмплов', default=0)
+    file = models.CharField('Файл профиля', max_length=500)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self) -> str:
+        return f'<RequestProfile {self.view_name} {self.duration_ms:.0f} мс>'
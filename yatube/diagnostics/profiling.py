@@ -0,0 +1,173 @@
+"""Профилирование отдельных запросов.
+
+ProfilingMiddleware снимает профиль запроса, если в нём есть заголовок
+X-Profile с подписанным токеном (manage.py profile_token) или запрос попал
+в выборку PROFILING_SAMPLE_RATE. Профиль пишется в PROFILING_SPOOL_DIR:
+при PROFILING_MODE='sampling' - свёрнутые стеки (.collapsed, открываются в
+speedscope и flamegraph.pl), при 'cprofile' - статистика cProfile
+(.pstats). Если PROFILING_ENABLED выключен, middleware не подключается.
+"""
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+from .models import RequestProfile
+
+TOKEN_SALT = 'diagnostics.profiling'
+TOKEN_HEADER = 'HTTP_X_PROFILE'
+
+
+def make_token() -> str:
+    return signing.dumps('profile', salt=TOKEN_SALT)
+
+
+def is_valid_token(token) -> bool:
+    try:
+        signing.loads(
+            token, salt=TOKEN_SALT,
+            max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def collapse(frame) -> str:
+    """Стек кадра в строку «внешняя;...;внутренняя функция»."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.relpath(code.co_filename, settings.BASE_DIR)
+        names.append(f'{code.co_name} ({filename}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Раз в interval секунд запоминает стек потока thread_id."""
+    mode = 'sampling'
+    suffix = 'collapsed'
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def write(self, path):
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+
+class CProfiler:
+    mode = 'cprofile'
+    suffix = 'pstats'
+    samples = 0
+
+    def __init__(self, interval):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+PROFILERS = {
+    StackSampler.mode: StackSampler,
+    CProfiler.mode: CProfiler,
+}
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.profiler_class = PROFILERS[settings.PROFILING_MODE]
+        os.makedirs(settings.PROFILING_SPOOL_DIR, exist_ok=True)
+
+    def should_profile(self, request) -> bool:
+        token = request.META.get(TOKEN_HEADER)
+        if token is not None:
+            return is_valid_token(token)
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        profiler = self.profiler_class(settings.PROFILING_INTERVAL)
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        duration = (time.perf_counter() - started) * 1000
+        self.save(request, response, profiler, duration)
+        return response
+
+    def save(self, request, response, profiler, duration):
+        match = request.resolver_match
+        view_name = match.view_name if match else '-'
+        name = '{}-{}-{}.{}'.format(
+            timezone.now().strftime('%Y%m%d-%H%M%S'),
+            view_name.replace(':', '.'), uuid.uuid4().hex[:8],
+            profiler.suffix
+        )
+        path = os.path.join(settings.PROFILING_SPOOL_DIR, name)
+        profiler.write(path)
+        RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:500],
+            view_name=view_name,
+            status=response.status_code,
+            duration_ms=duration,
+            mode=profiler.mode,
+            samples=profiler.samples,
+            file=path,
+        )
+        self.prune()
+
+    def prune(self):
+        """Оставляет PROFILING_KEEP последних профилей."""
+        old = RequestProfile.objects.order_by('-created')[
+            settings.PROFILING_KEEP:
+        ]
+        for profile in old:
+            if os.path.exists(profile.file):
+                os.remove(profile.file)
+            profile.delete()
@@ -0,0 +1,245 @@
+"""Воспроизведение трафика из access-лога или синтетической смеси.
+
+Строки лога превращаются в записи Entry с именем маршрута yatube
+(posts:index, posts:follow_index, ...). Маршрутам, которые требуют входа,
+достаётся сессия пользователя из лога или случайного пользователя с
+подписками. Записи раздаются пулу потоков или процессов, результаты
+сводятся по маршрутам.
+"""
+import datetime as dt
+import re
+import statistics
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.urls import Resolver404, resolve, reverse
+
+from posts.models import Follow, Group
+from posts.sharding import sharded_posts
+
+from .benchmark import percentile
+from .drivers import HTTPDriver, WSGIDriver, session_for
+
+User = get_user_model()
+
+# Combined Log Format и формат журнала manage.py runserver.
+LOG_RE = re.compile(
+    r'(?:(?P<host>\S+) \S+ (?P<user>\S+) )?\[(?P<time>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+)[^"]*"'
+)
+TIME_FORMATS = ('%d/%b/%Y:%H:%M:%S %z', '%d/%b/%Y %H:%M:%S')
+
+LOGIN_REQUIRED = frozenset((
+    'posts:follow_index', 'posts:post_create', 'posts:post_edit',
+    'posts:add_comment', 'posts:profile_follow', 'posts:profile_unfollow',
+))
+# Тела POST-запросов в логе нет - подставляем типичные.
+POST_DATA = {
+    'posts:post_create': {'text': 'Пост из нагрузочного теста'},
+    'posts:add_comment': {'text': 'Комментарий из нагрузочного теста'},
+}
+# Доли маршрутов в синтетической смеси.
+DEFAULT_MIX = {
+    'posts:index': 40,
+    'posts:post_detail': 25,
+    'posts:profile': 10,
+    'posts:group_list': 10,
+    'posts:follow_index': 8,
+    'posts:add_comment': 4,
+    'posts:post_create': 2,
+    'posts:profile_follow': 1,
+}
+
+Entry = namedtuple('Entry', 'offset method path route session')
+Record = namedtuple('Record', 'route status latency error')
+
+
+def parse_time(value):
+    for time_format in TIME_FORMATS:
+        try:
+            return dt.datetime.strptime(value, time_format).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def route_name(path):
+    try:
+        return resolve(path.partition('?')[0]).view_name
+    except Resolver404:
+        return None
+
+
+class SessionPool:
+    """Сессии пользователей для маршрутов, требующих входа."""
+
+    def __init__(self, rnd, size=50):
+        self.rnd = rnd
+        user_ids = list(
+            Follow.objects.values_list('user_id', flat=True).distinct()[:size]
+        ) or list(User.objects.values_list('pk', flat=True)[:size])
+        self.users = list(User.objects.filter(pk__in=user_ids))
+        self.sessions = {}
+
+    def get(self, username=None):
+        user = None
+        if username:
+            user = User.objects.filter(username=username).first()
+        if user is None:
+            if not self.users:
+                return None
+            user = self.rnd.choice(self.users)
+        if user.pk not in self.sessions:
+            self.sessions[user.pk] = session_for(user)
+        return self.sessions[user.pk]
+
+
+def read_log(lines, rnd, limit=None):
+    """Записи из строк лога. Запросы вне маршрутов yatube пропускаются."""
+    sessions = SessionPool(rnd)
+    entries, start = [], None
+    for line in lines:
+        match = LOG_RE.search(line)
+        if match is None:
+            continue
+        route = route_name(match['path'])
+        if route is None:
+            continue
+        moment = parse_time(match['time'])
+        if start is None:
+            start = moment
+        session = None
+        user = match['user'] if match['user'] not in (None, '-') else None
+        if user or route in LOGIN_REQUIRED:
+            session = sessions.get(user)
+        offset = moment - start if moment and start else 0
+        entries.append(
+            Entry(offset, match['method'], match['path'], route, session)
+        )
+        if limit and len(entries) >= limit:
+            break
+    return entries
+
+
+def synthetic_entries(count, rnd, mix=None, rate=0):
+    """Смесь запросов к случайным постам, авторам и группам.
+
+    rate - запросов в секунду (пуассоновский поток); 0 - без пауз.
+    """
+    mix = mix or DEFAULT_MIX
+    sessions = SessionPool(rnd)
+    posts = [
+        post.pk
+        for post in sharded_posts(lambda posts: posts.only('pk'))[:500]
+    ]
+    usernames = list(
+        User.objects.filter(posts__isnull=False).values_list(
+            'username', flat=True
+        ).distinct()[:500]
+    )
+    slugs = list(Group.objects.values_list('slug', flat=True)[:500])
+    routes = rnd.choices(list(mix), weights=list(mix.values()), k=count)
+    entries, offset = [], 0
+    for route in routes:
+        args = ()
+        if route in ('posts:post_detail', 'posts:add_comment'):
+            args = (rnd.choice(posts),) if posts else None
+        elif route in ('posts:profile', 'posts:profile_follow'):
+            args = (rnd.choice(usernames),) if usernames else None
+        elif route == 'posts:group_list':
+            args = (rnd.choice(slugs),) if slugs else None
+        if args is None:
+            continue
+        method = 'POST' if route in POST_DATA else 'GET'
+        session = sessions.get() if route in LOGIN_REQUIRED else None
+        entries.append(
+            Entry(offset, method, reverse(route, args=args), route, session)
+        )
+        if rate:
+            offset += rnd.expovariate(rate)
+    return entries
+
+
+def run_chunk(entries, base_url=None, speed=0, started=None):
+    """Выполняет записи по очереди. Вызывается в потоке или процессе."""
+    driver = HTTPDriver(base_url) if base_url else WSGIDriver()
+    records = []
+    try:
+        for entry in entries:
+            if speed and started is not None:
+                delay = started + entry.offset / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            begin = time.perf_counter()
+            try:
+                status, _ = driver.request(
+                    entry.method, entry.path,
+                    POST_DATA.get(entry.route), entry.session
+                )
+                error = None
+            except Exception as exc:
+                status, error = None, f'{type(exc).__name__}: {exc}'
+            records.append(Record(
+                entry.route, status, time.perf_counter() - begin, error
+            ))
+    finally:
+        connections.close_all()
+    return records
+
+
+def replay(entries, workers=4, processes=False, base_url=None, speed=0):
+    """Раздаёт записи workers исполнителям, возвращает записи и время."""
+    chunks = [entries[number::workers] for number in range(workers)]
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    if processes:
+        # Дочерние процессы не должны делить соединения с родителем.
+        connections.close_all()
+    started = time.time()
+    with executor_class(max_workers=workers) as executor:
+        futures = [
+            executor.submit(run_chunk, chunk, base_url, speed, started)
+            for chunk in chunks if chunk
+        ]
+        records = [
+            record for future in futures for record in future.result()
+        ]
+    return records, time.time() - started
+
+
+def summarize(records, elapsed):
+    """Пропускная способность, задержки и доли ошибок по маршрутам."""
+    if not records:
+        return {}
+    by_route = defaultdict(list)
+    for record in records:
+        by_route[record.route].append(record)
+    by_route['ALL'] = records
+    summary = {}
+    for route, route_records in by_route.items():
+        latencies = [record.latency * 1000 for record in route_records]
+        errors = sum(
+            1 for record in route_records
+            if record.error or record.status >= 500
+        )
+        client_errors = sum(
+            1 for record in route_records
+            if record.status and 400 <= record.status < 500
+        )
+        summary[route] = {
+            'requests': len(route_records),
+            'rps': round(len(route_records) / elapsed, 2) if elapsed else 0,
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'max_ms': round(max(latencies), 3),
+            'error_rate': round(errors / len(route_records), 4),
+            'client_error_rate': round(client_errors / len(route_records), 4),
+            'statuses': dict(Counter(
+                str(record.status) for record in route_records
+            )),
+        }
+    return summary
@@ -0,0 +1,184 @@
+"""Сводка SQL-запросов по отпечаткам и журнал медленных запросов.
+
+Если SQL_STATS_ENABLED включён, install ставит на каждое соединение
+execute_wrapper, а QueryLogMiddleware подключается. Запрос сводится к
+отпечатку: литералы и параметры заменяются на ?, списки IN (...) и
+VALUES (...) схлопываются. Для пары (view, отпечаток) считаются число
+вызовов, общее и наибольшее время. Запросы в рамках HTTP-запроса
+QueryLogMiddleware относит к view в конце запроса, остальные (команды,
+фоновые задачи) - к view «-».
+
+Запросы дольше SQL_SLOW_MS пишутся в журнал diagnostics.sqllog вместе с
+EXPLAIN QUERY PLAN. Сводки процессов сбрасываются в SQL_STATS_DIR, откуда
+их читает manage.py top_queries.
+"""
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import read_process_files, write_process_file
+
+logger = logging.getLogger(__name__)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|\?')
+IN_LIST_RE = re.compile(r'\bIN \((?:\?, )*\?\)', re.I)
+VALUES_RE = re.compile(r'\bVALUES \((?:[^()]*)\)(?:, \([^()]*\))*', re.I)
+SPACE_RE = re.compile(r'\s+')
+
+_local = threading.local()
+
+
+def fingerprint(sql) -> str:
+    """SQL без литералов: одинаковые по форме запросы совпадают."""
+    sql = SPACE_RE.sub(' ', sql).strip()
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = PLACEHOLDER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return VALUES_RE.sub('VALUES (...)', sql)
+
+
+class QueryStats:
+    """Число, общее и наибольшее время запросов по (view, отпечаток)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.values = {}
+        self.flushed = 0
+
+    def _values(self):
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.values = {}
+        return self.values
+
+    def add(self, view, queries):
+        with self.lock:
+            values = self._values()
+            for key, duration in queries:
+                row = values.get((view, key))
+                if row is None:
+                    values[(view, key)] = [1, duration, duration]
+                else:
+                    row[0] += 1
+                    row[1] += duration
+                    row[2] = max(row[2], duration)
+
+    def flush(self, force=False):
+        directory = settings.SQL_STATS_DIR
+        now = time.monotonic()
+        if not directory or (
+            not force
+            and now - self.flushed < settings.SQL_STATS_FLUSH_INTERVAL
+        ):
+            return
+        with self.lock:
+            rows = [
+                [view, key, *row]
+                for (view, key), row in self._values().items()
+            ]
+            self.flushed = now
+        write_process_file(directory, self.pid, rows)
+
+    def collect(self):
+        """Сводка всех процессов: [view, отпечаток, число, всего, max]."""
+        with self.lock:
+            total = {key: list(row) for key, row in self._values().items()}
+        directory = settings.SQL_STATS_DIR
+        if directory:
+            for rows in read_process_files(directory, self.pid):
+                for view, key, count, duration, longest in rows:
+                    row = total.setdefault((view, key), [0, 0.0, 0.0])
+                    row[0] += count
+                    row[1] += duration
+                    row[2] = max(row[2], longest)
+        return [[view, key, *row] for (view, key), row in total.items()]
+
+
+stats = QueryStats()
+atexit.register(stats.flush, force=True)
+
+
+def explain(connection, sql, params) -> str:
+    """План запроса. Выполняется мимо execute_wrapper соединения."""
+    prefix = (
+        'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    )
+    try:
+        with connection.cursor() as cursor:
+            cursor.cursor.execute(f'{prefix} {sql}', params)
+            return '\n'.join(
+                ' '.join(str(column) for column in row)
+                for row in cursor.cursor.fetchall()
+            )
+    except Exception as exc:
+        return f'не удалось получить план: {exc}'
+
+
+class QueryLogger:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - started) * 1000
+        key = fingerprint(sql)
+        pending = getattr(_local, 'pending', None)
+        if pending is None:
+            stats.add('-', [(key, duration)])
+        else:
+            pending.append((key, duration))
+        if duration >= settings.SQL_SLOW_MS:
+            plan = ''
+            if not many and sql.lstrip()[:6].upper() == 'SELECT':
+                plan = explain(self.connection, sql, params)
+            logger.warning(
+                'Медленный запрос %.1f мс [%s] %s\n%s\n%s',
+                duration, self.connection.alias,
+                getattr(_local, 'path', '-'), sql, plan
+            )
+        return result
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created.
+
+    Обёртка встаёт первой: execute_wrapper() снимает последнюю обёртку
+    списка, и соединение, открытое внутри него, не должно её потерять.
+    """
+    if not settings.SQL_STATS_ENABLED or any(
+        isinstance(wrapper, QueryLogger)
+        for wrapper in connection.execute_wrappers
+    ):
+        return
+    connection.execute_wrappers.insert(0, QueryLogger(connection))
+
+
+class QueryLogMiddleware:
+    def __init__(self, get_response):
+        if not settings.SQL_STATS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.pending = []
+        _local.path = request.path
+        try:
+            response = self.get_response(request)
+        finally:
+            pending = _local.pending
+            _local.pending = _local.path = None
+            match = request.resolver_match
+            stats.add(match.view_name if match else 'unresolved', pending)
+        stats.flush()
+        return response
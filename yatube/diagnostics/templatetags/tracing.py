@@ -0,0 +1,25 @@
+"""{% include %} со span в трассе запроса (diagnostics.tracing).
+
+Библиотека подключена в TEMPLATES как builtins и заменяет встроенный тег.
+"""
+from django import template
+from django.template.loader_tags import IncludeNode, do_include
+
+from diagnostics.tracing import span
+
+register = template.Library()
+
+
+class TracedIncludeNode(IncludeNode):
+    def render(self, context):
+        with span('template', f'include {self.template.var}'):
+            return super().render(context)
+
+
+@register.tag('include')
+def include(parser, token):
+    node = do_include(parser, token)
+    return TracedIncludeNode(
+        node.template, extra_context=node.extra_context,
+        isolated_context=node.isolated_context
+    )
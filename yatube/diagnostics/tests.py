@@ -0,0 +1,482 @@
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from . import benchmark, drivers, memory, metrics, replay, sqllog, tracing
+from .models import RequestProfile
+from .profiling import ProfilingMiddleware, make_token
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+ACCESS_LOG = '''\
+127.0.0.1 - - [19/Oct/2026:09:30:00 +0000] "GET / HTTP/1.1" 200 1234
+127.0.0.1 - - [19/Oct/2026:09:30:03 +0000] "GET /follow/ HTTP/1.1" 200 99
+127.0.0.1 - - [19/Oct/2026:09:30:04 +0000] "GET /static/x.css HTTP/1.1" 200 9
+[19/Oct/2026 09:30:05] "POST /posts/1/comment/ HTTP/1.1" 302 0
+'''
+
+METRICS_TOKEN = 'metrics-token'
+AUTHORIZATION = f'Bearer {METRICS_TOKEN}'
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_driver_does_not_load_wsgi_module(self):
+        """WSGIDriver не запускает прогрев и сброс счётчиков из yatube.wsgi."""
+        sys.modules.pop('yatube.wsgi', None)
+        drivers.WSGIDriver()
+        self.assertNotIn('yatube.wsgi', sys.modules)
+        with self.assertRaises(TypeError):
+            drivers.Driver()
+
+    def test_run_reports_metrics(self):
+        """Каждый сценарий отрабатывает и даёт метрики."""
+        benchmark.create_dataset(
+            users=5, groups=2, posts=20, comments=20, follows=10
+        )
+        results = benchmark.run(benchmark.get_scenarios(), iterations=2)
+        self.assertEqual(len(results), 8)
+        for name, result in results.items():
+            with self.subTest(scenario=name):
+                self.assertLess(max(result['status']), 400)
+                self.assertGreaterEqual(result['p99_ms'], result['p50_ms'])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
+
+    def test_compare_flags_regressions(self):
+        """Рост запросов и заметный рост задержки - регрессии."""
+        base = {'p95_ms': 10, 'p99_ms': 12, 'bytes': 1000,
+                'alloc_peak_kb': 100, 'queries': 2}
+        current = dict(base, p95_ms=15, p99_ms=12.5, queries=3)
+        regressions = benchmark.compare(
+            {'results': {'index': base}}, {'results': {'index': current}},
+            threshold=0.2
+        )
+        self.assertEqual(
+            {metric for _, metric, _, _ in regressions}, {'p95_ms', 'queries'}
+        )
+
+
+class ReplayTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+
+    def test_read_log(self):
+        """Строки лога превращаются в маршруты yatube с интервалами."""
+        entries = replay.read_log(ACCESS_LOG.splitlines(), random.Random(0))
+        self.assertEqual(
+            [entry.route for entry in entries],
+            ['posts:index', 'posts:follow_index', 'posts:add_comment']
+        )
+        self.assertEqual(entries[1].offset, 3)
+        self.assertIsNone(entries[0].session)
+        self.assertIsNotNone(entries[1].session)
+
+    def test_summarize(self):
+        """Сводка считает ошибки и задержки по маршрутам."""
+        records = [
+            replay.Record('posts:index', 200, 0.01, None),
+            replay.Record('posts:index', 500, 0.03, None),
+            replay.Record('posts:profile', None, 0.02, 'OSError: refused'),
+        ]
+        summary = replay.summarize(records, elapsed=1)
+        self.assertEqual(summary['posts:index']['error_rate'], 0.5)
+        self.assertEqual(summary['posts:index']['p99_ms'], 30)
+        self.assertEqual(summary['ALL']['requests'], 3)
+        self.assertEqual(summary['posts:profile']['error_rate'], 1)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_INTERVAL=0.001)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir, ignore_errors=True)
+        spool = self.settings(PROFILING_SPOOL_DIR=self.spool_dir)
+        spool.enable()
+        self.addCleanup(spool.disable)
+
+    def test_profile_by_token(self):
+        """Запрос с токеном в X-Profile профилируется."""
+        response = self.client.get(
+            reverse('posts:index'), HTTP_X_PROFILE=make_token()
+        )
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.view_name, 'posts:index')
+        self.assertEqual(profile.mode, 'sampling')
+        self.assertTrue(profile.file.endswith('.collapsed'))
+        self.assertTrue(os.path.exists(profile.file))
+
+    def test_bad_token_is_ignored(self):
+        """Запросы без токена или с чужим токеном не профилируются."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE='forged')
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILING_MODE='cprofile')
+    def test_cprofile_mode(self):
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE=make_token())
+        profile = RequestProfile.objects.get()
+        self.assertTrue(profile.file.endswith('.pstats'))
+        self.assertTrue(os.path.exists(profile.file))
+
+    @override_settings(PROFILING_KEEP=1)
+    def test_old_profiles_are_pruned(self):
+        for _ in range(2):
+            self.client.get(
+                reverse('posts:index'), HTTP_X_PROFILE=make_token()
+            )
+        self.assertEqual(RequestProfile.objects.count(), 1)
+        self.assertEqual(len(os.listdir(self.spool_dir)), 1)
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+
+@override_settings(METRICS_TOKEN=METRICS_TOKEN)
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def delta(self, before, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        return metrics.registry.collect()[key] - before[key]
+
+    def test_request_metrics(self):
+        """Запрос к index даёт время ответа, SQL, шаблоны и кеш по view."""
+        before = metrics.registry.collect()
+        for _ in range(2):
+            self.client.get(reverse('posts:index'))
+        view = {'view': 'posts:index'}
+        self.assertEqual(
+            self.delta(before, 'yatube_request_duration_seconds_count',
+                       **view),
+            2
+        )
+        self.assertEqual(
+            self.delta(before, 'yatube_request_duration_seconds_bucket',
+                       le='+Inf', **view),
+            2
+        )
+        self.assertEqual(
+            self.delta(before, 'yatube_responses_total', status='200', **view),
+            2
+        )
+        self.assertGreater(
+            self.delta(before, 'yatube_db_queries_total', **view), 0
+        )
+        self.assertEqual(
+            self.delta(before, 'yatube_template_render_seconds_count',
+                       template='posts/index.html', **view),
+            2
+        )
+        fragment = {'cache': 'default', 'key': 'fragment:index_page', **view}
+        self.assertEqual(
+            self.delta(before, 'yatube_cache_requests_total',
+                       result='miss', **fragment),
+            1
+        )
+        self.assertEqual(
+            self.delta(before, 'yatube_cache_requests_total',
+                       result='hit', **fragment),
+            1
+        )
+
+    def test_endpoint(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('diagnostics:metrics'), HTTP_AUTHORIZATION=AUTHORIZATION
+        )
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"}', text
+        )
+
+    def test_endpoint_is_internal(self):
+        """Без токена страница закрыта, даже для адреса прокси."""
+        url = reverse('diagnostics:metrics')
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'},
+                        {'REMOTE_ADDR': '203.0.113.7'}):
+            with self.subTest(headers=headers):
+                self.assertEqual(
+                    self.client.get(url, **headers).status_code, 404
+                )
+        with override_settings(METRICS_ALLOWED_IPS=['203.0.113.7']):
+            response = self.client.get(url, REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 200)
+
+    def test_processes_are_summed(self):
+        """Значения из файлов других процессов складываются со своими."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        name, labels = 'yatube_db_queries_total', {'view': 'posts:index'}
+        with override_settings(METRICS_DIR=directory):
+            self.client.get(reverse('posts:index'))
+            metrics.registry.flush(force=True)
+            own = metrics.registry.collect()
+            with open(os.path.join(directory, '1.json'), 'w') as file:
+                json.dump([[name, list(labels.items()), 5]], file)
+            self.assertEqual(self.delta(own, name, **labels), 5)
+        self.assertIn(f'{os.getpid()}.json', os.listdir(directory))
+
+    def test_any_cache_backend(self):
+        """Попадания считаются в любом бэкенде, get_many - по ключам."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        backends = (
+            ('django.core.cache.backends.filebased.FileBasedCache',
+             directory),
+            ('django.core.cache.backends.locmem.LocMemCache', 'metered'),
+        )
+        for backend, location in backends:
+            with self.subTest(backend=backend):
+                shared = metrics.MeteredCache(location, {
+                    'METERED_BACKEND': backend, 'METERED_ALIAS': 'shared',
+                })
+                shared.set('posts:test:1', 1)
+                stats = metrics.RequestStats()
+                metrics._local.stats = stats
+                try:
+                    shared.get('posts:test:1')
+                    shared.get_many(['posts:test:1', 'posts:test:2'])
+                finally:
+                    metrics._local.stats = None
+                self.assertEqual(stats.cache, Counter({
+                    ('shared', 'posts:test', 'hit'): 2,
+                    ('shared', 'posts:test', 'miss'): 1,
+                }))
+
+    def test_key_group(self):
+        self.assertEqual(
+            metrics.key_group('template.cache.index_page.abc'),
+            'fragment:index_page'
+        )
+        self.assertEqual(
+            metrics.key_group('posts:marker:group:1'), 'posts:marker'
+        )
+        self.assertEqual(
+            metrics.key_group('django.contrib.sessions.cached_dbx1'),
+            'session'
+        )
+
+
+@override_settings(TRACING_ENABLED=True, TRACING_SAMPLE_RATE=0,
+                   TRACING_SLOW_MS=0)
+class TracingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.trace_file = os.path.join(directory, 'traces.jsonl')
+        overrides = self.settings(
+            TRACING_FILE=self.trace_file, MEDIA_ROOT=directory
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def traces(self):
+        return list(tracing.read_traces(self.trace_file))
+
+    def test_spans(self):
+        """В трассе index есть view, SQL, кеш, include и миниатюра."""
+        Post.objects.create(
+            author=User.objects.create_user(username='traced'),
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        response = self.client.get(reverse('posts:index'))
+        (trace,) = self.traces()
+        self.assertEqual(response[tracing.TRACE_HEADER], trace['trace_id'])
+        self.assertEqual(trace['route'], 'posts:index')
+        names = {(span['kind'], span['name']) for span in trace['spans']}
+        self.assertIn(('view', 'posts:index'), names)
+        self.assertIn(('request', 'posts:index'), names)
+        self.assertIn(('cache', 'get fragment:index_page'), names)
+        self.assertIn(
+            ('template', 'include posts/includes/post_list.html'), names
+        )
+        self.assertIn(('thumbnail', '360x339'), names)
+        self.assertTrue(any(kind == 'sql' for kind, _ in names))
+        spans = {span['id']: span for span in trace['spans']}
+        view = next(span for span in spans.values() if span['kind'] == 'view')
+        self.assertEqual(spans[view['parent']]['kind'], 'request')
+
+    def test_view_exception(self):
+        """Span view закрывается, когда view бросает исключение."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(404,))
+        )
+        self.assertEqual(response.status_code, 404)
+        (trace,) = self.traces()
+        self.assertEqual(trace['status'], 404)
+        kinds = [span['kind'] for span in trace['spans']]
+        self.assertEqual(kinds.count('view'), 1)
+        self.assertEqual(kinds[-1], 'request')
+
+    @override_settings(TRACING_SLOW_MS=60_000)
+    def test_fast_requests_are_not_kept(self):
+        self.client.get(reverse('posts:index'))
+        self.assertFalse(os.path.exists(self.trace_file))
+
+    def test_summary(self):
+        for _ in range(2):
+            self.client.get(reverse('posts:index'))
+        self.client.get(reverse('about:author'))
+        summary = tracing.summarize(self.traces(), top=3)
+        self.assertEqual(summary['posts:index']['traces'], 2)
+        self.assertLessEqual(len(summary['posts:index']['spans']), 3)
+        output = io.StringIO()
+        call_command('trace_summary', file=self.trace_file,
+                     route='posts:index', stdout=output)
+        self.assertIn('posts:index: трасс 2', output.getvalue())
+        self.assertNotIn('about:author', output.getvalue())
+
+
+@override_settings(SQL_STATS_ENABLED=True)
+class SQLLogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Тестовое соединение открыто до включения настройки.
+        sqllog.install(None, connection)
+        self.addCleanup(self.uninstall)
+
+    def uninstall(self):
+        connection.execute_wrappers[:] = [
+            wrapper for wrapper in connection.execute_wrappers
+            if not isinstance(wrapper, sqllog.QueryLogger)
+        ]
+
+    @override_settings(SQL_STATS_ENABLED=False)
+    def test_disabled(self):
+        """Без настройки обёртка не ставится, middleware не подключается."""
+        self.uninstall()
+        sqllog.install(None, connection)
+        self.assertFalse(any(
+            isinstance(wrapper, sqllog.QueryLogger)
+            for wrapper in connection.execute_wrappers
+        ))
+        with self.assertRaises(MiddlewareNotUsed):
+            sqllog.QueryLogMiddleware(lambda request: None)
+
+    def view_calls(self, view):
+        return sum(
+            count for row_view, _, count, _, _ in sqllog.stats.collect()
+            if row_view == view
+        )
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            sqllog.fingerprint(
+                'SELECT "id" FROM "posts_post"\n WHERE "id" IN (%s, %s, %s)'
+                " AND \"text\" = 'it''s' LIMIT 21"
+            ),
+            'SELECT "id" FROM "posts_post" WHERE "id" IN (...) '
+            'AND "text" = ? LIMIT ?'
+        )
+        self.assertEqual(
+            sqllog.fingerprint('INSERT INTO "t" ("a") VALUES (%s), (%s)'),
+            'INSERT INTO "t" ("a") VALUES (...)'
+        )
+
+    def test_queries_are_grouped_by_view(self):
+        before = self.view_calls('posts:index')
+        self.client.get(reverse('posts:index'))
+        self.assertGreater(self.view_calls('posts:index'), before)
+
+    @override_settings(SQL_SLOW_MS=0)
+    def test_slow_queries_are_logged_with_plan(self):
+        with self.assertLogs('diagnostics.sqllog', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        output = '\n'.join(logs.output)
+        self.assertIn('/', output)
+        self.assertRegex(output, r'SCAN|SEARCH')
+
+    def test_top_queries(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with self.assertRaises(CommandError):
+            call_command('top_queries', stdout=io.StringIO())
+        with override_settings(SQL_STATS_DIR=directory):
+            self.client.get(reverse('posts:index'))
+            sqllog.stats.flush(force=True)
+            output = io.StringIO()
+            call_command('top_queries', view='posts:index', stdout=output)
+        self.assertIn('posts:index', output.getvalue())
+        self.assertIn('posts_post', output.getvalue())
+
+
+@override_settings(MEMORY_PROFILING_ENABLED=True)
+class MemoryProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(tracemalloc.stop)
+        self.post = Post.objects.create(
+            author=User.objects.create_user(username='memory'),
+            text='Пост',
+        )
+
+    @override_settings(MEMORY_BUDGETS={'posts:post_detail': 1})
+    def test_budget_warning(self):
+        """Превышение бюджета view попадает в журнал."""
+        with self.assertLogs('diagnostics.memory', 'WARNING') as logs:
+            self.client.get(
+                reverse('posts:post_detail', args=(self.post.pk,))
+            )
+        self.assertIn('posts:post_detail', logs.output[0])
+
+    @override_settings(MEMORY_BUDGETS={})
+    def test_stats_by_view(self):
+        self.client.get(reverse('posts:post_detail', args=(self.post.pk,)))
+        with override_settings(METRICS_TOKEN=METRICS_TOKEN):
+            data = self.client.get(
+                reverse('diagnostics:memory'),
+                HTTP_AUTHORIZATION=AUTHORIZATION
+            ).json()
+        detail = data['posts:post_detail']
+        self.assertGreaterEqual(detail['requests'], 1)
+        self.assertGreater(detail['peak_max'], 0)
+        self.assertTrue(detail['top_sites'])
+        self.assertIsNone(detail['budget'])
+        self.assertEqual(
+            memory.stats.collect()['posts:post_detail']['requests'],
+            detail['requests']
+        )
@@ -0,0 +1,270 @@
+"""Трассировка запросов.
+
+TracingMiddleware заводит трассу с trace_id (он же в заголовке ответа
+X-Trace-Id) и корневым span запроса. Внутри неё span открывают
+ViewTracingMiddleware (вызов view), SQL-запросы (execute_wrapper), кеш
+(diagnostics.metrics.MeteredCache), {% include %} (тег из
+diagnostics.templatetags.tracing) и sorl-thumbnail (ThumbnailBackend).
+
+Решение о записи принимается в конце запроса (tail-based sampling):
+медленные (от TRACING_SLOW_MS) и упавшие запросы пишутся всегда,
+остальные - с вероятностью TRACING_SAMPLE_RATE. Трасса - одна JSON-строка
+в TRACING_FILE; сводку строит manage.py trace_summary.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+
+from .benchmark import percentile
+
+TRACE_HEADER = 'X-Trace-Id'
+SQL_LENGTH: int = 300
+SQL_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)"?', re.I)
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.timestamp = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.stack = []
+        self.dropped = 0
+        self.next_id = 0
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+class span:
+    """Вложенный span текущей трассы; без трассы ничего не делает."""
+    __slots__ = ('trace', 'kind', 'name', 'attrs', 'id', 'parent', 'started')
+
+    def __init__(self, kind, name, **attrs):
+        self.trace = current_trace()
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        trace = self.trace
+        if trace is not None:
+            self.id = trace.next_id
+            trace.next_id += 1
+            self.parent = trace.stack[-1].id if trace.stack else None
+            trace.stack.append(self)
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        trace = self.trace
+        if trace is None:
+            return
+        finished = time.perf_counter()
+        trace.stack.pop()
+        if (self.parent is not None
+                and len(trace.spans) >= settings.TRACING_MAX_SPANS):
+            trace.dropped += 1
+            return
+        record = {
+            'id': self.id,
+            'parent': self.parent,
+            'kind': self.kind,
+            'name': self.name,
+            'start_ms': round((self.started - trace.started) * 1000, 3),
+            'duration_ms': round((finished - self.started) * 1000, 3),
+        }
+        if self.attrs:
+            record['attrs'] = self.attrs
+        trace.spans.append(record)
+
+
+def sql_name(sql) -> str:
+    """«SELECT posts_post» - вид запроса и первая таблица."""
+    operation = sql.split(None, 1)[0].upper() if sql else ''
+    match = SQL_TABLE_RE.search(sql)
+    return f'{operation} {match[1]}' if match else operation
+
+
+def trace_sql(execute, sql, params, many, context):
+    with span('sql', sql_name(sql), sql=sql[:SQL_LENGTH], many=many):
+        return execute(sql, params, many, context)
+
+
+def should_keep(duration_ms, status) -> bool:
+    return (
+        duration_ms >= settings.TRACING_SLOW_MS
+        or status >= 500
+        or random.random() < settings.TRACING_SAMPLE_RATE
+    )
+
+
+def export(record):
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    with _write_lock, open(settings.TRACING_FILE, 'a') as file:
+        file.write(line)
+
+
+class TracingMiddleware:
+    def __init__(self, get_response):
+        if not settings.TRACING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace = Trace()
+        _local.trace = trace
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(trace_sql)
+                    )
+                stack.enter_context(span('request', request.path))
+                response = self.get_response(request)
+        finally:
+            _local.trace = None
+        match = request.resolver_match
+        route = match.view_name if match else 'unresolved'
+        root_record = trace.spans[-1]
+        root_record['name'] = route
+        response[TRACE_HEADER] = trace.trace_id
+        if should_keep(root_record['duration_ms'], response.status_code):
+            export({
+                'trace_id': trace.trace_id,
+                'route': route,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'duration_ms': root_record['duration_ms'],
+                'started': trace.timestamp,
+                'dropped_spans': trace.dropped,
+                'spans': trace.spans,
+            })
+        return response
+
+
+class ViewTracingMiddleware:
+    """Span вокруг view. Должен стоять последним в MIDDLEWARE.
+
+    Span открывается в process_view, а закрывается после ответа или в
+    process_exception: сам view вызывает Django, со всеми обработчиками
+    исключений.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TRACING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            self.finish(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if current_trace() is not None:
+            request._view_span = span(
+                'view', request.resolver_match.view_name
+            ).__enter__()
+
+    def process_exception(self, request, exception):
+        self.finish(request)
+
+    @staticmethod
+    def finish(request):
+        view_span = request.__dict__.pop('_view_span', None)
+        if view_span is not None:
+            view_span.__exit__(None, None, None)
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Бэкенд sorl-thumbnail со span на поиск и создание миниатюр."""
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        with span('thumbnail', geometry_string, file=str(file_)):
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        with span('thumbnail', f'create {geometry_string}',
+                  file=thumbnail.name):
+            return super()._create_thumbnail(
+                source_image, geometry_string, options, thumbnail
+            )
+
+
+def read_traces(path):
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def summarize(traces, top=10):
+    """Самые дорогие span по маршрутам.
+
+    Span сравниваются по собственному времени - без вложенных span,
+    иначе наверху всегда оказались бы view и шаблон страницы.
+    """
+    routes = {}
+    for trace in traces:
+        route = routes.setdefault(trace['route'], {
+            'durations': [], 'slowest': [], 'spans': {},
+        })
+        route['durations'].append(trace['duration_ms'])
+        route['slowest'].append((trace['duration_ms'], trace['trace_id']))
+        children = {}
+        for record in trace['spans']:
+            if record['parent'] is not None:
+                children[record['parent']] = (
+                    children.get(record['parent'], 0) + record['duration_ms']
+                )
+        for record in trace['spans']:
+            stats = route['spans'].setdefault(
+                (record['kind'], record['name']),
+                {'count': 0, 'total_ms': 0.0, 'self_ms': 0.0, 'max_ms': 0.0}
+            )
+            stats['count'] += 1
+            stats['total_ms'] += record['duration_ms']
+            stats['self_ms'] += max(
+                record['duration_ms'] - children.get(record['id'], 0), 0
+            )
+            stats['max_ms'] = max(stats['max_ms'], record['duration_ms'])
+    summary = {}
+    for name, route in routes.items():
+        durations = route['durations']
+        spans = sorted(
+            route['spans'].items(), key=lambda item: -item[1]['self_ms']
+        )[:top]
+        summary[name] = {
+            'traces': len(durations),
+            'p50_ms': percentile(durations, 50),
+            'p95_ms': percentile(durations, 95),
+            'max_ms': max(durations),
+            'slowest_traces': [
+                trace_id for _, trace_id in sorted(route['slowest'])[-3:][::-1]
+            ],
+            'spans': [
+                {'kind': kind, 'name': span_name, **{
+                    key: round(value, 3) for key, value in stats.items()
+                }}
+                for (kind, span_name), stats in spans
+            ],
+        }
+    return summary
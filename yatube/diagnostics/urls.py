@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'diagnostics'
+
+urlpatterns = [
+    path('metrics/', views.metrics, name='metrics'),
+    path('memory/', views.memory_usage, name='memory'),
+]
@@ -0,0 +1,49 @@
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+
+from . import memory
+from .metrics import exposition, registry
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def is_internal(request) -> bool:
+    """Запрос с токеном METRICS_TOKEN или с адреса из METRICS_ALLOWED_IPS."""
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    ):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def internal_only(view):
+    """Отдаёт страницу только внутренним запросам, см. is_internal."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not is_internal(request):
+            raise Http404
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@internal_only
+def metrics(request):
+    """Метрики всех процессов для Prometheus."""
+    registry.flush(force=True)
+    return HttpResponse(
+        exposition(registry.collect()), content_type=CONTENT_TYPE
+    )
+
+
+@internal_only
+def memory_usage(request):
+    """Пики памяти и места выделений по view, см. diagnostics.memory."""
+    return JsonResponse(
+        memory.stats.collect(), json_dumps_params={'ensure_ascii': False}
+    )
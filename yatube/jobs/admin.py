@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import Job, ScheduleEntry
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Очередь фоновых задач."""
+    list_display = ('pk', 'name', 'status', 'priority', 'attempts',
+                    'run_at', 'locked_by', 'created', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'dedupe_key', 'last_error')
+    readonly_fields = ('created', 'finished_at', 'locked_by', 'locked_at',
+                       'last_error')
+
+
+@admin.register(ScheduleEntry)
+class ScheduleEntryAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_run')
@@ -0,0 +1,118 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from core.sqlite import is_locked_error
+from jobs import queue, schedule
+
+
+def terminate(*args):
+    # Повторный SIGTERM не должен прерывать ожидание воркеров.
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def work(poll_interval):
+    """Цикл дочернего процесса: забирает и выполняет задачи.
+
+    SIGTERM не прерывает задачу: процесс доделывает её и выходит.
+    """
+    stopping = []
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    worker = queue.worker_name()
+    while not stopping:
+        try:
+            job = queue.claim(worker)
+        except OperationalError as error:
+            if not is_locked_error(error):
+                raise
+            job = None
+        if job is None:
+            connections.close_all()
+            time.sleep(poll_interval)
+            continue
+        queue.run(job)
+    connections.close_all()
+
+
+def start_worker():
+    process = multiprocessing.Process(
+        target=work, args=(settings.JOBS_POLL_INTERVAL,), daemon=True
+    )
+    process.start()
+    return process
+
+
+class Command(BaseCommand):
+    help = ('Запускает воркеры очереди задач и планировщик периодических '
+            'задач из JOBS_SCHEDULE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.JOBS_PROCESSES,
+            help='Сколько процессов выполняют задачи.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи в этом процессе и выйти.'
+        )
+        parser.add_argument(
+            '--no-scheduler', action='store_true',
+            help='Не ставить задачи по расписанию.'
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            if not options['no_scheduler']:
+                schedule.tick()
+            queue.requeue_stale()
+            done = queue.run_pending()
+            self.stdout.write(f'Выполнено задач: {done}')
+        else:
+            self.supervise(options['processes'], options['no_scheduler'])
+
+    def supervise(self, processes, no_scheduler):
+        """Держит воркеры и раз в JOBS_SCHEDULER_INTERVAL ставит задачи."""
+        # Дочерние процессы не должны делить соединения с родителем.
+        connections.close_all()
+        workers = [start_worker() for _ in range(processes)]
+        # SIGTERM завершает работу так же, как Ctrl+C; воркерам родитель
+        # передаёт SIGTERM сам.
+        signal.signal(signal.SIGTERM, terminate)
+        self.stdout.write(f'Воркеров: {len(workers)}')
+        try:
+            while True:
+                self.restart_dead(workers)
+                if not no_scheduler:
+                    for name in schedule.tick():
+                        self.stdout.write(f'По расписанию: {name}')
+                queue.requeue_stale()
+                time.sleep(settings.JOBS_SCHEDULER_INTERVAL)
+        except KeyboardInterrupt:
+            pass
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            process.join()
+        self.stdout.write('Воркеры остановлены')
+
+    def restart_dead(self, workers):
+        """Заменяет упавшие воркеры новыми; возвращает их число."""
+        dead = [index for index, process in enumerate(workers)
+                if not process.is_alive()]
+        if dead:
+            connections.close_all()
+        for index in dead:
+            process = workers[index]
+            process.join()
+            self.stderr.write(
+                f'Воркер {process.pid} завершился с кодом '
+                f'{process.exitcode}, запускаю новый'
+            )
+            workers[index] = start_worker()
+        return len(dead)
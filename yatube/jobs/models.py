@@ -0,0 +1,61 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Задача в очереди на выполнение воркером (manage.py run_jobs)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    payload = models.TextField('Аргументы', default='{}')
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=QUEUED
+    )
+    priority = models.IntegerField('Приоритет', default=0)
+    run_at = models.DateTimeField('Выполнить после', default=timezone.now)
+    dedupe_key = models.CharField(
+        'Ключ уникальности', max_length=200, unique=True,
+        blank=True, null=True,
+        help_text='Пока задача не завершена, вторая с тем же ключом '
+                  'в очередь не попадёт.'
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveIntegerField('Попыток всего', default=3)
+    locked_by = models.CharField('Воркер', max_length=100, blank=True)
+    locked_at = models.DateTimeField('Взята', blank=True, null=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    finished_at = models.DateTimeField('Завершена', blank=True, null=True)
+
+    class Meta:
+        ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at']),
+        ]
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+
+class ScheduleEntry(models.Model):
+    """Последний запуск задачи из расписания settings.JOBS_SCHEDULE."""
+    name = models.CharField('Название', max_length=100, primary_key=True)
+    last_run = models.DateTimeField('Последний запуск')
+
+    class Meta:
+        verbose_name = 'Запись расписания'
+        verbose_name_plural = 'Расписание'
+
+    def __str__(self):
+        return self.name
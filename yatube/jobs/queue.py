@@ -0,0 +1,205 @@
+"""Очередь фоновых задач в базе данных.
+
+Задача - функция с декоратором @task в модуле tasks приложения. Вызов
+func.delay(*args, **kwargs) кладёт в таблицу Job строку с аргументами в
+JSON; воркеры manage.py run_jobs забирают строки по приоритету и времени.
+Строка забирается условным UPDATE ... WHERE status='queued', поэтому
+несколько процессов не возьмут одну задачу и на SQLite.
+
+Упавшая задача возвращается в очередь с растущей паузой, пока не
+исчерпает max_attempts. Задача с dedupe_key не ставится, если такая же
+ещё не завершена. При JOBS_EAGER задачи выполняются сразу при вызове
+delay - для тестов и разработки без воркера.
+"""
+import datetime as dt
+import json
+import os
+import random
+import socket
+import time
+import traceback
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.sqlite import is_locked_error
+
+from .models import Job
+
+registry = {}
+
+
+class Task:
+    def __init__(self, func, name, priority, max_attempts):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+    def delay(self, *args, dedupe_key=None, priority=None, run_at=None,
+              **kwargs):
+        """Ставит задачу в очередь. None, если такая уже стоит."""
+        return enqueue(
+            self.name, args, kwargs, dedupe_key=dedupe_key,
+            priority=priority, run_at=run_at
+        )
+
+
+def task(name=None, priority=0, max_attempts=None):
+    """Объявляет функцию фоновой задачей."""
+
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = Task(
+            func, task_name, priority,
+            max_attempts or settings.JOBS_MAX_ATTEMPTS
+        )
+        return registry[task_name]
+
+    return decorator
+
+
+def enqueue(name, args=(), kwargs=None, dedupe_key=None, priority=None,
+            run_at=None):
+    task_obj = registry[name]
+    if settings.JOBS_EAGER:
+        task_obj(*args, **(kwargs or {}))
+        return None
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name,
+                payload=json.dumps({'args': list(args),
+                                    'kwargs': kwargs or {}}),
+                priority=(
+                    task_obj.priority if priority is None else priority
+                ),
+                run_at=run_at or timezone.now(),
+                dedupe_key=dedupe_key,
+                max_attempts=task_obj.max_attempts,
+            )
+    except IntegrityError:
+        if dedupe_key is None:
+            raise
+        return None
+
+
+def worker_name() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker):
+    """Забирает следующую задачу или возвращает None."""
+    for _ in range(5):
+        now = timezone.now()
+        pk = Job.objects.filter(
+            status=Job.QUEUED, run_at__lte=now
+        ).order_by('-priority', 'run_at', 'pk').values_list(
+            'pk', flat=True
+        ).first()
+        if pk is None:
+            return None
+        taken = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now,
+            attempts=F('attempts') + 1
+        )
+        if taken:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def retry_delay(attempt) -> dt.timedelta:
+    seconds = settings.JOBS_RETRY_DELAY * 2 ** (attempt - 1)
+    return dt.timedelta(seconds=seconds * random.uniform(0.5, 1.5))
+
+
+def run(job):
+    """Выполняет взятую задачу и записывает результат."""
+    try:
+        task_obj = registry[job.name]
+        payload = json.loads(job.payload)
+        task_obj(*payload['args'], **payload['kwargs'])
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts and job.name in registry:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            job.dedupe_key = None
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+        job.dedupe_key = None
+    job.locked_by = ''
+    job.locked_at = None
+    save_result(job)
+    return job.status
+
+
+def save_result(job):
+    """Записывает итог задачи, повторяя запись при «database is locked».
+
+    Задача уже выполнена: без записи она осталась бы RUNNING и через
+    JOBS_LOCK_TIMEOUT выполнилась бы ещё раз.
+    """
+    retries = settings.SQLITE_WRITE_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            job.save(update_fields=[
+                'status', 'run_at', 'finished_at', 'dedupe_key',
+                'last_error', 'locked_by', 'locked_at',
+            ])
+            return
+        except OperationalError as error:
+            if attempt == retries or not is_locked_error(error):
+                raise
+        time.sleep(0.05 * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def run_pending(limit=None, worker=None):
+    """Выполняет задачи, пока очередь не опустеет. Возвращает их число."""
+    worker = worker or worker_name()
+    count = 0
+    while limit is None or count < limit:
+        job = claim(worker)
+        if job is None:
+            break
+        run(job)
+        count += 1
+    return count
+
+
+def requeue_stale(now=None):
+    """Возвращает в очередь задачи воркеров, которые пропали."""
+    now = now or timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=now - dt.timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, dedupe_key=None,
+        last_error='Воркер не завершил задачу'
+    )
+    return stale.update(
+        status=Job.QUEUED, locked_by='', locked_at=None, run_at=now
+    )
+
+
+def prune(now=None):
+    """Удаляет выполненные задачи старше JOBS_KEEP_DONE секунд."""
+    now = now or timezone.now()
+    deleted, _ = Job.objects.filter(
+        status=Job.DONE,
+        finished_at__lt=now - dt.timedelta(seconds=settings.JOBS_KEEP_DONE)
+    ).delete()
+    return deleted
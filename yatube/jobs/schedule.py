@@ -0,0 +1,104 @@
+"""Периодические задачи по расписанию в формате cron.
+
+settings.JOBS_SCHEDULE: {'имя': {'task': 'модуль.функция',
+'cron': '*/15 * * * *', 'args': [...], 'kwargs': {...}}}. Поля cron -
+минута, час, день месяца, месяц, день недели (0 и 7 - воскресенье);
+поддерживаются *, списки через запятую, диапазоны a-b и шаг /n.
+Необязательный 'dedupe_key' заменяет ключ 'schedule:<имя>', чтобы
+задача по расписанию не запускалась рядом с такой же, поставленной кодом.
+
+tick, который вызывает run_jobs, ставит задачу в очередь, если с
+прошлого запуска наступила подходящая минута. Время прошлого запуска
+хранится в ScheduleEntry и меняется условным UPDATE, так что при
+нескольких планировщиках задача ставится один раз.
+"""
+import datetime as dt
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ScheduleEntry
+from .queue import enqueue
+
+FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+# Дольше суток минуты не перебираются: пропущенные запуски не копятся.
+MAX_LOOKBACK = dt.timedelta(days=1)
+
+
+def parse_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        spec, _, step = part.partition('/')
+        if spec == '*':
+            start, stop = low, high
+        elif '-' in spec:
+            start, stop = (int(value) for value in spec.split('-'))
+        else:
+            start = stop = int(spec)
+        if step and spec != '*' and '-' not in spec:
+            stop = high
+        if not low <= start <= stop <= high:
+            raise ValueError(f'Поле cron вне диапазона: {field}')
+        values.update(range(start, stop + 1, int(step or 1)))
+    return values
+
+
+class Cron:
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'В cron нужно 5 полей: {expression}')
+        (self.minutes, self.hours, self.days, self.months,
+         weekdays) = (
+            parse_field(field, low, high)
+            for field, (low, high) in zip(fields, FIELD_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def matches(self, moment) -> bool:
+        if (moment.minute not in self.minutes
+                or moment.hour not in self.hours
+                or moment.month not in self.months):
+            return False
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        # Как в cron: если заданы оба поля дня, хватает любого.
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def is_due(self, last_run, now) -> bool:
+        """Есть ли подходящая минута в (last_run, now]."""
+        moment = max(last_run, now - MAX_LOOKBACK).replace(
+            second=0, microsecond=0
+        ) + dt.timedelta(minutes=1)
+        while moment <= now:
+            if self.matches(timezone.localtime(moment)):
+                return True
+            moment += dt.timedelta(minutes=1)
+        return False
+
+
+def tick(now=None):
+    """Ставит в очередь задачи расписания, которым пора. Возвращает имена."""
+    now = now or timezone.now()
+    started = []
+    for name, entry in settings.JOBS_SCHEDULE.items():
+        state, created = ScheduleEntry.objects.get_or_create(
+            name=name, defaults={'last_run': now}
+        )
+        if created or not Cron(entry['cron']).is_due(state.last_run, now):
+            continue
+        claimed = ScheduleEntry.objects.filter(
+            name=name, last_run=state.last_run
+        ).update(last_run=now)
+        if claimed:
+            enqueue(
+                entry['task'], entry.get('args', ()), entry.get('kwargs'),
+                dedupe_key=entry.get('dedupe_key', f'schedule:{name}'),
+                priority=entry.get('priority'),
+            )
+            started.append(name)
+    return started
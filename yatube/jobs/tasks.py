@@ -0,0 +1,7 @@
+from .queue import prune, task
+
+
+@task(name='jobs.prune')
+def prune_jobs():
+    """Удаляет старые выполненные задачи."""
+    prune()
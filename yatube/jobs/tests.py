@@ -0,0 +1,161 @@
+import datetime as dt
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .management.commands import run_jobs
+from .models import Job, ScheduleEntry
+from .queue import claim, registry, requeue_stale, run, run_pending, task
+from .schedule import Cron, tick
+
+calls = []
+
+
+@task(name='jobs.tests.record', priority=1)
+def record(value):
+    calls.append(value)
+
+
+@task(name='jobs.tests.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('сбой')
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_priorities(self):
+        """Задачи выполняются по приоритету, затем по очереди."""
+        record.delay('first')
+        record.delay('second')
+        record.delay('urgent', priority=10)
+        self.assertEqual(run_pending(), 3)
+        self.assertEqual(calls, ['urgent', 'first', 'second'])
+        self.assertEqual(
+            Job.objects.filter(status=Job.DONE).count(), 3
+        )
+
+    def test_dedupe_key(self):
+        """Пока задача не выполнена, вторая с тем же ключом не ставится."""
+        self.assertIsNotNone(record.delay(1, dedupe_key='one'))
+        self.assertIsNone(record.delay(2, dedupe_key='one'))
+        run_pending()
+        self.assertIsNotNone(record.delay(3, dedupe_key='one'))
+        run_pending()
+        self.assertEqual(calls, [1, 3])
+
+    def test_delayed_jobs_wait(self):
+        record.delay('later', run_at=timezone.now() + dt.timedelta(hours=1))
+        self.assertEqual(run_pending(), 0)
+
+    def test_retries(self):
+        """Упавшая задача повторяется с паузой, затем помечается ошибкой."""
+        job = fail.delay(dedupe_key='fail')
+        run(claim('test'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('RuntimeError', job.last_error)
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        run(claim('test'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNone(job.dedupe_key)
+
+    def test_result_saved_after_lock(self):
+        """Итог задачи записывается и после «database is locked»."""
+        record.delay('locked')
+        job = claim('test')
+        save = Job.save
+        failures = [OperationalError('database is locked')]
+
+        def flaky_save(instance, *args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return save(instance, *args, **kwargs)
+
+        with mock.patch.object(Job, 'save', flaky_save), \
+                mock.patch('jobs.queue.time.sleep'):
+            self.assertEqual(run(job), Job.DONE)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_dead_workers_are_restarted(self):
+        alive, dead = mock.Mock(), mock.Mock(pid=1, exitcode=-9)
+        alive.is_alive.return_value = True
+        dead.is_alive.return_value = False
+        workers = [alive, dead]
+        command = run_jobs.Command(stderr=StringIO())
+        with mock.patch.object(run_jobs, 'start_worker') as start_worker:
+            self.assertEqual(command.restart_dead(workers), 1)
+        self.assertEqual(workers, [alive, start_worker.return_value])
+        dead.join.assert_called_once_with()
+
+    def test_stale_jobs_are_requeued(self):
+        job = record.delay('lost')
+        claim('gone')
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - dt.timedelta(days=1)
+        )
+        self.assertEqual(requeue_stale(), 1)
+        run_pending()
+        self.assertEqual(calls, ['lost'])
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager(self):
+        self.assertIsNone(record.delay('now'))
+        self.assertEqual(calls, ['now'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_run_jobs_once(self):
+        record.delay('cli')
+        output = StringIO()
+        call_command('run_jobs', once=True, no_scheduler=True, stdout=output)
+        self.assertEqual(calls, ['cli'])
+        self.assertIn('Выполнено задач: 1', output.getvalue())
+
+    def test_tasks_are_discovered(self):
+        self.assertIn('jobs.prune', registry)
+        self.assertIn('posts.make_thumbnail', registry)
+
+
+class ScheduleTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_cron(self):
+        cron = Cron('*/15 9-17 * * 1-5')
+        monday = dt.datetime(2026, 10, 19, 9, 30)
+        self.assertTrue(cron.matches(monday))
+        self.assertFalse(cron.matches(monday.replace(minute=31)))
+        self.assertFalse(cron.matches(monday.replace(hour=8)))
+        self.assertFalse(cron.matches(monday + dt.timedelta(days=6)))
+        self.assertTrue(Cron('0 0 * * 0').matches(dt.datetime(2026, 10, 25)))
+        self.assertTrue(Cron('0 0 * * 7').matches(dt.datetime(2026, 10, 25)))
+        with self.assertRaises(ValueError):
+            Cron('* * *')
+        with self.assertRaises(ValueError):
+            Cron('61 * * * *')
+
+    @override_settings(JOBS_SCHEDULE={
+        'record': {'task': 'jobs.tests.record', 'cron': '0 * * * *',
+                   'args': ['hourly']},
+    })
+    def test_tick(self):
+        """Задача ставится один раз, когда наступает её минута."""
+        start = timezone.now().replace(minute=10, second=0, microsecond=0)
+        self.assertEqual(tick(start), [])
+        self.assertEqual(tick(start + dt.timedelta(minutes=30)), [])
+        next_hour = start + dt.timedelta(minutes=50)
+        self.assertEqual(tick(next_hour), ['record'])
+        self.assertEqual(tick(next_hour), [])
+        self.assertEqual(
+            ScheduleEntry.objects.get(name='record').last_run, next_hour
+        )
+        run_pending()
+        self.assertEqual(calls, ['hourly'])
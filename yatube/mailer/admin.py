@@ -0,0 +1,23 @@
+from django.contrib import admin
+
+from .models import OutboundEmail
+from .outbox import requeue
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    """Очередь исходящих писем и недоставленные письма."""
+    list_display = ('pk', 'subject', 'recipients', 'status', 'attempts',
+                    'next_attempt', 'created')
+    list_filter = ('status',)
+    search_fields = ('subject', 'recipients', 'last_error')
+    exclude = ('message',)
+    readonly_fields = ('from_email', 'recipients', 'subject', 'attempts',
+                       'last_error', 'created')
+    actions = ('send_again',)
+
+    def send_again(self, request, queryset):
+        count = requeue(queryset)
+        self.message_user(request, f'Снова в очереди: {count}')
+
+    send_again.short_description = 'Отправить снова'
@@ -0,0 +1,24 @@
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .outbox import SEND_KEY, store
+from .tasks import send_queued
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Кладёт письма в очередь и сразу возвращает управление.
+
+    Отправляет их задача mailer.send через MAILER_BACKEND.
+    """
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        try:
+            count = len(store(email_messages))
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return 0
+        if count:
+            send_queued.delay(dedupe_key=SEND_KEY)
+        return count
@@ -0,0 +1,37 @@
+from email import message_from_bytes
+from email.header import decode_header, make_header
+
+from django.core.management.base import BaseCommand
+
+from mailer.smtp import LocalSMTPServer
+
+
+class Command(BaseCommand):
+    help = ('Запускает локальный SMTP-сервер, который принимает письма и '
+            'печатает их вместо отправки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, **options):
+        command = self
+
+        class Server(LocalSMTPServer):
+            def receive(self, received):
+                super().receive(received)
+                message = message_from_bytes(received.data)
+                subject = make_header(decode_header(message['Subject'] or ''))
+                command.stdout.write(
+                    f'{received.mail_from} -> {", ".join(received.recipients)}'
+                    f': {subject} ({len(received.data)} байт)'
+                )
+
+        server = Server(options['host'], options['port'])
+        self.stdout.write(f'SMTP на {options["host"]}:{server.port}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
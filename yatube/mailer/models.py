@@ -0,0 +1,37 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutboundEmail(models.Model):
+    """Письмо в очереди на отправку; отправленные письма удаляются."""
+    QUEUED = 'queued'
+    DEAD = 'dead'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (DEAD, 'Не доставлено'),
+    )
+
+    from_email = models.CharField('Отправитель', max_length=254)
+    recipients = models.TextField('Получатели', help_text='Список в JSON.')
+    subject = models.CharField('Тема', max_length=255, blank=True)
+    message = models.BinaryField('Письмо')
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=QUEUED
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    next_attempt = models.DateTimeField(
+        'Отправить после', default=timezone.now
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['status', 'next_attempt']),
+        ]
+        verbose_name = 'Письмо'
+        verbose_name_plural = 'Исходящие письма'
+
+    def __str__(self):
+        return f'{self.subject} ({self.status})'
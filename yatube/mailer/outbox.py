@@ -0,0 +1,162 @@
+"""Очередь исходящих писем в базе и их отправка пачками.
+
+Бэкенд QueuedEmailBackend сохраняет письмо целиком (MIME, как его собрал
+Django) в OutboundEmail и ставит задачу mailer.send. Задача забирает
+готовые письма пачками по MAILER_BATCH_SIZE и отправляет каждую пачку
+через одно соединение бэкенда MAILER_BACKEND. Отправленное письмо
+удаляется из очереди.
+
+При ошибке письмо откладывается с растущей паузой; после
+MAILER_MAX_ATTEMPTS попыток, а при отказе сервера с кодом 5xx сразу,
+оно остаётся в базе в состоянии dead - это очередь недоставленных писем,
+из админки их можно отправить снова. Если воркер упадёт посреди пачки,
+часть писем уйдёт повторно.
+"""
+import datetime as dt
+import json
+import logging
+import smtplib
+import time
+from email import message_from_bytes
+from email.message import Message
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.message import MIMEMixin
+from django.utils import timezone
+
+from diagnostics.metrics import registry
+from diagnostics.tracing import span
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+SEND_KEY = 'mailer:send'
+BATCH_BUCKETS = (1, 5, 10, 25, 50, 100, 250)
+
+
+class ParsedMessage(MIMEMixin, Message):
+    """Разобранное письмо с as_bytes(linesep=...), как у писем Django."""
+
+
+class StoredMessage(EmailMessage):
+    """Письмо из очереди: MIME отдаётся как сохранён, без пересборки."""
+
+    def __init__(self, email):
+        super().__init__(
+            from_email=email.from_email, to=json.loads(email.recipients)
+        )
+        self.raw = bytes(email.message)
+
+    def message(self):
+        return message_from_bytes(self.raw, _class=ParsedMessage)
+
+
+def store(messages):
+    """Сохраняет письма Django в очередь."""
+    emails = OutboundEmail.objects.bulk_create(
+        OutboundEmail(
+            from_email=message.from_email,
+            recipients=json.dumps(message.recipients()),
+            subject=str(message.subject)[:255],
+            message=message.message().as_bytes(),
+        )
+        for message in messages if message.recipients()
+    )
+    registry.inc('yatube_emails_total', {'result': 'queued'}, len(emails))
+    return emails
+
+
+def retry_delay(attempt) -> dt.timedelta:
+    seconds = settings.MAILER_RETRY_DELAY * 2 ** (attempt - 1)
+    return dt.timedelta(seconds=seconds)
+
+
+def is_permanent(error) -> bool:
+    """Отказ сервера, который не исправится повтором (коды 5xx)."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return (isinstance(error, smtplib.SMTPResponseException)
+            and error.smtp_code >= 500)
+
+
+def defer(email, error, now):
+    email.attempts += 1
+    email.last_error = f'{error.__class__.__name__}: {error}'
+    if is_permanent(error) or email.attempts >= settings.MAILER_MAX_ATTEMPTS:
+        email.status = OutboundEmail.DEAD
+        logger.warning('Письмо #%d не доставлено: %s', email.pk,
+                       email.last_error)
+    else:
+        email.next_attempt = now + retry_delay(email.attempts)
+    email.save(update_fields=[
+        'attempts', 'last_error', 'status', 'next_attempt'
+    ])
+    return 'dead' if email.status == OutboundEmail.DEAD else 'retry'
+
+
+def send_batch(emails) -> int:
+    """Отправляет письма через одно соединение, возвращает число ушедших."""
+    started = time.perf_counter()
+    connection = get_connection(settings.MAILER_BACKEND, fail_silently=False)
+    sent, failed = [], []
+    with span('mail', 'send_batch', size=len(emails)):
+        try:
+            connection.open()
+        except Exception as error:
+            failed = [(email, error) for email in emails]
+        else:
+            try:
+                for email in emails:
+                    try:
+                        connection.send_messages([StoredMessage(email)])
+                    except Exception as error:
+                        failed.append((email, error))
+                    else:
+                        sent.append(email.pk)
+            finally:
+                try:
+                    connection.close()
+                except Exception:
+                    logger.exception('Ошибка при закрытии соединения')
+    OutboundEmail.objects.filter(pk__in=sent).delete()
+    now = timezone.now()
+    results = [defer(email, error, now) for email, error in failed]
+    registry.inc('yatube_emails_total', {'result': 'sent'}, len(sent))
+    for result in ('retry', 'dead'):
+        registry.inc('yatube_emails_total', {'result': result},
+                     results.count(result))
+    registry.observe('yatube_email_batch_size', {}, len(emails),
+                     buckets=BATCH_BUCKETS)
+    registry.observe('yatube_email_batch_seconds', {},
+                     time.perf_counter() - started)
+    registry.flush()
+    return len(sent)
+
+
+def flush(batch_size=None) -> int:
+    """Отправляет готовые письма пачками, возвращает число ушедших."""
+    batch_size = batch_size or settings.MAILER_BATCH_SIZE
+    sent = 0
+    while True:
+        batch = list(OutboundEmail.objects.filter(
+            status=OutboundEmail.QUEUED, next_attempt__lte=timezone.now()
+        ).order_by('pk')[:batch_size])
+        if not batch:
+            return sent
+        # Каждое письмо пачки либо удаляется, либо откладывается,
+        # поэтому цикл заканчивается.
+        sent += send_batch(batch)
+
+
+def requeue(queryset) -> int:
+    """Возвращает недоставленные письма в очередь."""
+    count = queryset.filter(status=OutboundEmail.DEAD).update(
+        status=OutboundEmail.QUEUED, attempts=0,
+        next_attempt=timezone.now(), last_error=''
+    )
+    if count:
+        from .tasks import send_queued
+        send_queued.delay(dedupe_key=SEND_KEY)
+    return count
@@ -0,0 +1,102 @@
+"""Локальный SMTP-сервер вместо настоящего для тестов и разработки.
+
+Принимает любые письма без авторизации и складывает их в messages.
+Адреса из refuse получают отказ 550. manage.py run_smtp запускает сервер
+и печатает принятые письма.
+"""
+import socketserver
+import threading
+from collections import namedtuple
+from email import message_from_bytes
+
+Received = namedtuple('Received', 'mail_from recipients data')
+
+
+def _address(argument):
+    return argument.partition(':')[2].strip().split()[0].strip('<>')
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, text):
+        self.wfile.write(f'{text}\r\n'.encode())
+
+    def read_data(self):
+        lines = []
+        for line in self.rfile:
+            if line == b'.\r\n':
+                break
+            lines.append(line[1:] if line.startswith(b'..') else line)
+        return b''.join(lines)
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost SMTP')
+        mail_from, recipients = None, []
+        for line in self.rfile:
+            command, _, argument = line.decode(
+                'ascii', 'replace'
+            ).strip().partition(' ')
+            command = command.upper()
+            if command == 'EHLO':
+                self.reply('250-localhost\r\n250 8BITMIME')
+            elif command in ('HELO', 'NOOP'):
+                self.reply('250 OK')
+            elif command == 'MAIL':
+                mail_from, recipients = _address(argument), []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                address = _address(argument)
+                if address in server.refuse:
+                    self.reply('550 Mailbox unavailable')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                server.receive(Received(mail_from, recipients,
+                                        self.read_data()))
+                self.reply('250 OK')
+            elif command == 'RSET':
+                mail_from, recipients = None, []
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """SMTP-сервер в фоновом потоке: with LocalSMTPServer() as server."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, refuse=()):
+        super().__init__((host, port), SMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.refuse = set(refuse)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def receive(self, received):
+        with self.lock:
+            self.messages.append(received)
+
+    def parsed(self):
+        """Принятые письма как email.message.Message."""
+        with self.lock:
+            return [message_from_bytes(item.data) for item in self.messages]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
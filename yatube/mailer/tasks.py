@@ -0,0 +1,9 @@
+from jobs.queue import task
+
+from .outbox import flush
+
+
+@task(name='mailer.send', priority=10)
+def send_queued():
+    """Отправляет письма из очереди."""
+    flush()
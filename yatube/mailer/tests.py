@@ -0,0 +1,121 @@
+import datetime as dt
+import socket
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from diagnostics.metrics import registry
+from jobs.models import Job
+from jobs.queue import run_pending
+
+from .models import OutboundEmail
+from .outbox import flush, requeue
+from .smtp import LocalSMTPServer
+
+User = get_user_model()
+
+QUEUED_SETTINGS = {
+    'EMAIL_BACKEND': 'mailer.backends.QueuedEmailBackend',
+    'MAILER_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+    'EMAIL_HOST': '127.0.0.1',
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def sent_total(result):
+    return registry.collect().get(
+        ('yatube_emails_total', (('result', result),)), 0
+    )
+
+
+@override_settings(**QUEUED_SETTINGS)
+class QueuedEmailTests(TestCase):
+    def setUp(self):
+        self.server = LocalSMTPServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.port_settings = self.settings(EMAIL_PORT=self.server.port)
+        self.port_settings.enable()
+        self.addCleanup(self.port_settings.disable)
+
+    def send(self, count=1, to='reader@example.com'):
+        for number in range(count):
+            mail.send_mail(f'Письмо {number}', 'Привет, читатель!',
+                           'yatube@example.com', [to])
+
+    def test_send_returns_before_delivery(self):
+        """send_mail только кладёт письмо в очередь и ставит задачу."""
+        self.send()
+        self.assertEqual(self.server.messages, [])
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+        self.assertEqual(Job.objects.filter(name='mailer.send').count(), 1)
+        run_pending()
+        self.assertFalse(OutboundEmail.objects.exists())
+        received, = self.server.messages
+        self.assertEqual(received.recipients, ['reader@example.com'])
+        message, = self.server.parsed()
+        self.assertEqual(message.get_payload(decode=True).decode().strip(),
+                         'Привет, читатель!')
+
+    def test_batches_share_connection(self):
+        self.send(5)
+        with self.settings(MAILER_BATCH_SIZE=2):
+            self.assertEqual(flush(), 5)
+        self.assertEqual(len(self.server.messages), 5)
+        self.assertEqual(self.server.connections, 3)
+
+    def test_temporary_failure_is_retried(self):
+        """Недоступный сервер: письмо откладывается, затем уходит в dead."""
+        self.send()
+        retries = sent_total('retry')
+        with self.settings(EMAIL_PORT=free_port(), MAILER_MAX_ATTEMPTS=2):
+            self.assertEqual(flush(), 0)
+            email = OutboundEmail.objects.get()
+            self.assertEqual(email.attempts, 1)
+            self.assertGreater(email.next_attempt, timezone.now())
+            self.assertEqual(flush(), 0)
+            OutboundEmail.objects.update(
+                next_attempt=timezone.now() - dt.timedelta(seconds=1)
+            )
+            with self.assertLogs('mailer.outbox', 'WARNING'):
+                flush()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts),
+                         (OutboundEmail.DEAD, 2))
+        self.assertEqual(sent_total('retry'), retries + 1)
+
+    def test_refused_recipient_is_dead_letter(self):
+        """Отказ 5xx сразу отправляет письмо в dead, остальные уходят."""
+        self.server.refuse.add('gone@example.com')
+        self.send(to='gone@example.com')
+        self.send(2)
+        with self.assertLogs('mailer.outbox', 'WARNING'):
+            self.assertEqual(flush(), 2)
+        dead = OutboundEmail.objects.get()
+        self.assertEqual((dead.status, dead.attempts),
+                         (OutboundEmail.DEAD, 1))
+        self.assertIn('SMTPRecipientsRefused', dead.last_error)
+        self.server.refuse.clear()
+        self.assertEqual(requeue(OutboundEmail.objects.all()), 1)
+        run_pending()
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.assertEqual(len(self.server.messages), 3)
+
+    def test_password_reset_is_queued(self):
+        User.objects.create_user('reader', 'reader@example.com', 'pass')
+        response = self.client.post(
+            reverse('password_reset'), {'email': 'reader@example.com'}
+        )
+        self.assertRedirects(response, reverse('password_reset_done'))
+        self.assertEqual(self.server.messages, [])
+        email = OutboundEmail.objects.get()
+        self.assertIn('reader@example.com', email.recipients)
+        run_pending()
+        self.assertEqual(len(self.server.messages), 1)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Group, Post
+from .models import DigestRun, Group, Post
 
 
 @admin.register(Post)
@@ -14,3 +14,9 @@ class PostAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Group)
+
+
+@admin.register(DigestRun)
+class DigestRunAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'since', 'until', 'emails', 'last_user_id',
+                    'started', 'finished')
@@ -5,3 +5,6 @@ class PostsConfig(AppConfig):
     """Конфигурирует приложение posts."""
     name = 'posts'
     verbose_name = 'Публикация и управление записями'
+
+    def ready(self):
+        from . import holes, signals  # noqa: F401
@@ -1,4 +1,9 @@
 from django.core.paginator import Paginator
+from django.db.models import Q, Subquery
+from django.utils.functional import cached_property
+
+from .models import Comment
+from .sharding import db_for_post
 
 
 def paginator(posts, num_of_posts, request):
@@ -6,3 +11,62 @@ def paginator(posts, num_of_posts, request):
     paginator = Paginator(posts, num_of_posts)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
+
+
+class CommentsBatch:
+    """Порция комментариев поста после курсора.
+
+    Курсор - pk последнего показанного комментария. Комментарии
+    загружаются одним запросом вместе с авторами и только при первом
+    обращении к порции.
+    """
+
+    def __init__(self, post_id, size, after=None):
+        self.post_id = post_id
+        self.size = size
+        self.after = after
+
+    def get_queryset(self):
+        objects = Comment.objects.using(db_for_post(self.post_id))
+        comments = objects.filter(
+            post_id=self.post_id
+        ).select_related('author')
+        if self.after is not None:
+            anchor = objects.filter(
+                post_id=self.post_id, pk=self.after
+            ).values('created')[:1]
+            comments = comments.filter(
+                Q(created__gt=Subquery(anchor))
+                | Q(created=Subquery(anchor), pk__gt=self.after)
+            )
+        return comments
+
+    @cached_property
+    def _rows(self):
+        return list(self.get_queryset()[:self.size + 1])
+
+    @property
+    def object_list(self):
+        return self._rows[:self.size]
+
+    @property
+    def has_next(self):
+        return len(self._rows) > self.size
+
+    @property
+    def next_cursor(self):
+        if self.has_next:
+            return self.object_list[-1].pk
+        return None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
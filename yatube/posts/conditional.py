@@ -0,0 +1,199 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .lookups import get_cached
+from .markers import (author_scope, follow_scope, get_markers, group_scope,
+                      post_scope, site_scope)
+from .models import Follow, Group, Post
+from .sharding import db_for_post
+
+User = get_user_model()
+
+FOLLOWING_CACHE_TIMEOUT: int = 60 * 60
+# Дальние страницы лент открывают редко, их каркасы не кешируются.
+SKELETON_MAX_PAGE: int = 50
+
+
+def get_page_markers(request, scopes_func, kwargs):
+    """Маркеры лент страницы, один раз за запрос.
+
+    scopes_func(request, **kwargs) возвращает области страницы
+    (не больше одного индексированного запроса) или None, если объекта
+    нет - тогда view сам отдаст 404.
+    """
+    if not hasattr(request, '_page_markers'):
+        request._page_markers = {}
+    if scopes_func not in request._page_markers:
+        scopes = scopes_func(request, **kwargs)
+        request._page_markers[scopes_func] = (
+            None if scopes is None else get_markers(*scopes)
+        )
+    return request._page_markers[scopes_func]
+
+
+def is_settled(markers, settle: int) -> bool:
+    """Прошло ли settle секунд с последнего изменения лент.
+
+    settle - время жизни фрагментов страницы в кеше: пока оно не прошло,
+    фрагмент может быть устаревшим.
+    """
+    return time.time() - max(markers) >= settle
+
+
+def page_condition(scopes_func, settle: int = 0):
+    """Отвечает 304, если ленты страницы не менялись.
+
+    ETag учитывает пользователя: в шапке выводится его имя.
+    Last-Modified отдаётся только анонимам, для них страница одинакова.
+    Пока фрагменты страницы могут быть устаревшими (settle), условный
+    ответ не отдаётся.
+    """
+
+    def get_page_state(request, **kwargs):
+        markers = get_page_markers(request, scopes_func, kwargs)
+        if markers is None or not is_settled(markers, settle):
+            return None
+        return markers
+
+    def etag_func(request, *args, **kwargs):
+        markers = get_page_state(request, **kwargs)
+        if markers is None:
+            return None
+        user_id = request.user.pk or 0
+        return '-'.join(str(marker) for marker in (user_id, *markers))
+
+    def last_modified_func(request, *args, **kwargs):
+        markers = get_page_state(request, **kwargs)
+        if markers is None or request.user.is_authenticated:
+            return None
+        return timezone.datetime.fromtimestamp(max(markers), timezone.utc)
+
+    return condition(etag_func=etag_func,
+                     last_modified_func=last_modified_func)
+
+
+def skeleton_page(request):
+    """Номер страницы для ключа каркаса; None - каркас не кешируется.
+
+    Ключ строится только по номеру страницы, а не по всей строке
+    запроса, чтобы лишние параметры не плодили записи в кеше.
+    """
+    page = request.GET.get('page', '1')
+    if not page.isdigit() or not 1 <= int(page) <= SKELETON_MAX_PAGE:
+        return None
+    return int(page)
+
+
+def skeleton_cache(scopes_func, settle: int = 0):
+    """Кеширует страницу с незаполненными дырками (см. core.holes).
+
+    Каркас одинаков для всех пользователей и лежит в кеше, пока не
+    изменятся маркеры лент страницы. Таймаут задаётся настройкой
+    PAGE_SKELETON_CACHE_TIMEOUT, 0 выключает кеш.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timeout = settings.PAGE_SKELETON_CACHE_TIMEOUT
+            page = skeleton_page(request)
+            if (
+                not timeout or page is None
+                or request.method not in ('GET', 'HEAD')
+            ):
+                return view(request, *args, **kwargs)
+            markers = get_page_markers(request, scopes_func, kwargs)
+            if markers is None:
+                return view(request, *args, **kwargs)
+            key = 'posts:skeleton:{}:{}:{}'.format(
+                request.path, page,
+                '-'.join(str(marker) for marker in markers)
+            )
+            skeleton = cache.get(key)
+            if skeleton is not None:
+                content, content_type = skeleton
+                return HttpResponse(content, content_type=content_type)
+            response = view(request, *args, **kwargs)
+            if (
+                response.status_code == 200
+                and not response.streaming
+                and is_settled(markers, settle)
+            ):
+                skeleton = (response.content, response['Content-Type'])
+                cache.set(key, skeleton, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def index_scopes(request):
+    return [site_scope()]
+
+
+def group_scopes(request, slug):
+    group = get_cached(Group, 'slug', slug)
+    if group is None:
+        return None
+    return [group_scope(group.pk)]
+
+
+def _get_author_id(request, username):
+    author = get_cached(User, 'username', username)
+    return None if author is None else author.pk
+
+
+def profile_skeleton_scopes(request, username):
+    author_id = _get_author_id(request, username)
+    if author_id is None:
+        return None
+    return [author_scope(author_id)]
+
+
+def profile_scopes(request, username):
+    scopes = profile_skeleton_scopes(request, username)
+    if scopes is not None and request.user.is_authenticated:
+        scopes.append(follow_scope(request.user.pk))
+    return scopes
+
+
+def post_scopes(request, post_id):
+    post = Post.objects.using(db_for_post(post_id)).filter(
+        pk=post_id
+    ).values_list('author_id', 'group_id').first()
+    if post is None:
+        return None
+    author_id, group_id = post
+    scopes = [post_scope(post_id), author_scope(author_id)]
+    if group_id is not None:
+        scopes.append(group_scope(group_id))
+    return scopes
+
+
+def _followed_ids(user_id, marker) -> list:
+    # Список меняется только вместе с отметкой подписок пользователя.
+    key = f'posts:following:{user_id}:{marker}'
+    author_ids = cache.get(key)
+    if author_ids is None:
+        author_ids = list(Follow.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True))
+        cache.set(key, author_ids, FOLLOWING_CACHE_TIMEOUT)
+    return author_ids
+
+
+def follow_scopes(request):
+    """Подписки пользователя и ленты авторов из них.
+
+    Пост автора меняет только отметку автора, а не ленты всех его
+    подписчиков.
+    """
+    scope = follow_scope(request.user.pk)
+    author_ids = _followed_ids(request.user.pk, get_markers(scope)[0])
+    return [scope, *(author_scope(author_id) for author_id in author_ids)]
@@ -0,0 +1,288 @@
+"""Счётчики просмотров постов с отложенной записью.
+
+Просмотр поста (включая ответы из кеша и 304) только меняет словарь в
+памяти процесса: число просмотров и HyperLogLog посетителей. Поток,
+который запускает start_flushing из yatube/wsgi.py, раз в
+VIEWS_FLUSH_INTERVAL секунд записывает накопленное в ViewCounter одной
+транзакцией: новые строки - одним INSERT, существующие - одним UPDATE
+через bulk_update. Там же просмотры постов складываются в счётчики их
+авторов и в счёт популярности (posts.trending), а итоги кладутся в кеш,
+откуда их читают страницы. Если
+процесс упадёт, несброшенные просмотры пропадут - это не больше
+интервала.
+
+HyperLogLog занимает 2 ** VIEWS_HLL_PRECISION байт на счётчик
+независимо от числа читателей; при точности 11 ошибка оценки около 2%.
+"""
+import atexit
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (IntegrityError, OperationalError, connections,
+                       transaction)
+from django.db.models import Q
+from django.utils import timezone
+
+from core import warmup
+from core.sqlite import is_locked_error
+
+from .models import Post, ViewCounter
+from .sharding import get_shards
+from .trending import record
+
+logger = logging.getLogger(__name__)
+
+# Кеш процесса не видит записей других процессов: итоги в нём живут
+# недолго, чтобы чужие просмотры появлялись на странице.
+TOTALS_CACHE_TIMEOUT: int = 60
+
+
+class HyperLogLog:
+    """Оценка числа различных значений в массиве фиксированного размера."""
+
+    def __init__(self, precision=None, registers=None):
+        if registers is not None:
+            self.registers = bytearray(registers)
+            self.precision = len(self.registers).bit_length() - 1
+        else:
+            self.precision = precision or settings.VIEWS_HLL_PRECISION
+            self.registers = bytearray(1 << self.precision)
+
+    def add(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if len(other.registers) != len(self.registers):
+            raise ValueError('Разная точность HyperLogLog')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        raw = alpha * size * size / sum(2.0 ** -rank
+                                        for rank in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * size and zeros:
+            # Для малых чисел точнее подсчёт пустых регистров.
+            return round(size * math.log(size / zeros))
+        return round(raw)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+
+def visitor_id(request) -> str:
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return 'anon:{}:{}'.format(request.META.get('REMOTE_ADDR', ''),
+                               request.META.get('HTTP_USER_AGENT', ''))
+
+
+def _post_authors(post_ids) -> dict:
+    """{id поста: (id автора, id группы)}."""
+    authors = {}
+    for alias in get_shards():
+        authors.update(
+            (pk, (author_id, group_id))
+            for pk, author_id, group_id in Post.objects.using(alias).filter(
+                pk__in=post_ids
+            ).values_list('pk', 'author_id', 'group_id')
+        )
+    return authors
+
+
+def _merge_into(updates, key, views, sketch):
+    total, merged = updates.get(key, (0, None))
+    if merged is None:
+        merged = HyperLogLog(registers=sketch.registers)
+    else:
+        merged.merge(sketch)
+    updates[key] = (total + views, merged)
+
+
+def _totals_key(kind, object_id) -> str:
+    return f'posts:views:{kind}:{object_id}'
+
+
+def _apply(updates):
+    """Прибавляет updates к строкам ViewCounter; возвращает итоги строк."""
+    lookup = Q()
+    for kind, _ in ViewCounter.KINDS:
+        ids = [object_id for key, object_id in updates if key == kind]
+        if ids:
+            lookup |= Q(kind=kind, object_id__in=ids)
+    with transaction.atomic():
+        rows = {
+            (row.kind, row.object_id): row
+            for row in ViewCounter.objects.select_for_update().filter(lookup)
+        }
+        created = []
+        for (kind, object_id), (views, sketch) in updates.items():
+            row = rows.get((kind, object_id))
+            if row is None:
+                created.append(ViewCounter(
+                    kind=kind, object_id=object_id, views=views,
+                    sketch=sketch.to_bytes()
+                ))
+                continue
+            stored = HyperLogLog(registers=row.sketch)
+            stored.merge(sketch)
+            row.views += views
+            row.sketch = stored.to_bytes()
+        ViewCounter.objects.bulk_create(created)
+        ViewCounter.objects.bulk_update(
+            list(rows.values()), ['views', 'sketch']
+        )
+    return {
+        _totals_key(row.kind, row.object_id): (row.views, row.sketch)
+        for row in (*rows.values(), *created)
+    }
+
+
+def write_counters(pending):
+    """Добавляет {id поста: (просмотры, HyperLogLog)} к счётчикам в базе."""
+    updates = {}
+    trending = []
+    authors = _post_authors(list(pending))
+    for post_id, (views, sketch) in pending.items():
+        _merge_into(updates, (ViewCounter.POST, post_id), views, sketch)
+        if post_id in authors:
+            author_id, group_id = authors[post_id]
+            _merge_into(updates, (ViewCounter.AUTHOR, author_id),
+                        views, sketch)
+            trending.append((post_id, group_id, views))
+    now = timezone.now()
+    retries = settings.SQLITE_WRITE_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic():
+                totals = _apply(updates)
+                record('view', trending, now)
+            break
+        except (OperationalError, IntegrityError) as error:
+            # Строку успел создать другой процесс или база занята.
+            locked = isinstance(error, IntegrityError) or is_locked_error(
+                error
+            )
+            if attempt == retries or not locked:
+                raise
+        time.sleep(0.05 * 2 ** attempt * random.uniform(0.5, 1.5))
+    cache.set_many(totals, TOTALS_CACHE_TIMEOUT)
+
+
+class ViewBuffer:
+    """Несброшенные просмотры процесса по id поста."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.pending = {}
+        self.flushing = False
+        self.flusher_pid = None
+
+    def _pending(self):
+        if os.getpid() != self.pid:
+            # Просмотры родителя после fork сбросит сам родитель.
+            self.pid = os.getpid()
+            self.pending = {}
+        return self.pending
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(settings.VIEWS_FLUSH_INTERVAL)
+            self.flush()
+            connections.close_all()
+
+    def add(self, post_id, visitor):
+        with self.lock:
+            pending = self._pending()
+            if self.flushing and self.flusher_pid != self.pid:
+                # Поток родителя не переживает fork: свой в каждом процессе.
+                self.flusher_pid = self.pid
+                threading.Thread(target=self._run_flusher, daemon=True,
+                                 name='views-flusher').start()
+            views, sketch = pending.get(post_id) or (0, HyperLogLog())
+            sketch.add(visitor)
+            pending[post_id] = (views + 1, sketch)
+
+    def get(self, post_id):
+        """(просмотры, HyperLogLog) процесса или (0, None)."""
+        with self.lock:
+            views, sketch = self._pending().get(post_id) or (0, None)
+            return views, sketch and HyperLogLog(registers=sketch.registers)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self._pending(), {}
+        if not pending:
+            return
+        try:
+            write_counters(pending)
+        except Exception:
+            logger.exception('Не удалось записать просмотры')
+            with self.lock:
+                for post_id, (views, sketch) in pending.items():
+                    _merge_into(self._pending(), post_id, views, sketch)
+
+
+buffer = ViewBuffer()
+
+
+def start_flushing():
+    """Включает запись просмотров в базу фоновым потоком процесса."""
+    buffer.flushing = True
+    atexit.register(buffer.flush)
+
+
+def count_views(view):
+    """Считает просмотр поста post_id, в том числе ответ из кеша и 304."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if (
+            request.method == 'GET'
+            and response.status_code in (200, 304)
+            and request.META.get('HTTP_USER_AGENT') != warmup.USER_AGENT
+        ):
+            buffer.add(int(kwargs['post_id']), visitor_id(request))
+        return response
+
+    return wrapper
+
+
+def totals(kind, object_id):
+    """(просмотры, оценка читателей) из базы и несброшенных просмотров."""
+    key = _totals_key(kind, object_id)
+    row = cache.get(key)
+    if row is None:
+        row = ViewCounter.objects.filter(
+            kind=kind, object_id=object_id
+        ).values_list('views', 'sketch').first() or (0, None)
+        cache.set(key, row, TOTALS_CACHE_TIMEOUT)
+    views, sketch = row[0], None
+    if row[1] is not None:
+        sketch = HyperLogLog(registers=row[1])
+    if kind == ViewCounter.POST:
+        pending_views, pending = buffer.get(object_id)
+        views += pending_views
+        if pending is not None:
+            if sketch is None:
+                sketch = pending
+            else:
+                sketch.merge(pending)
+    return views, sketch.estimate() if sketch else 0
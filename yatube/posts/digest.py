@@ -0,0 +1,191 @@
+"""Еженедельный дайджест постов от авторов из подписок.
+
+follower_posts за один упорядоченный проход по постам периода,
+соединённым с подписками, выдаёт каждого подписчика с id новых постов
+его авторов - до DIGEST_MAX_POSTS самых свежих. Строки читаются
+итератором и группируются на лету, в памяти только текущая пачка
+подписчиков. При шардах посты и подписки лежат в разных базах: тогда
+сначала по шардам собираются свежие посты каждого автора, а затем
+одним проходом читаются подписки.
+
+Пост в письме - фрагмент текста из кеша; ключ содержит updated_at,
+поэтому правка поста даёт новый фрагмент. Письма пачки по
+DIGEST_BATCH_SIZE подписчиков передаются почте (EMAIL_BACKEND - очередь
+mailer) в одной транзакции с отметкой прогресса в DigestRun, так что
+прерванная рассылка продолжается без повторных писем.
+"""
+import datetime as dt
+import heapq
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import DigestRun, Follow, Post
+from .sharding import get_shards, is_sharded
+
+User = get_user_model()
+
+SUBJECT = 'Новые посты авторов из ваших подписок'
+SNIPPET_TIMEOUT: int = 24 * 60 * 60
+
+
+def _unsharded_rows(since, until, after_user):
+    return Post.objects.filter(
+        pub_date__gt=since, pub_date__lte=until,
+        author__following__user_id__gt=after_user,
+    ).order_by(
+        'author__following__user_id', '-pub_date', '-pk'
+    ).values_list(
+        'author__following__user_id', 'pk', 'updated_at'
+    ).iterator()
+
+
+def _newest(lists, limit):
+    # Пост может прийти дважды (например, при переносе автора в шард).
+    merged = heapq.merge(*lists, reverse=True)
+    return list(islice((row for row, _ in groupby(merged)), limit))
+
+
+def _sharded_rows(since, until, after_user, per_user):
+    latest = {}
+    for alias in get_shards():
+        posts = Post.objects.using(alias).filter(
+            pub_date__gt=since, pub_date__lte=until
+        ).order_by('author_id', '-pub_date', '-pk').values_list(
+            'author_id', 'pub_date', 'pk', 'updated_at'
+        ).iterator()
+        for author_id, rows in groupby(posts, key=lambda row: row[0]):
+            latest.setdefault(author_id, []).append(
+                [row[1:] for row in islice(rows, per_user)]
+            )
+    latest = {
+        author_id: _newest(lists, per_user)
+        for author_id, lists in latest.items()
+    }
+    follows = Follow.objects.filter(user_id__gt=after_user).order_by(
+        'user_id'
+    ).values_list('user_id', 'author_id').iterator()
+    for user_id, rows in groupby(follows, key=lambda row: row[0]):
+        merged = heapq.merge(
+            *(latest[author_id] for _, author_id in rows
+              if author_id in latest),
+            reverse=True
+        )
+        for _, pk, updated_at in merged:
+            yield user_id, pk, updated_at
+
+
+def follower_posts(since, until, after_user=0, per_user=None):
+    """Подписчики по возрастанию id с новыми постами их авторов.
+
+    Пары (id подписчика, [(id поста, updated_at), ...]), посты - от
+    новых к старым.
+    """
+    per_user = per_user or settings.DIGEST_MAX_POSTS
+    if is_sharded():
+        rows = _sharded_rows(since, until, after_user, per_user)
+    else:
+        rows = _unsharded_rows(since, until, after_user)
+    for user_id, posts in groupby(rows, key=lambda row: row[0]):
+        seen = set()
+        selected = []
+        for _, pk, updated_at in posts:
+            if pk not in seen:
+                seen.add(pk)
+                selected.append((pk, updated_at))
+            if len(selected) == per_user:
+                break
+        yield user_id, selected
+
+
+def _snippet_key(post_id, updated_at) -> str:
+    return f'posts:digest:{post_id}:{updated_at.timestamp()}'
+
+
+def snippets(posts) -> dict:
+    """Фрагменты писем для {id поста: updated_at}; промахи - из базы."""
+    keys = {pk: _snippet_key(pk, updated_at)
+            for pk, updated_at in posts.items()}
+    cached = cache.get_many(list(keys.values()))
+    missing = [pk for pk, key in keys.items() if key not in cached]
+    if missing:
+        rendered = {}
+        for alias in get_shards():
+            for post in Post.objects.using(alias).filter(
+                pk__in=missing
+            ).select_related('author', 'group'):
+                rendered[_snippet_key(post.pk, post.updated_at)] = (
+                    render_to_string('posts/includes/digest_post.txt', {
+                        'post': post, 'site_url': settings.SITE_URL,
+                    }).strip()
+                )
+        cache.set_many(rendered, SNIPPET_TIMEOUT)
+        cached.update(rendered)
+    return {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+
+def send_batch(run, batch) -> int:
+    """Передаёт почте письма пачки и отмечает её в run."""
+    users = {
+        pk: (username, email)
+        for pk, username, email in User.objects.filter(
+            pk__in=[user_id for user_id, _ in batch], is_active=True
+        ).exclude(email='').values_list('pk', 'username', 'email')
+    }
+    texts = snippets({
+        pk: updated_at
+        for user_id, posts in batch if user_id in users
+        for pk, updated_at in posts
+    })
+    messages = []
+    for user_id, posts in batch:
+        parts = [texts[pk] for pk, _ in posts if pk in texts]
+        if user_id not in users or not parts:
+            continue
+        username, email = users[user_id]
+        body = render_to_string('posts/digest_email.txt', {
+            'username': username, 'snippets': parts, 'run': run,
+            'site_url': settings.SITE_URL,
+        })
+        messages.append(EmailMessage(SUBJECT, body, to=[email]))
+    with transaction.atomic():
+        sent = messages and get_connection().send_messages(messages) or 0
+        DigestRun.objects.filter(pk=run.pk).update(
+            last_user_id=batch[-1][0], emails=F('emails') + sent
+        )
+    return sent
+
+
+def current_run(now=None):
+    """Незавершённая рассылка или новая - с конца предыдущей до now."""
+    run = DigestRun.objects.filter(finished__isnull=True).first()
+    if run is None:
+        until = now or timezone.now()
+        last = DigestRun.objects.first()
+        since = last.until if last else until - dt.timedelta(
+            seconds=settings.DIGEST_PERIOD
+        )
+        run = DigestRun.objects.create(since=since, until=until)
+    return run
+
+
+def send_digest(now=None):
+    """Рассылает дайджест подписчикам; возвращает DigestRun."""
+    run = current_run(now)
+    rows = follower_posts(run.since, run.until, after_user=run.last_user_id)
+    while True:
+        batch = list(islice(rows, settings.DIGEST_BATCH_SIZE))
+        if not batch:
+            break
+        send_batch(run, batch)
+    run.refresh_from_db()
+    run.finished = timezone.now()
+    run.save(update_fields=['finished'])
+    return run
@@ -0,0 +1,165 @@
+from django.contrib.auth import get_user_model
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date, quote_etag
+from django.utils.text import Truncator
+
+from .lookups import get_cached_or_404
+from .markers import author_scope, get_marker, group_scope, site_scope
+from .models import Group
+from .sharding import sharded_posts
+
+User = get_user_model()
+
+FEED_SIZE: int = 20
+FEED_CACHE_TIMEOUT: int = 60 * 60 * 24
+
+
+class LatestPostsFeed(Feed):
+    """RSS-лента последних записей сайта."""
+    title = 'Yatube: последние записи'
+    link = reverse_lazy('posts:index')
+    description = 'Последние обновления на сайте'
+
+    def items(self):
+        return sharded_posts(
+            lambda posts: posts.select_related('author', 'group')
+        )[:FEED_SIZE]
+
+    def item_title(self, item):
+        return Truncator(item.text).chars(50)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', kwargs={'post_id': item.pk})
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.get_username()
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    """RSS-лента записей группы."""
+
+    def get_object(self, request, slug):
+        return get_cached_or_404(Group, 'slug', slug)
+
+    def title(self, obj):
+        return f'Yatube: записи сообщества {obj.title}'
+
+    def link(self, obj):
+        return reverse('posts:group_list', kwargs={'slug': obj.slug})
+
+    def description(self, obj):
+        return obj.description
+
+    def items(self, obj):
+        return sharded_posts(
+            lambda posts: posts.filter(group=obj).select_related('author')
+        )[:FEED_SIZE]
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+    """RSS-лента записей автора."""
+
+    def get_object(self, request, username):
+        return get_cached_or_404(User, 'username', username)
+
+    def title(self, obj):
+        return f'Yatube: записи пользователя {obj.get_username()}'
+
+    def link(self, obj):
+        return reverse('posts:profile', kwargs={'username': obj.username})
+
+    def description(self, obj):
+        return f'Все посты пользователя {obj.get_full_name()}'
+
+    def items(self, obj):
+        return obj.posts.select_related('group')[:FEED_SIZE]
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+def _index_scope():
+    return site_scope()
+
+
+def _group_scope(slug):
+    group = get_cached_or_404(Group, 'slug', slug)
+    return group_scope(group.pk)
+
+
+def _author_scope(username):
+    author = get_cached_or_404(User, 'username', username)
+    return author_scope(author.pk)
+
+
+def cached_feed(feed_class, scope_func):
+    """Отдаёт ленту из кеша и отвечает 304, если лента не менялась.
+
+    Лента перегенерируется только после изменения маркера своей области
+    (см. posts.signals).
+    """
+    feed = feed_class()
+
+    def view(request, **kwargs):
+        scope = scope_func(**kwargs)
+        marker = get_marker(scope)
+        etag = quote_etag(f'{feed_class.__name__}-{scope}-{marker}')
+        last_modified = int(marker)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            key = (
+                f'posts:feed:{feed_class.__name__}:{request.get_host()}:'
+                f'{scope}:{marker}'
+            )
+            cached = cache.get(key)
+            if cached is None:
+                generated = feed(request, **kwargs)
+                cached = (generated.content, generated['Content-Type'])
+                cache.set(key, cached, FEED_CACHE_TIMEOUT)
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    return view
+
+
+index_feed = cached_feed(LatestPostsFeed, _index_scope)
+index_atom = cached_feed(LatestPostsAtomFeed, _index_scope)
+group_feed = cached_feed(GroupPostsFeed, _group_scope)
+group_atom = cached_feed(GroupPostsAtomFeed, _group_scope)
+profile_feed = cached_feed(AuthorPostsFeed, _author_scope)
+profile_atom = cached_feed(AuthorPostsAtomFeed, _author_scope)
@@ -0,0 +1,55 @@
+from core.holes import register_hole
+
+from .counters import totals
+from .forms import CommentForm
+from .models import Follow, ViewCounter
+
+
+def switcher_context(request, active=''):
+    return {'active': active}
+
+
+def follow_button_context(request, author_id, username):
+    user = request.user
+    return {
+        'username': username,
+        'is_self': user.pk == int(author_id),
+        'following': user.is_authenticated and Follow.objects.filter(
+            user=user, author_id=author_id
+        ).exists(),
+    }
+
+
+def comment_form_context(request, post_id):
+    return {'post_id': post_id, 'form': CommentForm()}
+
+
+def views_context(kind):
+    # Счётчики меняются чаще, чем страница в кеше, поэтому - дыркой.
+    def get_context(request, object_id):
+        views, readers = totals(kind, int(object_id))
+        return {'views': views, 'readers': readers}
+    return get_context
+
+
+register_hole('switcher', 'posts/includes/switcher.html', switcher_context)
+register_hole(
+    'profile_follow',
+    'posts/includes/follow_button.html',
+    follow_button_context
+)
+register_hole(
+    'comment_form',
+    'posts/includes/comment_form.html',
+    comment_form_context
+)
+register_hole(
+    'post_views',
+    'posts/includes/post_views.html',
+    views_context(ViewCounter.POST)
+)
+register_hole(
+    'author_views',
+    'posts/includes/author_views.html',
+    views_context(ViewCounter.AUTHOR)
+)
@@ -0,0 +1,74 @@
+"""Кеш групп по slug и пользователей по username.
+
+Объекты лежат в общем кеше по умолчанию, если он настроен, иначе - в
+отдельном кеше процесса settings.OBJECT_CACHE_ALIAS с ограниченным числом
+записей. Отсутствие объекта тоже кешируется, ненадолго. Записи
+сбрасываются сигналами при сохранении и удалении (см. posts.signals).
+Сигнал сбрасывает кеш только своего процесса, поэтому в LocMemCache
+записи живут не дольше LOCAL_CACHE_TIMEOUT секунд.
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.http import Http404
+
+from core.caches import is_shared, shared_timeout
+
+OBJECT_CACHE_TIMEOUT: int = 60 * 60
+MISSING_CACHE_TIMEOUT: int = 60
+MISSING = 'missing'
+
+
+def object_cache():
+    """Кеш объектов: общий кеш по умолчанию или OBJECT_CACHE_ALIAS."""
+    cache = caches[DEFAULT_CACHE_ALIAS]
+    if is_shared(cache):
+        return cache
+    return caches[settings.OBJECT_CACHE_ALIAS]
+
+
+def _key(model, field, value) -> str:
+    return f'posts:object:{model._meta.label_lower}:{field}:{value}'
+
+
+def _pk_key(model, pk) -> str:
+    return f'posts:object:{model._meta.label_lower}:pk:{pk}'
+
+
+def get_cached(model, field, value):
+    """Объект model с field=value или None."""
+    cache = object_cache()
+    key = _key(model, field, value)
+    obj = cache.get(key)
+    if obj == MISSING:
+        return None
+    if obj is None:
+        obj = model._default_manager.filter(**{field: value}).first()
+        if obj is None:
+            cache.set(key, MISSING,
+                      shared_timeout(cache, MISSING_CACHE_TIMEOUT))
+            return None
+        # По pk находится ключ, под которым объект лежит в кеше, даже
+        # если field потом изменится.
+        cache.set_many(
+            {key: obj, _pk_key(model, obj.pk): key},
+            shared_timeout(cache, OBJECT_CACHE_TIMEOUT)
+        )
+    return obj
+
+
+def get_cached_or_404(model, field, value):
+    obj = get_cached(model, field, value)
+    if obj is None:
+        raise Http404(f'Нет объекта {model._meta.object_name} {value!r}')
+    return obj
+
+
+def invalidate(instance, field):
+    model = type(instance)
+    cache = object_cache()
+    pk_key = _pk_key(model, instance.pk)
+    cache.delete_many([
+        pk_key,
+        cache.get(pk_key) or pk_key,
+        _key(model, field, getattr(instance, field)),
+    ])
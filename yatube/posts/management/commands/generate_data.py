@@ -0,0 +1,358 @@
+"""Генерация данных в объёме и с перекосами как на рабочем сайте.
+
+Число постов у авторов, подписчиков у авторов и комментариев у постов
+распределено по степенному закону, посты идут пачками. Строки каждого
+владельца (пользователя, автора, поста) генерируются своим ГСЧ от
+--seed и номера владельца, а пачки пишутся в своих транзакциях.
+Поэтому прерванный запуск можно повторить с теми же параметрами - он
+продолжит с первой незаписанной пачки и даст те же данные.
+"""
+import bisect
+import datetime as dt
+import math
+import os
+import random
+from contextlib import contextmanager
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import Mixer
+from PIL import Image
+
+from core.caches import is_shared
+from posts.lookups import object_cache
+from posts.markers import touch_all
+from posts.models import Comment, Follow, Group, Post
+from posts.sharding import is_sharded
+from posts.trending import rebuild
+
+User = get_user_model()
+
+EMAIL_DOMAIN = 'generated.yatube'
+IMAGE_DIR = 'posts/generated'
+IMAGE_POOL_SIZE: int = 20
+TEXT_POOL_SIZE: int = 2000
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now и auto_now_add, чтобы записать свои даты."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def pareto_weights(count, alpha, rnd):
+    return [rnd.paretovariate(alpha) for _ in range(count)]
+
+
+def split_total(total, weights):
+    """Делит total пропорционально весам, сумма частей равна total."""
+    scale = total / sum(weights)
+    parts = [math.floor(weight * scale) for weight in weights]
+    remainders = sorted(
+        range(len(weights)),
+        key=lambda index: parts[index] - weights[index] * scale
+    )
+    for index in remainders[:total - sum(parts)]:
+        parts[index] += 1
+    return parts
+
+
+class Command(BaseCommand):
+    help = ('Генерирует пользователей, группы, посты, комментарии и '
+            'подписки с реалистичными перекосами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--groups', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=500_000)
+        parser.add_argument('--follows', type=int, default=200_000)
+        parser.add_argument(
+            '--image-share', type=float, default=0.1,
+            help='Доля постов с картинкой.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до сегодня распределить посты.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if is_sharded():
+            raise CommandError(
+                'Генерация пишет пачками в основную базу; при шардах '
+                'сгенерируйте данные без YATUBE_POST_SHARDS и перенесите '
+                'авторов командой rebalance_shards.'
+            )
+        self.options = options
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        faker = Faker('ru_RU')
+        faker.seed_instance(self.seed)
+        self.texts = [faker.sentence() for _ in range(TEXT_POOL_SIZE)]
+        self.names = [
+            (faker.first_name(), faker.last_name(), faker.user_name())
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+        self.generate_groups()
+        self.generate_users()
+        self.user_ids = list(
+            User.objects.filter(
+                email__endswith=EMAIL_DOMAIN
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        self.group_ids = list(
+            Group.objects.filter(
+                slug__startswith='gen-'
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        self.generate_posts()
+        self.generate_comments()
+        self.generate_follows()
+        self.log(f'Популярное: постов со счётом {rebuild()}')
+        self.invalidate()
+
+    def invalidate(self):
+        """Сбрасывает кеши, о которых bulk_create не сообщил сигналами."""
+        touch_all()
+        objects = object_cache()
+        if is_shared(objects):
+            objects.clear()
+        if is_shared(objects) and is_shared(caches[DEFAULT_CACHE_ALIAS]):
+            self.log('Отметки лент обновлены, кеш объектов очищен.')
+        else:
+            # Кеш в памяти другого процесса отсюда не очистить.
+            self.log(
+                'Отметки лент обновлены. Процессы сервера с LocMemCache '
+                'увидят новые строки через '
+                f'{settings.LOCAL_CACHE_TIMEOUT} с.'
+            )
+
+    def generated_posts(self):
+        return Post.objects.filter(author__email__endswith=EMAIL_DOMAIN)
+
+    def rng(self, kind, index):
+        return random.Random(f'{self.seed}-{kind}-{index}')
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def generate_groups(self):
+        existing = Group.objects.filter(slug__startswith='gen-').count()
+        count = self.options['groups'] - existing
+        if count <= 0:
+            return
+        mixer = Mixer(commit=False, locale='ru')
+        mixer.faker.seed_instance(self.seed)
+        rnd = self.rng('groups', existing)
+        groups = mixer.cycle(count).blend(
+            Group,
+            slug=mixer.sequence(lambda number: f'gen-{existing + number}'),
+            description=mixer.sequence(
+                lambda number: ' '.join(rnd.choices(self.texts, k=3))
+            ),
+        )
+        Group.objects.bulk_create(groups)
+        self.log(f'Групп: {len(groups)}')
+
+    def generate_users(self):
+        total = self.options['users']
+        start = User.objects.filter(email__endswith=EMAIL_DOMAIN).count()
+        for batch_start in range(start, total, self.batch_size):
+            users = []
+            for index in range(
+                batch_start, min(batch_start + self.batch_size, total)
+            ):
+                rnd = self.rng('user', index)
+                first_name, last_name, username = rnd.choice(self.names)
+                username = f'{username}.{index}'
+                users.append(User(
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name,
+                    email=f'{username}@{EMAIL_DOMAIN}',
+                    password=f'{UNUSABLE_PASSWORD_PREFIX}generated',
+                    date_joined=self.now - dt.timedelta(
+                        days=rnd.uniform(0, self.options['days'])
+                    ),
+                ))
+            User.objects.bulk_create(users)
+            self.log(f'Пользователей: {batch_start + len(users)}/{total}')
+
+    def pending_batches(self, owner_ids, queryset, owner_field):
+        """Пачки номеров владельцев, строки которых ещё не записаны.
+
+        Пачка пишется одной транзакцией, поэтому записаны все пачки до той,
+        в которую попал последний владелец со строками в queryset.
+        """
+        done = queryset.aggregate(last=Max(owner_field))['last']
+        start = 0
+        if done is not None:
+            position = bisect.bisect_left(owner_ids, done)
+            start = (position // self.batch_size + 1) * self.batch_size
+        for batch_start in range(start, len(owner_ids), self.batch_size):
+            yield range(
+                batch_start, min(batch_start + self.batch_size, len(owner_ids))
+            )
+
+    def get_image_names(self):
+        directory = os.path.join(settings.MEDIA_ROOT, IMAGE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        rnd = self.rng('images', 0)
+        names = []
+        for number in range(IMAGE_POOL_SIZE):
+            name = f'{IMAGE_DIR}/{number}.jpg'
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            if not os.path.exists(path):
+                color = tuple(rnd.randrange(256) for _ in range(3))
+                Image.new('RGB', (960, 540), color).save(path, 'JPEG')
+            names.append(name)
+        return names
+
+    def generate_posts(self):
+        if not self.user_ids:
+            return
+        weights = pareto_weights(
+            len(self.user_ids), 1.5, self.rng('post-weights', 0)
+        )
+        counts = split_total(self.options['posts'], weights)
+        images = self.get_image_names()
+        groups = [*self.group_ids, None]
+        days = self.options['days']
+        fields = [Post._meta.get_field(name)
+                  for name in ('pub_date', 'updated_at')]
+        batches = self.pending_batches(
+            self.user_ids, self.generated_posts(), 'author_id'
+        )
+        with explicit_dates(*fields):
+            for batch in batches:
+                posts = []
+                for index in batch:
+                    rnd = self.rng('post', index)
+                    favourite_group = rnd.choice(groups)
+                    left = counts[index]
+                    while left:
+                        # Пачка постов: начало случайно, дальше с
+                        # интервалом в среднем 20 минут.
+                        burst = min(left, int(rnd.paretovariate(1.5)))
+                        moment = self.now - dt.timedelta(
+                            days=rnd.uniform(0, days)
+                        )
+                        for _ in range(burst):
+                            moment += dt.timedelta(
+                                minutes=rnd.expovariate(1 / 20)
+                            )
+                            posts.append(Post(
+                                author_id=self.user_ids[index],
+                                group_id=(
+                                    favourite_group if rnd.random() < 0.7
+                                    else rnd.choice(groups)
+                                ),
+                                text=' '.join(
+                                    rnd.choices(self.texts,
+                                                k=rnd.randint(1, 8))
+                                ),
+                                image=(
+                                    rnd.choice(images)
+                                    if rnd.random()
+                                    < self.options['image_share']
+                                    else ''
+                                ),
+                                pub_date=moment,
+                                updated_at=moment,
+                            ))
+                        left -= burst
+                with transaction.atomic():
+                    Post.objects.bulk_create(posts)
+                self.log(f'Посты авторов: {batch.stop}/{len(self.user_ids)}')
+
+    def generate_comments(self):
+        post_rows = list(
+            self.generated_posts().order_by('pk').values_list('pk', 'pub_date')
+        )
+        if not post_rows:
+            return
+        rnd = self.rng('comment-weights', 0)
+        weights = [rnd.lognormvariate(0, 1.5) for _ in post_rows]
+        counts = split_total(self.options['comments'], weights)
+        commenter_weights = list(accumulate(pareto_weights(
+            len(self.user_ids), 1.5, self.rng('commenter-weights', 0)
+        )))
+        post_ids = [pk for pk, _ in post_rows]
+        created = Comment._meta.get_field('created')
+        batches = self.pending_batches(
+            post_ids,
+            Comment.objects.filter(post__author__email__endswith=EMAIL_DOMAIN),
+            'post_id'
+        )
+        with explicit_dates(created):
+            for batch in batches:
+                comments = []
+                for index in batch:
+                    rnd = self.rng('comment', index)
+                    post_id, pub_date = post_rows[index]
+                    authors = rnd.choices(
+                        self.user_ids, cum_weights=commenter_weights,
+                        k=counts[index]
+                    )
+                    moment = pub_date
+                    for author_id in authors:
+                        moment += dt.timedelta(hours=rnd.expovariate(1 / 6))
+                        comments.append(Comment(
+                            post_id=post_id,
+                            author_id=author_id,
+                            text=rnd.choice(self.texts),
+                            created=min(moment, self.now),
+                        ))
+                with transaction.atomic():
+                    Comment.objects.bulk_create(comments)
+                self.log(f'Комментарии к постам: {batch.stop}/{len(post_ids)}')
+
+    def generate_follows(self):
+        if len(self.user_ids) < 2:
+            return
+        popularity = list(accumulate(pareto_weights(
+            len(self.user_ids), 1.2, self.rng('follow-weights', 0)
+        )))
+        activity = pareto_weights(
+            len(self.user_ids), 1.5, self.rng('follower-weights', 1)
+        )
+        counts = split_total(self.options['follows'], activity)
+        batches = self.pending_batches(
+            self.user_ids,
+            Follow.objects.filter(user__email__endswith=EMAIL_DOMAIN),
+            'user_id'
+        )
+        for batch in batches:
+            follows = []
+            for index in batch:
+                rnd = self.rng('follow', index)
+                user_id = self.user_ids[index]
+                authors = set(rnd.choices(
+                    self.user_ids, cum_weights=popularity, k=counts[index]
+                ))
+                authors.discard(user_id)
+                follows.extend(
+                    Follow(user_id=user_id, author_id=author_id)
+                    for author_id in sorted(authors)
+                )
+            with transaction.atomic():
+                Follow.objects.bulk_create(follows)
+            self.log(f'Подписки: {batch.stop}/{len(self.user_ids)}')
@@ -0,0 +1,53 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from core.caches import is_shared
+from posts.prewarm import hot_paths, prewarm
+
+
+class Command(BaseCommand):
+    help = ('Заполняет общий кеш самыми посещаемыми страницами: главная, '
+            'группы и их ленты, популярные авторы и самые читаемые посты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--index-pages', type=int, default=5,
+            help='Сколько первых страниц главной прогреть.'
+        )
+        parser.add_argument(
+            '--authors', type=int, default=50,
+            help='Сколько профилей авторов с наибольшим числом подписчиков.'
+        )
+        parser.add_argument(
+            '--posts', type=int, default=100,
+            help='Сколько самых просматриваемых постов.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Сколько страниц отрисовывается одновременно.'
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared(cache):
+            raise CommandError(
+                'Кеш по умолчанию - LocMemCache: страницы остались бы в '
+                'памяти этой команды. Задайте общий кеш '
+                '(YATUBE_CACHE_BACKEND) или прогревайте процессы сервера '
+                'фазой pages из WARMUP_PHASES.'
+            )
+        started = time.perf_counter()
+        paths = hot_paths(
+            options['index_pages'], options['authors'], options['posts']
+        )
+        results = prewarm(paths, options['concurrency'])
+        for kind, result in results.items():
+            self.stdout.write(
+                f"{kind}: {result['pages']} стр., ошибок {result['failed']}, "
+                f"{result['seconds']} с"
+            )
+        self.stdout.write(
+            f'Прогрето адресов: {len(paths)} за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from posts.models import Group, Post
+from posts.sharding import (copy_reference_rows, get_shards, is_sharded,
+                            move_author)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Переносит авторов между шардами постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', help='Имя переносимого автора.')
+        parser.add_argument('--to', help='Алиас шарда назначения.')
+        parser.add_argument(
+            '--auto', action='store_true',
+            help='Переносить крупных авторов из самого загруженного шарда '
+                 'в самый свободный, пока это уменьшает перекос.'
+        )
+        parser.add_argument(
+            '--sync', action='store_true',
+            help='Скопировать в шарды всех пользователей и все группы. '
+                 'Перезаписывает и старые копии пользователей с паролем.'
+        )
+
+    def handle(self, *args, **options):
+        if not is_sharded():
+            raise CommandError(
+                'Шарды не настроены, см. YATUBE_POST_SHARDS в settings.py'
+            )
+        if options['sync']:
+            for instance in (*User.objects.all(), *Group.objects.all()):
+                copy_reference_rows(instance)
+        if options['author']:
+            if options['to'] not in get_shards():
+                raise CommandError(f'Неизвестный шард {options["to"]!r}')
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(f'Нет автора {options["author"]!r}')
+            moved = move_author(author, options['to'])
+            self.stdout.write(f'{author}: перенесено постов {moved}')
+        if options['auto']:
+            self.rebalance()
+
+    def rebalance(self):
+        authors = {
+            alias: list(
+                Post.objects.using(alias).values('author_id').annotate(
+                    posts=Count('pk')
+                ).order_by('-posts')
+            )
+            for alias in get_shards()
+        }
+        load = {
+            alias: sum(row['posts'] for row in rows)
+            for alias, rows in authors.items()
+        }
+        while True:
+            source = max(load, key=load.get)
+            target = min(load, key=load.get)
+            gap = load[source] - load[target]
+            row = next(
+                (row for row in authors[source] if row['posts'] * 2 < gap),
+                None
+            )
+            if row is None:
+                break
+            authors[source].remove(row)
+            author = User.objects.get(pk=row['author_id'])
+            move_author(author, target)
+            load[source] -= row['posts']
+            load[target] += row['posts']
+            self.stdout.write(
+                f'{author}: {source} -> {target}, постов {row["posts"]}'
+            )
+        self.stdout.write(f'Постов по шардам: {load}')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.trending import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счёты популярного по всем постам, комментариям '
+            'и просмотрам. Запустите после первой выкладки популярного и '
+            'после записи данных в обход сигналов.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Постов со счётом: {rebuild()}')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.digest import send_digest
+
+
+class Command(BaseCommand):
+    help = ('Рассылает дайджест новых постов подписок. Прерванная '
+            'рассылка продолжается с последнего подписчика.')
+
+    def handle(self, *args, **options):
+        run = send_digest()
+        self.stdout.write(
+            f'Дайджест с {run.since:%Y-%m-%d %H:%M} по '
+            f'{run.until:%Y-%m-%d %H:%M}: писем {run.emails}'
+        )
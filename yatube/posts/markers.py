@@ -0,0 +1,120 @@
+"""Отметки последнего изменения лент.
+
+Отметка - время в секундах; по ней строятся ETag страниц и ключи их
+кешей. Отметки хранятся в ChangeMarker, так что изменение ленты в одном
+процессе видят все, а кеш перед базой только избавляет от запросов. В
+кеше процесса (LocMemCache) отметка живёт LOCAL_CACHE_TIMEOUT секунд,
+после чего перечитывается из базы.
+
+Запрос, который читает реплику (core.replicas), берёт отметки из неё
+же, мимо кеша: отметка не новее данных страницы, и под ней в кеш и
+ETag не попадёт устаревшее содержимое.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from core.caches import shared_timeout
+from core.replicas import current_replica, pin_primary
+
+from .models import ChangeMarker
+
+
+def site_scope() -> str:
+    return 'site'
+
+
+def group_scope(group_id) -> str:
+    return f'group:{group_id}'
+
+
+def author_scope(author_id) -> str:
+    return f'author:{author_id}'
+
+
+def post_scope(post_id) -> str:
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id) -> str:
+    return f'follow:{user_id}'
+
+
+def _marker_key(scope: str) -> str:
+    return f'posts:marker:{scope}'
+
+
+def _stored(scopes, using=DEFAULT_DB_ALIAS) -> dict:
+    return dict(ChangeMarker.objects.using(using).filter(
+        scope__in=scopes
+    ).values_list('scope', 'changed'))
+
+
+def get_marker(scope: str) -> float:
+    """Возвращает отметку последнего изменения ленты.
+
+    Если отметки ещё нет, лента считается изменённой прямо сейчас.
+    """
+    return get_markers(scope)[0]
+
+
+def get_markers(*scopes: str) -> list:
+    """Возвращает отметки нескольких лент за одно обращение к кешу.
+
+    Если какой-то отметки ещё нет в реплике запроса, запрос дальше
+    читает основную базу.
+    """
+    replica = current_replica()
+    if replica is not None:
+        stored = _stored(scopes, replica)
+        if all(scope in stored for scope in scopes):
+            return [stored[scope] for scope in scopes]
+        pin_primary()
+    keys = [_marker_key(scope) for scope in scopes]
+    markers = cache.get_many(keys)
+    missing = [scope for scope, key in zip(scopes, keys)
+               if key not in markers]
+    if missing:
+        stored = _stored(missing)
+        new = [scope for scope in missing if scope not in stored]
+        if new:
+            now = time.time()
+            ChangeMarker.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+                [ChangeMarker(scope=scope, changed=now) for scope in new],
+                ignore_conflicts=True
+            )
+            stored.update(_stored(new))
+        timeout = shared_timeout(cache, None)
+        for scope in missing:
+            # add, а не set: не затирает отметку, которую успел
+            # поставить touch.
+            cache.add(_marker_key(scope), stored[scope], timeout)
+            markers[_marker_key(scope)] = stored[scope]
+    return [markers[key] for key in keys]
+
+
+def touch(*scopes: str) -> None:
+    """Отмечает ленты как изменённые."""
+    scopes = set(scopes)
+    now = time.time()
+    markers = ChangeMarker.objects.using(DEFAULT_DB_ALIAS)
+    if markers.filter(scope__in=scopes).update(changed=now) < len(scopes):
+        markers.bulk_create(
+            [ChangeMarker(scope=scope, changed=now) for scope in scopes],
+            ignore_conflicts=True
+        )
+    cache.set_many({_marker_key(scope): now for scope in scopes},
+                   shared_timeout(cache, None))
+
+
+def touch_all() -> None:
+    """Отмечает изменёнными все ленты, например после записи без сигналов.
+
+    Ключи сбрасываются в кеше этого процесса; в LocMemCache других
+    процессов старые отметки доживут LOCAL_CACHE_TIMEOUT секунд.
+    """
+    markers = ChangeMarker.objects.using(DEFAULT_DB_ALIAS)
+    scopes = list(markers.values_list('scope', flat=True))
+    markers.update(changed=time.time())
+    cache.delete_many([_marker_key(scope) for scope in scopes])
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_sharding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('since', models.DateTimeField(verbose_name='Посты после')),
+                ('until', models.DateTimeField(verbose_name='Посты до')),
+                ('last_user_id', models.IntegerField(default=0, verbose_name='Последний подписчик')),
+                ('emails', models.PositiveIntegerField(default=0, verbose_name='Писем')),
+                ('started', models.DateTimeField(auto_now_add=True, verbose_name='Начата')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+            ],
+            options={
+                'verbose_name': 'Рассылка дайджеста',
+                'verbose_name_plural': 'Рассылки дайджеста',
+                'ordering': ('-until',),
+            },
+        ),
+    ]
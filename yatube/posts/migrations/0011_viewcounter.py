@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_digestrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post', 'Пост'), ('author', 'Автор')], max_length=10, verbose_name='Вид')),
+                ('object_id', models.IntegerField(verbose_name='id')),
+                ('views', models.BigIntegerField(default=0, verbose_name='Просмотров')),
+                ('sketch', models.BinaryField(verbose_name='HyperLogLog читателей')),
+            ],
+            options={
+                'verbose_name': 'Счётчик просмотров',
+                'verbose_name_plural': 'Счётчики просмотров',
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_viewcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=50, verbose_name='Лента')),
+                ('post_id', models.IntegerField(verbose_name='id поста')),
+                ('score', models.FloatField(verbose_name='Счёт')),
+            ],
+            options={
+                'verbose_name': 'Популярный пост',
+                'verbose_name_plural': 'Популярные посты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='trendingentry',
+            index=models.Index(fields=['scope', '-score'], name='posts_trend_scope_b322d7_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='trendingentry',
+            unique_together={('scope', 'post_id')},
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_trendingentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeMarker',
+            fields=[
+                ('scope', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Лента')),
+                ('changed', models.FloatField(verbose_name='Изменена')),
+            ],
+            options={
+                'verbose_name': 'Отметка изменения',
+                'verbose_name_plural': 'Отметки изменений',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def copy_site_scores(apps, schema_editor):
+    """Полные счёты постов, которые уже есть в списке сайта."""
+    TrendingEntry = apps.get_model('posts', 'TrendingEntry')
+    TrendingEntry.objects.bulk_create(
+        [TrendingEntry(scope='total', post_id=entry.post_id,
+                       score=entry.score)
+         for entry in TrendingEntry.objects.filter(scope='site')],
+        ignore_conflicts=True
+    )
+
+
+def delete_totals(apps, schema_editor):
+    TrendingEntry = apps.get_model('posts', 'TrendingEntry')
+    TrendingEntry.objects.filter(scope='total').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_changemarker'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_site_scores, delete_totals),
+    ]
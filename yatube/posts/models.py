@@ -4,6 +4,21 @@ from django.db import models
 User = get_user_model()
 
 
+class RoutedQuerySet(models.QuerySet):
+    """create() без явной базы отдаёт выбор базы роутеру по объекту.
+
+    Обычный create() выбирает базу до создания объекта, и роутер шардов
+    (posts.sharding) не знает автора поста.
+    """
+
+    def create(self, **kwargs):
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
 class Group(models.Model):
     """Модель, хранящая данные о группе."""
     title = models.CharField('Название группы', max_length=200)
@@ -19,6 +34,9 @@ class Post(models.Model):
     text = models.TextField(verbose_name='Текст поста',
                             help_text='Введите текст поста')
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_index=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -37,6 +55,8 @@ class Post(models.Model):
         blank=True
     )
 
+    objects = RoutedQuerySet.as_manager()
+
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
@@ -65,7 +85,13 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    objects = RoutedQuerySet.as_manager()
+
     class Meta:
+        ordering = ['created', 'pk']
+        indexes = [
+            models.Index(fields=['post', 'created', 'id']),
+        ]
         verbose_name = 'Комментарий'
 
     def __str__(self) -> str:
@@ -87,3 +113,114 @@ class Follow(models.Model):
 
     class Meta:
         verbose_name = 'Подписки'
+
+
+class PostLocation(models.Model):
+    """Выдаёт сквозные id постов и помнит их авторов.
+
+    Нужна при шардировании (posts.sharding): по id поста находит шард.
+    """
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста'
+    )
+
+    class Meta:
+        verbose_name = 'Адрес поста'
+        verbose_name_plural = 'Адреса постов'
+
+
+class AuthorShard(models.Model):
+    """Шард автора, назначенный вручную при перебалансировке."""
+    author = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    alias = models.CharField('Шард', max_length=100)
+
+    class Meta:
+        verbose_name = 'Шард автора'
+        verbose_name_plural = 'Шарды авторов'
+
+
+class DigestRun(models.Model):
+    """Рассылка дайджеста подписок за период (posts.digest).
+
+    last_user_id - последний подписчик, которому письмо уже передано
+    почте: прерванная рассылка продолжается со следующего.
+    """
+    since = models.DateTimeField('Посты после')
+    until = models.DateTimeField('Посты до')
+    last_user_id = models.IntegerField('Последний подписчик', default=0)
+    emails = models.PositiveIntegerField('Писем', default=0)
+    started = models.DateTimeField('Начата', auto_now_add=True)
+    finished = models.DateTimeField('Завершена', blank=True, null=True)
+
+    class Meta:
+        ordering = ('-until',)
+        verbose_name = 'Рассылка дайджеста'
+        verbose_name_plural = 'Рассылки дайджеста'
+
+    def __str__(self) -> str:
+        return f'<DigestRun {self.since:%Y-%m-%d} - {self.until:%Y-%m-%d}>'
+
+
+class ViewCounter(models.Model):
+    """Просмотры поста или всех постов автора (posts.counters).
+
+    sketch - HyperLogLog по посетителям для оценки числа читателей.
+    """
+    POST = 'post'
+    AUTHOR = 'author'
+    KINDS = (
+        (POST, 'Пост'),
+        (AUTHOR, 'Автор'),
+    )
+
+    kind = models.CharField('Вид', max_length=10, choices=KINDS)
+    object_id = models.IntegerField('id')
+    views = models.BigIntegerField('Просмотров', default=0)
+    sketch = models.BinaryField('HyperLogLog читателей')
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+        verbose_name = 'Счётчик просмотров'
+        verbose_name_plural = 'Счётчики просмотров'
+
+    def __str__(self) -> str:
+        return f'<ViewCounter {self.kind}:{self.object_id} {self.views}>'
+
+
+class TrendingEntry(models.Model):
+    """Пост в списке популярных сайта или группы (posts.trending).
+
+    score - натуральный логарифм счёта с прямым затуханием. В списке
+    TOTAL_SCOPE лежат полные счёты всех постов.
+    """
+    scope = models.CharField('Лента', max_length=50)
+    post_id = models.IntegerField('id поста')
+    score = models.FloatField('Счёт')
+
+    class Meta:
+        unique_together = ('scope', 'post_id')
+        indexes = [models.Index(fields=['scope', '-score'])]
+        verbose_name = 'Популярный пост'
+        verbose_name_plural = 'Популярные посты'
+
+    def __str__(self) -> str:
+        return f'<TrendingEntry {self.scope}:{self.post_id} {self.score:.2f}>'
+
+
+class ChangeMarker(models.Model):
+    """Время последнего изменения ленты (posts.markers)."""
+    scope = models.CharField('Лента', max_length=50, primary_key=True)
+    changed = models.FloatField('Изменена')
+
+    class Meta:
+        verbose_name = 'Отметка изменения'
+        verbose_name_plural = 'Отметки изменений'
+
+    def __str__(self) -> str:
+        return f'<ChangeMarker {self.scope} {self.changed}>'
@@ -0,0 +1,116 @@
+"""Прогрев кеша страниц после выкладки или очистки кеша.
+
+hot_paths строит список адресов по убыванию важности: первые страницы
+главной, страницы и ленты всех групп, профили авторов с наибольшим
+числом подписчиков и самые просматриваемые (затем обсуждаемые) посты.
+prewarm запрашивает их через WSGI-приложение пулом из concurrency
+потоков - страницы заполняют фрагменты, каркасы и ленты в кеше так же,
+как при обычном запросе, а пользователи не попадают в толпу холодных
+запросов. Запросы прогрева не засчитываются как просмотры.
+
+Страницы остаются в кеше того процесса, который их отрисовал. Команда
+prewarm_cache поэтому работает только с общим кешем, а LocMemCache
+процессов сервера заполняет фаза pages прогрева (core.warmup).
+"""
+import math
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.db.models import Count
+from django.urls import reverse
+
+from core.warmup import wsgi_get
+
+from .models import Group, Post, ViewCounter
+from .sharding import get_shards, sharded_posts
+from .views import NUM_OF_POSTS
+
+User = get_user_model()
+
+
+def hottest_posts(limit):
+    """id самых просматриваемых постов, затем самых обсуждаемых."""
+    viewed = list(ViewCounter.objects.filter(
+        kind=ViewCounter.POST
+    ).order_by('-views', '-object_id').values_list(
+        'object_id', flat=True
+    )[:limit])
+    rows = []
+    for alias in get_shards():
+        rows.extend(
+            Post.objects.using(alias).annotate(
+                comment_count=Count('comments')
+            ).filter(comment_count__gt=0).order_by(
+                '-comment_count', '-pk'
+            ).values_list('comment_count', 'pk')[:limit]
+        )
+    discussed = [pk for _, pk in sorted(rows, reverse=True)]
+    return (viewed + [pk for pk in discussed if pk not in viewed])[:limit]
+
+
+def hot_paths(index_pages=5, authors=50, posts=100):
+    """Пары (вид, адрес) в порядке прогрева."""
+    index = reverse('posts:index')
+    index_pages = min(index_pages, max(math.ceil(
+        sharded_posts(lambda posts: posts).count() / NUM_OF_POSTS
+    ), 1))
+    paths = [('index', index)] if index_pages else []
+    paths.extend(
+        ('index', f'{index}?page={page}')
+        for page in range(2, index_pages + 1)
+    )
+    paths.append(('feed', reverse('posts:index_feed')))
+    for slug in Group.objects.order_by('pk').values_list('slug', flat=True):
+        paths.append(('group', reverse('posts:group_list', args=(slug,))))
+        paths.append(('feed', reverse('posts:group_feed', args=(slug,))))
+    usernames = User.objects.annotate(
+        follower_count=Count('following')
+    ).filter(follower_count__gt=0).order_by(
+        '-follower_count', 'pk'
+    ).values_list('username', flat=True)[:authors]
+    paths.extend(
+        ('profile', reverse('posts:profile', args=(username,)))
+        for username in usernames
+    )
+    paths.extend(
+        ('post', reverse('posts:post_detail', args=(pk,)))
+        for pk in hottest_posts(posts)
+    )
+    return paths
+
+
+def prewarm(paths, concurrency=4, application=None):
+    """Запрашивает адреса пулом потоков; возвращает итоги по видам."""
+    application = application or WSGIHandler()
+
+    def fetch(item):
+        kind, path = item
+        started = time.perf_counter()
+        try:
+            status, _ = wsgi_get(application, path)
+        except Exception:
+            status = None
+        finally:
+            connections.close_all()
+        return kind, status, time.perf_counter() - started
+
+    done, failed, seconds = Counter(), Counter(), Counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for kind, status, elapsed in executor.map(fetch, paths):
+            seconds[kind] += elapsed
+            if status is None or not status.startswith('200'):
+                failed[kind] += 1
+            else:
+                done[kind] += 1
+    return {
+        kind: {
+            'pages': done[kind],
+            'failed': failed[kind],
+            'seconds': round(seconds[kind], 3),
+        }
+        for kind in dict.fromkeys(kind for kind, _ in paths)
+    }
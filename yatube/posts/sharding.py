@@ -0,0 +1,257 @@
+"""Шардирование постов и комментариев по автору.
+
+Посты автора и комментарии к ним лежат в одном шарде из
+settings.POSTS_SHARDS. Пользователи, группы и подписки остаются в основной
+базе, а в шарды копируются строки пользователей и групп, на которые
+ссылаются внешние ключи. Сквозные id постов выдаёт PostLocation в основной
+базе, по ним же ищется шард поста.
+
+Когда шард один (по умолчанию - основная база), все функции модуля
+возвращают None вместо алиаса и выбор базы остаётся за роутерами.
+"""
+import heapq
+import zlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core.caches import shared_timeout
+
+from .models import AuthorShard, Comment, Follow, Group, Post, PostLocation
+
+User = get_user_model()
+
+SHARD_CACHE_TIMEOUT: int = 60 * 60
+# Поля, которые выводятся вместе с постами из шарда. Пароль, почта и
+# прочие поля пользователя в шарды не копируются.
+REFERENCE_FIELDS = {
+    User: ('username', 'first_name', 'last_name'),
+    Group: ('title', 'slug', 'description'),
+}
+
+
+def reference_values(instance) -> dict:
+    return {
+        name: getattr(instance, name)
+        for name in REFERENCE_FIELDS[type(instance)]
+    }
+
+
+def get_shards() -> list:
+    return settings.POSTS_SHARDS
+
+
+def is_sharded() -> bool:
+    return get_shards() != [DEFAULT_DB_ALIAS]
+
+
+def _author_key(author_id) -> str:
+    return f'posts:shard:author:{author_id}'
+
+
+def _post_key(post_id) -> str:
+    return f'posts:shard:post:{post_id}'
+
+
+def default_shard(author_id) -> str:
+    """Шард автора по хешу его id."""
+    shards = get_shards()
+    return shards[zlib.crc32(str(author_id).encode()) % len(shards)]
+
+
+def db_for_author(author_id):
+    if not is_sharded():
+        return None
+    key = _author_key(author_id)
+    alias = cache.get(key)
+    if alias is None:
+        alias = AuthorShard.objects.filter(
+            author_id=author_id
+        ).values_list('alias', flat=True).first()
+        alias = alias or default_shard(author_id)
+        # Перенос автора меняет карту из другого процесса.
+        cache.set(key, alias, shared_timeout(cache, SHARD_CACHE_TIMEOUT))
+    return alias
+
+
+def author_of_post(post_id):
+    key = _post_key(post_id)
+    author_id = cache.get(key)
+    if author_id is None:
+        author_id = PostLocation.objects.filter(
+            pk=post_id
+        ).values_list('author_id', flat=True).first()
+        if author_id is not None:
+            cache.set(key, author_id, SHARD_CACHE_TIMEOUT)
+    return author_id
+
+
+def db_for_post(post_id):
+    """Шард поста. Для несуществующего поста - первый шард."""
+    if not is_sharded():
+        return None
+    author_id = author_of_post(post_id)
+    if author_id is None:
+        return get_shards()[0]
+    return db_for_author(author_id)
+
+
+def followed_authors(user):
+    """id авторов из подписок - подзапрос или список для шардов."""
+    author_ids = Follow.objects.filter(user=user).values('author_id')
+    if is_sharded():
+        return [row['author_id'] for row in author_ids]
+    return author_ids
+
+
+class ShardedPosts:
+    """Посты со всех шардов, слитые по дате публикации.
+
+    Поддерживает count() и срезы - этого достаточно Paginator. Для среза
+    [a:b] из каждого шарда берётся b первых постов.
+    """
+    ordered = True
+
+    def __init__(self, build):
+        self.build = build
+
+    def querysets(self):
+        for alias in get_shards():
+            yield self.build(Post.objects.using(alias)).order_by(
+                '-pub_date', '-pk'
+            )
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if index.step or (index.start or 0) < 0 or index.stop is None:
+            raise ValueError('Поддерживаются только срезы [a:b]')
+        merged = heapq.merge(
+            *(queryset[:index.stop] for queryset in self.querysets()),
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=True
+        )
+        return list(merged)[index.start or 0:index.stop]
+
+
+def sharded_posts(build):
+    """Выборка постов build(Post.objects) со всех шардов."""
+    if not is_sharded():
+        return build(Post.objects.all())
+    return ShardedPosts(build)
+
+
+def allocate_post_id(author_id) -> int:
+    location = PostLocation.objects.using(DEFAULT_DB_ALIAS).create(
+        author_id=author_id
+    )
+    cache.set(_post_key(location.pk), author_id, SHARD_CACHE_TIMEOUT)
+    return location.pk
+
+
+def copy_reference_rows(instance, aliases=None):
+    """Копирует в шарды строку пользователя или группы.
+
+    Копируются только поля из REFERENCE_FIELDS, остальные получают
+    значения по умолчанию. Копия сохраняется как raw, как при loaddata:
+    поля не пересчитываются, а обработчики сигналов её пропускают.
+    """
+    model = type(instance)
+    copy = model(pk=instance.pk, **reference_values(instance))
+    for alias in aliases or get_shards():
+        if alias != DEFAULT_DB_ALIAS:
+            copy.save_base(using=alias, raw=True)
+
+
+class ShardRouter:
+    """Направляет запросы к постам и комментариям в шард автора."""
+    sharded_models = (Post, Comment)
+
+    def _db_for_instance(self, instance):
+        if isinstance(instance, User):
+            return db_for_author(instance.pk)
+        if not isinstance(instance, self.sharded_models):
+            return None
+        # У новой строки _state.db мог выставить присвоенный внешний
+        # ключ (группа из основной базы), а не шард.
+        if not instance._state.adding and instance._state.db is not None:
+            return instance._state.db
+        if isinstance(instance, Post):
+            return db_for_author(instance.author_id)
+        return db_for_post(instance.post_id)
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded() or model not in self.sharded_models:
+            return None
+        return self._db_for_instance(hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded() or model not in self.sharded_models:
+            return None
+        return self._db_for_instance(hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not is_sharded():
+            return None
+        databases = {DEFAULT_DB_ALIAS, *get_shards()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def move_author(author, target):
+    """Переносит посты автора и комментарии к ним в шард target.
+
+    Сначала данные копируются, затем переключается карта шардов и только
+    потом удаляются копии из других шардов - читатели всё время видят
+    посты. Прерванный перенос можно повторить: строки копируются
+    с заменой, а лишние копии удаляются и после переключения карты.
+    """
+    source = db_for_author(author.pk)
+    moved = 0
+    if source != target:
+        posts = list(Post.objects.using(source).filter(author=author))
+        comments = list(
+            Comment.objects.using(source).filter(post__author=author)
+        )
+        commenters = User.objects.filter(
+            pk__in={comment.author_id for comment in comments} | {author.pk}
+        )
+        with transaction.atomic(using=target):
+            for user in commenters:
+                copy_reference_rows(user, [target])
+            groups = Group.objects.filter(
+                pk__in={post.group_id for post in posts if post.group_id}
+            )
+            for group in groups:
+                copy_reference_rows(group, [target])
+            for row in (*posts, *comments):
+                row.save_base(using=target, raw=True)
+        AuthorShard.objects.update_or_create(
+            author=author, defaults={'alias': target}
+        )
+        cache.delete(_author_key(author.pk))
+        moved = len(posts)
+    for alias in get_shards():
+        if alias != target:
+            _delete_copies(author, alias)
+    return moved
+
+
+def _delete_copies(author, alias):
+    """Удаляет копии постов автора и комментариев к ним из шарда alias.
+
+    Удаление идёт мимо сигналов post_delete: пост не удалён, а переехал,
+    и его просмотры и счёт популярности должны остаться.
+    """
+    posts = Post.objects.using(alias).filter(author=author)
+    Comment.objects.using(alias).filter(post__in=posts)._raw_delete(alias)
+    posts._raw_delete(alias)
@@ -0,0 +1,191 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .lookups import invalidate
+from .markers import (author_scope, follow_scope, group_scope, post_scope,
+                      site_scope, touch)
+from .models import Comment, Follow, Group, Post, TrendingEntry, ViewCounter
+from .sharding import (REFERENCE_FIELDS, allocate_post_id,
+                       copy_reference_rows, db_for_author, get_shards,
+                       is_sharded, reference_values)
+from .trending import record, regroup
+
+User = get_user_model()
+
+# Поля пользователя, которые выводятся в лентах и на страницах постов.
+AUTHOR_DISPLAY_FIELDS = frozenset(
+    ('username', 'first_name', 'last_name')
+)
+
+
+def _post_scopes(post):
+    scopes = {
+        site_scope(), author_scope(post.author_id), post_scope(post.pk)
+    }
+    for group_id in (post.group_id, getattr(post, '_previous_group_id', None)):
+        if group_id is not None:
+            scopes.add(group_scope(group_id))
+    return scopes
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw, using, **kwargs):
+    """Запоминает прежнюю группу поста, чтобы сбросить и её ленту."""
+    if instance.pk is None or raw:
+        return
+    instance._previous_group_id = Post.objects.using(using).filter(
+        pk=instance.pk
+    ).values_list('group_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Post)
+def allocate_sharded_post_id(sender, instance, raw, **kwargs):
+    """Выдаёт новому посту сквозной id, по которому найдётся его шард."""
+    if instance.pk is None and not raw and is_sharded():
+        instance.pk = allocate_post_id(instance.author_id)
+
+
+def _copies_reference_fields(sender, raw, update_fields) -> bool:
+    if raw or not is_sharded():
+        return False
+    return update_fields is None or bool(
+        set(REFERENCE_FIELDS[sender]) & set(update_fields)
+    )
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Group)
+def remember_reference_values(sender, instance, raw, update_fields,
+                              **kwargs):
+    """Запоминает поля копии в шардах, чтобы не копировать их без нужды."""
+    if instance.pk is None or not _copies_reference_fields(
+        sender, raw, update_fields
+    ):
+        return
+    instance._reference_values = sender._default_manager.filter(
+        pk=instance.pk
+    ).values(*REFERENCE_FIELDS[sender]).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+def copy_to_shards(sender, instance, raw, update_fields, **kwargs):
+    """Держит в шардах копии строк, на которые ссылаются посты.
+
+    Строка копируется, только если изменились поля из REFERENCE_FIELDS:
+    вход пользователя (last_login) шарды не трогает.
+    """
+    if not _copies_reference_fields(sender, raw, update_fields):
+        return
+    values = reference_values(instance)
+    if getattr(instance, '_reference_values', None) != values:
+        copy_reference_rows(instance)
+        instance._reference_values = values
+
+
+@receiver(post_delete, sender=User)
+def delete_from_shards(sender, instance, **kwargs):
+    if not is_sharded():
+        return
+    for alias in get_shards():
+        Comment.objects.using(alias).filter(author_id=instance.pk).delete()
+        Post.objects.using(alias).filter(author_id=instance.pk).delete()
+        User.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def touch_post_feeds(sender, instance, **kwargs):
+    touch(*_post_scopes(instance))
+
+
+@receiver(post_delete, sender=Post)
+def delete_view_counter(sender, instance, **kwargs):
+    ViewCounter.objects.filter(
+        kind=ViewCounter.POST, object_id=instance.pk
+    ).delete()
+
+
+@receiver(post_save, sender=Post)
+def update_trending_post(sender, instance, created, raw, **kwargs):
+    """Публикация даёт посту начальный счёт, смена группы переносит его."""
+    if raw:
+        return
+    if created:
+        record('post', [(instance.pk, instance.group_id, 1)],
+               instance.pub_date)
+        return
+    previous = getattr(instance, '_previous_group_id', None)
+    if previous != instance.group_id:
+        regroup(instance.pk, previous, instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def delete_trending_entries(sender, instance, **kwargs):
+    TrendingEntry.objects.filter(post_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Comment)
+def update_trending_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        record('comment', [(instance.post_id, instance.post.group_id, 1)],
+               instance.created)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_post_comments(sender, instance, **kwargs):
+    touch(post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+def touch_group_feed(sender, instance, created, **kwargs):
+    """Сбрасывает ленты со ссылками на группу, в том числе профили."""
+    author_ids = set()
+    if not created:
+        for alias in get_shards():
+            author_ids.update(Post.objects.using(alias).filter(
+                group=instance
+            ).values_list('author_id', flat=True).distinct())
+    touch(
+        site_scope(),
+        group_scope(instance.pk),
+        *(author_scope(author_id) for author_id in author_ids)
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def touch_follow_feed(sender, instance, **kwargs):
+    touch(follow_scope(instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def touch_author_feeds(sender, instance, created, update_fields, raw,
+                       **kwargs):
+    """Сбрасывает ленты, в которых выводится имя автора."""
+    if created or raw:
+        return
+    if update_fields and not AUTHOR_DISPLAY_FIELDS & set(update_fields):
+        return
+    group_ids = Post.objects.using(db_for_author(instance.pk)).filter(
+        author=instance, group__isnull=False
+    ).values_list('group_id', flat=True).distinct()
+    touch(
+        site_scope(),
+        author_scope(instance.pk),
+        *(group_scope(group_id) for group_id in group_ids)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_cached_group(sender, instance, **kwargs):
+    invalidate(instance, 'slug')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate(instance, 'username')
@@ -0,0 +1,27 @@
+from sorl.thumbnail import get_thumbnail
+
+from jobs.queue import task
+
+from .digest import send_digest
+from .models import Post
+from .sharding import db_for_post
+
+# Миниатюра из шаблонов постов (posts/includes/post_list.html и др.).
+THUMBNAIL_GEOMETRY = '360x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+@task(name='posts.make_thumbnail')
+def make_thumbnail(post_id):
+    """Создаёт миниатюру картинки поста до первого показа."""
+    post = Post.objects.using(db_for_post(post_id)).filter(
+        pk=post_id
+    ).first()
+    if post is not None and post.image:
+        get_thumbnail(post.image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS)
+
+
+@task(name='posts.send_digest')
+def send_weekly_digest():
+    """Рассылает дайджест подписок; после сбоя продолжает с отметки."""
+    send_digest()
@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.warmup import USER_AGENT
+from ..counters import HyperLogLog, buffer, totals, write_counters
+from ..models import Post, ViewCounter
+
+User = get_user_model()
+
+
+class HyperLogLogTests(TestCase):
+    def test_estimate(self):
+        """Оценка близка к числу различных значений, повторы не считаются."""
+        sketch = HyperLogLog(precision=11)
+        for number in range(20000):
+            sketch.add(f'user:{number % 10000}')
+        self.assertAlmostEqual(sketch.estimate(), 10000, delta=500)
+        self.assertEqual(len(sketch.to_bytes()), 2048)
+        small = HyperLogLog(precision=11)
+        for number in range(50):
+            small.add(str(number))
+        self.assertAlmostEqual(small.estimate(), 50, delta=2)
+
+    def test_merge_is_union(self):
+        first, second = HyperLogLog(precision=11), HyperLogLog(precision=11)
+        for number in range(3000):
+            first.add(str(number))
+            second.add(str(number + 1500))
+        first.merge(HyperLogLog(registers=second.to_bytes()))
+        self.assertAlmostEqual(first.estimate(), 4500, delta=250)
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(precision=10))
+
+
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {number}')
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        buffer.pending = {}
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def url(self, post):
+        return reverse('posts:post_detail', kwargs={'post_id': post.pk})
+
+    def test_views_are_buffered(self):
+        """Просмотр только меняет буфер, в базу пишет flush."""
+        post = self.posts[0]
+        self.client.get(self.url(post))
+        response = self.client.get(self.url(post))
+        self.assertContains(response, 'Просмотров: 2, читателей: ~1')
+        Client().get(self.url(post), HTTP_USER_AGENT=USER_AGENT)
+        self.assertFalse(ViewCounter.objects.exists())
+        buffer.flush()
+        self.assertEqual(buffer.pending, {})
+        self.assertEqual(
+            ViewCounter.objects.get(kind=ViewCounter.POST,
+                                    object_id=post.pk).views,
+            2
+        )
+        Client().get(self.url(post))
+        self.assertEqual(totals(ViewCounter.POST, post.pk), (3, 2))
+
+    def test_author_totals_on_profile(self):
+        for post in self.posts[:2]:
+            self.client.get(self.url(post))
+        Client().get(self.url(self.posts[0]))
+        buffer.flush()
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author'})
+        )
+        self.assertContains(response, 'Просмотров постов: 3, читателей: ~2')
+
+    def test_flush_is_batched(self):
+        """Число запросов записи не зависит от числа постов."""
+
+        def flush_queries(posts):
+            pending = {}
+            for post in posts:
+                sketch = HyperLogLog()
+                sketch.add('reader')
+                pending[post.pk] = (1, sketch)
+            with CaptureQueriesContext(connection) as context:
+                write_counters(pending)
+            return len(context.captured_queries)
+
+        flush_queries(self.posts)
+        self.assertEqual(flush_queries(self.posts[:2]),
+                         flush_queries(self.posts))
+        counter = ViewCounter.objects.get(kind=ViewCounter.AUTHOR,
+                                          object_id=self.author.pk)
+        self.assertEqual(counter.views, 12)
+
+    def test_deleted_post_counter(self):
+        post = Post.objects.create(author=self.author, text='Удалю')
+        self.client.get(self.url(post))
+        buffer.flush()
+        post.delete()
+        self.assertFalse(ViewCounter.objects.filter(
+            kind=ViewCounter.POST, object_id=post.pk
+        ).exists())
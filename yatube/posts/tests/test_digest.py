@@ -0,0 +1,130 @@
+import datetime as dt
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import digest
+from ..models import DigestRun, Follow, Post
+
+User = get_user_model()
+
+
+class DigestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.leo = User.objects.create_user(username='leo', first_name='Лев',
+                                           last_name='Толстой')
+        cls.anton = User.objects.create_user(username='anton')
+        cls.readers = [
+            User.objects.create_user(username=f'reader{number}',
+                                     email=f'reader{number}@example.com')
+            for number in range(3)
+        ]
+        cls.no_email = User.objects.create_user(username='no_email')
+        for reader in cls.readers[:2] + [cls.no_email]:
+            Follow.objects.create(user=reader, author=cls.leo)
+        Follow.objects.create(user=cls.readers[0], author=cls.anton)
+        old = Post.objects.create(author=cls.leo, text='Старый пост')
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - dt.timedelta(days=30)
+        )
+        cls.posts = [
+            Post.objects.create(author=author, text=f'Пост {number}')
+            for number, author in enumerate([cls.leo, cls.anton, cls.leo])
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.since = timezone.now() - dt.timedelta(days=7)
+        self.until = timezone.now()
+
+    def test_follower_posts(self):
+        """Подписчики по порядку, посты их авторов - от новых к старым."""
+        leo_1, anton_1, leo_2 = (post.pk for post in self.posts)
+        rows = [
+            (user_id, [pk for pk, _ in posts])
+            for user_id, posts in digest.follower_posts(self.since,
+                                                        self.until)
+        ]
+        self.assertEqual(rows, [
+            (self.readers[0].pk, [leo_2, anton_1, leo_1]),
+            (self.readers[1].pk, [leo_2, leo_1]),
+            (self.no_email.pk, [leo_2, leo_1]),
+        ])
+        self.assertEqual(
+            list(digest.follower_posts(self.since, self.until,
+                                       after_user=self.readers[0].pk,
+                                       per_user=1))[0],
+            (self.readers[1].pk, [(leo_2, self.posts[2].updated_at)])
+        )
+
+    def test_sharded_pass_matches(self):
+        """Проход по шардам даёт те же пары, повторы постов убираются."""
+        expected = list(digest.follower_posts(self.since, self.until))
+        with override_settings(POSTS_SHARDS=['default', 'default']):
+            self.assertEqual(
+                list(digest.follower_posts(self.since, self.until)), expected
+            )
+
+    def test_send_digest(self):
+        run = digest.send_digest()
+        self.assertIsNotNone(run.finished)
+        self.assertEqual(run.emails, 2)
+        first, second = mail.outbox
+        self.assertEqual(first.to, ['reader0@example.com'])
+        self.assertIn('Лев Толстой', first.body)
+        self.assertIn(f'/posts/{self.posts[1].pk}/', first.body)
+        self.assertNotIn('Старый пост', first.body)
+        self.assertNotIn('Пост 1', second.body)
+
+    def test_next_run_continues_period(self):
+        first = digest.send_digest()
+        mail.outbox.clear()
+        second = digest.send_digest(
+            now=first.until + dt.timedelta(days=7)
+        )
+        self.assertEqual(second.since, first.until)
+        self.assertEqual(second.emails, 0)
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(DIGEST_BATCH_SIZE=1)
+    def test_interrupted_run_resumes(self):
+        """После сбоя рассылка продолжается без повторных писем."""
+        send_batch = digest.send_batch
+        calls = []
+
+        def flaky(run, batch):
+            if calls:
+                raise RuntimeError('сбой')
+            calls.append(batch)
+            return send_batch(run, batch)
+
+        with mock.patch.object(digest, 'send_batch', flaky):
+            with self.assertRaises(RuntimeError):
+                digest.send_digest()
+        run = DigestRun.objects.get()
+        self.assertIsNone(run.finished)
+        self.assertEqual(run.last_user_id, self.readers[0].pk)
+        digest.send_digest()
+        self.assertEqual(
+            [message.to[0] for message in mail.outbox],
+            ['reader0@example.com', 'reader1@example.com']
+        )
+        run.refresh_from_db()
+        self.assertEqual(run.emails, 2)
+        self.assertIsNotNone(run.finished)
+
+    def test_snippets_are_cached(self):
+        post = self.posts[0]
+        digest.snippets({post.pk: post.updated_at})
+        with self.assertNumQueries(0):
+            cached = digest.snippets({post.pk: post.updated_at})
+        post.text = 'Исправленный пост'
+        post.save()
+        self.assertNotEqual(
+            digest.snippets({post.pk: post.updated_at}), cached
+        )
@@ -0,0 +1,106 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class FeedsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст ленты',
+            author=cls.user,
+            group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_feeds_available(self):
+        """Ленты доступны и содержат пост."""
+        feeds = {
+            reverse('posts:index_feed'): 'application/rss+xml',
+            reverse('posts:index_atom'): 'application/atom+xml',
+            reverse('posts:group_feed', kwargs={'slug': self.group.slug}):
+            'application/rss+xml',
+            reverse('posts:group_atom', kwargs={'slug': self.group.slug}):
+            'application/atom+xml',
+            reverse('posts:profile_feed',
+                    kwargs={'username': self.user.username}):
+            'application/rss+xml',
+            reverse('posts:profile_atom',
+                    kwargs={'username': self.user.username}):
+            'application/atom+xml',
+        }
+        for address, content_type in feeds.items():
+            with self.subTest(address=address):
+                response = self.guest_client.get(address)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTrue(
+                    response['Content-Type'].startswith(content_type))
+                self.assertIn(self.post.text, response.content.decode())
+
+    def test_unknown_feed_object(self):
+        """Лента несуществующей группы отдаёт 404."""
+        response = self.guest_client.get(
+            reverse('posts:group_feed', kwargs={'slug': 'no-such-group'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_feed_not_modified(self):
+        """Неизменившаяся лента отдаёт 304."""
+        address = reverse('posts:group_feed',
+                          kwargs={'slug': self.group.slug})
+        response = self.guest_client.get(address)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        response = self.guest_client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        response = self.guest_client.get(
+            address, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_feed_regenerated_after_new_post(self):
+        """Новый пост сбрасывает закешированную ленту."""
+        address = reverse('posts:group_feed',
+                          kwargs={'slug': self.group.slug})
+        etag = self.guest_client.get(address)['ETag']
+        post = Post.objects.create(
+            text='Свежий пост для ленты',
+            author=self.user,
+            group=self.group
+        )
+        response = self.guest_client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn(post.text, response.content.decode())
+
+    def test_feed_reset_for_previous_group(self):
+        """Перенос поста в другую группу сбрасывает ленту прежней."""
+        group_2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test-slug_2',
+            description='Тестовое описание 2'
+        )
+        address = reverse('posts:group_feed',
+                          kwargs={'slug': self.group.slug})
+        etag = self.guest_client.get(address)['ETag']
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = group_2
+        post.save()
+        response = self.guest_client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotIn(post.text, response.content.decode())
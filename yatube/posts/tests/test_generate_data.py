@@ -0,0 +1,70 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..management.commands.generate_data import EMAIL_DOMAIN
+from ..markers import get_marker, site_scope
+from ..models import ChangeMarker, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+OPTIONS = {
+    'users': 30, 'groups': 3, 'posts': 200, 'comments': 400,
+    'follows': 100, 'batch_size': 7, 'stdout': StringIO(),
+}
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDataTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self):
+        return [model.objects.count()
+                for model in (Group, Post, Comment, Follow)]
+
+    def test_generates_requested_rows(self):
+        """Создаётся заданное число строк."""
+        call_command('generate_data', **OPTIONS)
+        groups, posts, comments, follows = self.counts()
+        self.assertEqual((groups, posts, comments), (3, 200, 400))
+        self.assertTrue(0 < follows <= 100)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+
+    def test_resume_after_interrupt(self):
+        """Повторный запуск дописывает недостающие пачки теми же данными."""
+        call_command('generate_data', **OPTIONS)
+        expected = self.counts()
+        texts = list(Post.objects.order_by('pk').values_list('text'))
+        # Прерывание откатывает незаконченную пачку целиком: удаляем
+        # посты последней пачки авторов (номера 28 и 29).
+        author_ids = list(User.objects.filter(
+            email__endswith=EMAIL_DOMAIN
+        ).order_by('pk').values_list('pk', flat=True))
+        Post.objects.filter(author_id__gte=author_ids[28]).delete()
+        call_command('generate_data', **OPTIONS)
+        self.assertEqual(self.counts(), expected)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text')), sorted(texts)
+        )
+
+    def test_markers_touched(self):
+        """Отметки лент меняются в базе, а не только в кеше команды."""
+        before = get_marker(site_scope())
+        call_command('generate_data', **OPTIONS)
+        stored = ChangeMarker.objects.get(scope=site_scope()).changed
+        self.assertGreater(stored, before)
+        self.assertEqual(get_marker(site_scope()), stored)
@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, ViewCounter
+from ..prewarm import hot_paths
+from ..views import NUM_OF_POSTS
+
+User = get_user_model()
+
+SHARED_CACHE_DIR = tempfile.mkdtemp()
+SHARED_CACHES = {
+    **settings.CACHES,
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SHARED_CACHE_DIR,
+    },
+}
+
+
+class HotPathsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Группа', slug='hot', description='Описание'
+        )
+        cls.popular = User.objects.create_user(username='popular')
+        cls.quiet = User.objects.create_user(username='quiet')
+        for username in ('fan1', 'fan2'):
+            fan = User.objects.create_user(username=username)
+            Follow.objects.create(user=fan, author=cls.popular)
+        Follow.objects.create(user=cls.popular, author=cls.quiet)
+        cls.calm_post = Post.objects.create(author=cls.quiet, text='Тихо')
+        cls.hot_post = Post.objects.create(author=cls.popular, text='Спор')
+        Comment.objects.create(post=cls.calm_post, author=cls.quiet,
+                               text='Один')
+        for _ in range(3):
+            Comment.objects.create(post=cls.hot_post, author=cls.quiet,
+                                   text='Ещё')
+
+    def test_priority_order(self):
+        """Главная, группы, популярные авторы, обсуждаемые посты."""
+        self.assertEqual(hot_paths(index_pages=2, authors=2, posts=2), [
+            ('index', reverse('posts:index')),
+            ('feed', reverse('posts:index_feed')),
+            ('group', reverse('posts:group_list', args=('hot',))),
+            ('feed', reverse('posts:group_feed', args=('hot',))),
+            ('profile', reverse('posts:profile', args=('popular',))),
+            ('profile', reverse('posts:profile', args=('quiet',))),
+            ('post', reverse('posts:post_detail', args=(self.hot_post.pk,))),
+            ('post',
+             reverse('posts:post_detail', args=(self.calm_post.pk,))),
+        ])
+
+    def test_viewed_posts_first(self):
+        """Просматриваемые посты идут раньше обсуждаемых."""
+        ViewCounter.objects.create(kind=ViewCounter.POST,
+                                   object_id=self.calm_post.pk, views=10)
+        posts = [path for kind, path in hot_paths(0, 0, posts=2)
+                 if kind == 'post']
+        self.assertEqual(posts, [
+            reverse('posts:post_detail', args=(self.calm_post.pk,)),
+            reverse('posts:post_detail', args=(self.hot_post.pk,)),
+        ])
+
+    def test_limits(self):
+        """Страниц главной не больше, чем есть у паджинатора."""
+        Post.objects.bulk_create(
+            Post(author=self.quiet, text='Пост') for _ in range(NUM_OF_POSTS)
+        )
+        kinds = [kind for kind, _ in hot_paths(5, authors=1, posts=0)]
+        self.assertEqual(
+            kinds, ['index', 'index', 'feed', 'group', 'feed', 'profile']
+        )
+        kinds = [kind for kind, _ in hot_paths(0, authors=0, posts=0)]
+        self.assertEqual(kinds, ['feed', 'group', 'feed'])
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class PrewarmCommandTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(shutil.rmtree, SHARED_CACHE_DIR, True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_are_cached(self):
+        """После прогрева фрагмент главной уже лежит в кеше."""
+        Post.objects.create(
+            author=User.objects.create_user(username='author'), text='Пост'
+        )
+        output = StringIO()
+        call_command('prewarm_cache', concurrency=2, stdout=output)
+        self.assertIsNotNone(
+            cache.get(make_template_fragment_key('index_page', [1]))
+        )
+        self.assertIn('index: 1 стр., ошибок 0', output.getvalue())
+
+    @override_settings(CACHES=settings.CACHES)
+    def test_local_cache_refused(self):
+        """В LocMemCache команды прогрев бесполезен для сервера."""
+        with self.assertRaises(CommandError):
+            call_command('prewarm_cache', stdout=StringIO())
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.replicas import PIN_COOKIE, is_pinned, reset_state
+
+from ..markers import get_markers, group_scope, touch
+from ..models import ChangeMarker, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaPagesTests(TestCase):
+    """Реплика - отдельный файл SQLite, её обновляет только sync."""
+    databases = {'default', 'replica_1'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.databases['replica_1'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.replica_dir, 'replica_1.sqlite3'),
+        }
+        # Роутер реплик не даёт связать права в реплике с основной базой.
+        with override_settings(DATABASE_ROUTERS=[]):
+            call_command('migrate', database='replica_1', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica_1'].close()
+        del connections.databases['replica_1']
+        delattr(connections._connections, 'replica_1')
+        shutil.rmtree(cls.replica_dir)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Старый текст'
+        )
+        self.sync()
+        reset_state()
+        self.addCleanup(reset_state)
+        self.client = Client()
+
+    def sync(self):
+        """Реплика догоняет основную базу."""
+        for model in (User, Group, Post, ChangeMarker):
+            model.objects.using('replica_1').all().delete()
+            model.objects.using('replica_1').bulk_create(
+                model.objects.using('default').all()
+            )
+
+    def feed_etag(self):
+        response = self.client.get(
+            reverse('posts:group_feed', kwargs={'slug': 'group'})
+        )
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        return response['ETag'], response.content.decode()
+
+    def test_page_markers_match_replica(self):
+        """Лента из реплики кешируется под отметкой реплики."""
+        etag, content = self.feed_etag()
+        self.assertIn('Старый текст', content)
+        # Запись ещё не дошла до реплики.
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        touch(group_scope(self.group.pk))
+        self.assertEqual(self.feed_etag(), (etag, content))
+        self.sync()
+        new_etag, content = self.feed_etag()
+        self.assertNotEqual(new_etag, etag)
+        self.assertIn('Новый текст', content)
+
+    def test_missing_marker_pins_primary(self):
+        """Отметки, которой нет в реплике, запрос ждёт от основной базы."""
+        scope = group_scope(self.group.pk)
+        self.assertEqual(
+            get_markers(scope),
+            [ChangeMarker.objects.using('replica_1').get(scope=scope).changed]
+        )
+        self.assertFalse(is_pinned())
+        touch('new')
+        self.assertEqual(
+            get_markers('new'),
+            [ChangeMarker.objects.using('default').get(scope='new').changed]
+        )
+        self.assertTrue(is_pinned())
+
+    def test_pages_do_not_pin(self):
+        """Страницы, которые пишут отметки и счётчики, не ставят cookie."""
+        ChangeMarker.objects.using('replica_1').all().delete()
+        ChangeMarker.objects.using('default').all().delete()
+        cache.clear()
+        for page in (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ):
+            with self.subTest(page=page):
+                response = self.client.get(page)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertTrue(ChangeMarker.objects.using('default').exists())
@@ -0,0 +1,224 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.sqlite import serialized_write
+
+from ..models import (AuthorShard, Comment, Group, Post, PostLocation,
+                      TrendingEntry, ViewCounter)
+from ..sharding import (ShardedPosts, ShardRouter, allocate_post_id,
+                        db_for_author, db_for_post, default_shard,
+                        move_author, sharded_posts)
+
+User = get_user_model()
+
+SHARDS = ['default', 'shard_2']
+
+
+class ShardMapTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_single_shard_is_not_routed(self):
+        """Без шардов база выбирается роутерами по умолчанию."""
+        self.assertIsNone(db_for_author(self.user.pk))
+        self.assertIsNone(db_for_post(1))
+
+    @override_settings(POSTS_SHARDS=SHARDS)
+    def test_author_shard(self):
+        """Шард автора - по хешу, если автор не перенесён."""
+        self.assertEqual(
+            db_for_author(self.user.pk), default_shard(self.user.pk)
+        )
+        target = next(
+            alias for alias in SHARDS if alias != default_shard(self.user.pk)
+        )
+        AuthorShard.objects.create(author=self.user, alias=target)
+        cache.clear()
+        self.assertEqual(db_for_author(self.user.pk), target)
+
+    @override_settings(POSTS_SHARDS=SHARDS)
+    def test_post_shard(self):
+        """Шард поста ищется по сквозному id."""
+        post_id = allocate_post_id(self.user.pk)
+        self.assertTrue(PostLocation.objects.filter(pk=post_id).exists())
+        self.assertEqual(db_for_post(post_id), db_for_author(self.user.pk))
+
+    @override_settings(POSTS_SHARDS=SHARDS)
+    def test_router_uses_instance_shard(self):
+        """Связанные посты читаются из шарда автора."""
+        router = ShardRouter()
+        self.assertEqual(
+            router.db_for_read(Post, instance=self.user),
+            db_for_author(self.user.pk)
+        )
+        self.assertIsNone(router.db_for_read(User, instance=self.user))
+
+
+class ShardedPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        for number in range(5):
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+
+    def test_single_shard_returns_queryset(self):
+        """Без шардов выборка остаётся обычным QuerySet."""
+        posts = sharded_posts(lambda posts: posts.filter(author=self.user))
+        self.assertEqual(posts.count(), 5)
+        self.assertNotIsInstance(posts, ShardedPosts)
+
+    @override_settings(POSTS_SHARDS=['default', 'default'])
+    def test_merge_keeps_order(self):
+        """Посты шардов сливаются по дате публикации."""
+        posts = ShardedPosts(lambda posts: posts.filter(author=self.user))
+        expected = [
+            pk for pk in Post.objects.values_list('pk', flat=True)
+            for _ in range(2)
+        ]
+        self.assertEqual(posts.count(), 10)
+        self.assertEqual([post.pk for post in posts[2:6]], expected[2:6])
+        self.assertEqual(posts[0].pk, expected[0])
+
+
+SECOND_SHARD = ['default', 'shard_2']
+
+
+@override_settings(POSTS_SHARDS=SECOND_SHARD)
+class SecondShardTests(TestCase):
+    """Второй шард - отдельный файл SQLite."""
+    databases = {'default', 'shard_2'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.shard_dir = tempfile.mkdtemp()
+        connections.databases['shard_2'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.shard_dir, 'shard_2.sqlite3'),
+        }
+        with override_settings(POSTS_SHARDS=SECOND_SHARD):
+            call_command('migrate', database='shard_2', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['shard_2'].close()
+        del connections.databases['shard_2']
+        delattr(connections._connections, 'shard_2')
+        shutil.rmtree(cls.shard_dir)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='sharded')
+        AuthorShard.objects.create(author=self.author, alias='shard_2')
+        self.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_post_with_group_written_to_author_shard(self):
+        """Группа из основной базы не уводит новый пост из шарда автора."""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост в шарде', 'group': self.group.pk,
+        })
+        self.assertTrue(Post.objects.using('shard_2').filter(
+            text='Пост в шарде', group=self.group
+        ).exists())
+        self.assertFalse(Post.objects.using('default').exists())
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        )
+        self.assertContains(response, 'Пост в шарде')
+
+    def test_write_atomic_in_shard(self):
+        """Запись выполняется в транзакции и в шарде."""
+        shard = connections['shard_2']
+        depth = len(shard.savepoint_ids)
+        write = serialized_write(lambda: len(shard.savepoint_ids))
+        self.assertEqual(write(), depth + 1)
+
+    def test_user_copy_has_display_fields_only(self):
+        """В шард копируются только выводимые поля пользователя."""
+        copy = User.objects.using('shard_2').get(pk=self.author.pk)
+        self.assertEqual(copy.username, 'sharded')
+        self.assertEqual(copy.password, '')
+        self.author.last_login = timezone.now()
+        with CaptureQueriesContext(connections['shard_2']) as context:
+            self.author.save(update_fields=['last_login'])
+            self.author.save()
+        self.assertFalse([query for query in context.captured_queries
+                          if 'auth_user' in query['sql']])
+        self.author.first_name = 'Лев'
+        self.author.save()
+        self.assertEqual(
+            User.objects.using('shard_2').get(pk=self.author.pk).first_name,
+            'Лев'
+        )
+
+    def test_move_author_can_be_repeated(self):
+        """Прерванный перенос автора можно повторить."""
+        post = Post.objects.create(
+            author=self.author, text='Переезд', group=self.group
+        )
+        # Перенос прервался после копирования строк.
+        post.save_base(using='default', raw=True, force_insert=True)
+        self.assertEqual(move_author(self.author, 'default'), 1)
+        # Перенос прервался после переключения карты шардов.
+        post.save_base(using='shard_2', raw=True, force_insert=True)
+        self.assertEqual(move_author(self.author, 'default'), 0)
+        self.assertFalse(Post.objects.using('shard_2').exists())
+        self.assertEqual(
+            Post.objects.using('default').get(pk=post.pk).text, 'Переезд'
+        )
+
+    def test_move_author_keeps_views(self):
+        """Перенос автора не удаляет просмотры его постов."""
+        post = Post.objects.create(author=self.author, text='Переезд')
+        Comment.objects.create(post=post, author=self.author, text='Ок')
+        for kind, object_id in ((ViewCounter.POST, post.pk),
+                                (ViewCounter.AUTHOR, self.author.pk)):
+            ViewCounter.objects.create(kind=kind, object_id=object_id,
+                                       views=5, sketch=b'')
+        self.assertEqual(move_author(self.author, 'default'), 1)
+        self.assertEqual(
+            sorted(ViewCounter.objects.values_list('kind', 'views')),
+            [(ViewCounter.AUTHOR, 5), (ViewCounter.POST, 5)]
+        )
+        self.assertFalse(Comment.objects.using('shard_2').exists())
+        self.assertEqual(
+            Comment.objects.using('default').get(post_id=post.pk).text, 'Ок'
+        )
+
+    def test_move_author_keeps_trending(self):
+        """Перенесённый пост остаётся в популярном со своим счётом."""
+        Post.objects.create(
+            author=self.author, text='Переезд', group=self.group
+        )
+        entries = list(TrendingEntry.objects.order_by('scope').values_list(
+            'scope', 'post_id', 'score'
+        ))
+        self.assertTrue(entries)
+        move_author(self.author, 'default')
+        self.assertEqual(
+            list(TrendingEntry.objects.order_by('scope').values_list(
+                'scope', 'post_id', 'score'
+            )),
+            entries
+        )
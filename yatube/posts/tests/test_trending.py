@@ -0,0 +1,176 @@
+import datetime as dt
+import math
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..counters import HyperLogLog, write_counters
+from ..markers import group_scope, site_scope
+from ..models import Comment, Group, Post, TrendingEntry, ViewCounter
+from ..trending import (
+    TOTAL_SCOPE, log_add, log_weight, record, top_post_ids
+)
+
+User = get_user_model()
+
+HALF_LIFE = 60 * 60
+
+
+@override_settings(TRENDING_HALF_LIFE=HALF_LIFE, TRENDING_SIZE=3,
+                   TRENDING_WEIGHTS={'post': 1, 'comment': 3, 'view': 1})
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def create_post(self, text, group=None):
+        return Post.objects.create(author=self.author, text=text, group=group)
+
+    def test_forward_decay(self):
+        """Вклад через период полураспада весит вдвое больше."""
+        now = timezone.now()
+        later = now + dt.timedelta(seconds=HALF_LIFE)
+        self.assertAlmostEqual(log_weight(3, later),
+                               log_weight(6, now))
+        self.assertAlmostEqual(log_add(log_weight(1, now),
+                                       log_weight(1, now)),
+                               log_weight(2, now))
+        self.assertAlmostEqual(log_add(0, -1000), 0)
+        # Через десятилетия счёт остаётся конечным числом.
+        self.assertTrue(math.isfinite(
+            log_weight(1, now + dt.timedelta(days=365 * 50))
+        ))
+
+    def test_recent_comments_outrank_old(self):
+        old, fresh = self.create_post('Старый'), self.create_post('Свежий')
+        now = timezone.now()
+        record('comment', [(old.pk, None, 3)], now)
+        record('comment', [(fresh.pk, None, 1)],
+               now + dt.timedelta(seconds=2 * HALF_LIFE))
+        self.assertEqual(top_post_ids(site_scope())[0], fresh.pk)
+
+    def test_comment_raises_rank(self):
+        """add_comment сразу поднимает пост в списках сайта и группы."""
+        first = self.create_post('Первый', self.group)
+        self.create_post('Второй', self.group)
+        self.assertNotEqual(top_post_ids(site_scope())[0], first.pk)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': first.pk}),
+            {'text': 'Комментарий'}
+        )
+        self.assertEqual(top_post_ids(site_scope())[0], first.pk)
+        self.assertEqual(top_post_ids(group_scope(self.group.pk))[0],
+                         first.pk)
+
+    def test_views_flush_raises_rank(self):
+        first = self.create_post('Первый')
+        self.create_post('Второй')
+        sketch = HyperLogLog()
+        sketch.add('reader')
+        write_counters({first.pk: (5, sketch)})
+        self.assertEqual(top_post_ids(site_scope())[0], first.pk)
+
+    def test_lists_are_bounded(self):
+        posts = [self.create_post(f'Пост {number}', self.group)
+                 for number in range(5)]
+        for scope in (site_scope(), group_scope(self.group.pk)):
+            self.assertEqual(
+                top_post_ids(scope), [post.pk for post in posts[:1:-1]]
+            )
+        # Пост вне полного списка копит полный счёт: пока он не выше
+        # последнего в списке, пост не попадает в список, а потом
+        # вытесняет последний.
+        for post in posts[2:]:
+            record('comment', [(post.pk, self.group.pk, 1)])
+        for _ in range(2):
+            record('view', [(posts[0].pk, self.group.pk, 1)])
+            self.assertNotIn(posts[0].pk, top_post_ids(site_scope()))
+        record('view', [(posts[0].pk, self.group.pk, 2)])
+        for scope in (site_scope(), group_scope(self.group.pk)):
+            self.assertEqual(top_post_ids(scope)[0], posts[0].pk)
+            self.assertEqual(
+                TrendingEntry.objects.filter(scope=scope).count(), 3
+            )
+        self.assertEqual(
+            TrendingEntry.objects.filter(scope=TOTAL_SCOPE).count(), 5
+        )
+
+    def test_regroup_and_delete(self):
+        post = self.create_post('Пост')
+        self.assertEqual(top_post_ids(group_scope(self.group.pk)), [])
+        post.group = self.group
+        post.save()
+        self.assertEqual(top_post_ids(group_scope(self.group.pk)), [post.pk])
+        post.group = None
+        post.save()
+        self.assertEqual(top_post_ids(group_scope(self.group.pk)), [])
+        post.delete()
+        self.assertFalse(TrendingEntry.objects.exists())
+
+    def test_popular_pages(self):
+        """Страницы популярного не считают комментарии."""
+        first = self.create_post('Первый', self.group)
+        second = self.create_post('Второй')
+        record('comment', [(first.pk, self.group.pk, 1)])
+        with CaptureQueriesContext(connection) as context:
+            response = Client().get(reverse('posts:popular'))
+        self.assertNotIn(
+            'posts_comment',
+            ' '.join(query['sql'] for query in context.captured_queries)
+        )
+        self.assertEqual([post.pk for post in response.context['page_obj']],
+                         [first.pk, second.pk])
+        self.assertContains(response, 'Популярное')
+        response = self.client.get(
+            reverse('posts:group_popular', kwargs={'slug': 'group'})
+        )
+        self.assertEqual([post.pk for post in response.context['page_obj']],
+                         [first.pk])
+        self.assertContains(
+            self.client.get(reverse('posts:index')),
+            reverse('posts:popular')
+        )
+
+    def test_rebuild(self):
+        """rebuild_trending учитывает строки, записанные без сигналов."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {number}', group=group)
+            for number, group in enumerate((self.group, None, None, None))
+        )
+        posts = list(Post.objects.order_by('pk'))
+        Comment.objects.bulk_create(
+            Comment(post=posts[1], author=self.author, text='Комментарий')
+            for _ in range(2)
+        )
+        ViewCounter.objects.create(kind=ViewCounter.POST,
+                                   object_id=posts[0].pk, views=10)
+        self.assertFalse(TrendingEntry.objects.exists())
+        output = StringIO()
+        call_command('rebuild_trending', stdout=output)
+        self.assertIn('Постов со счётом: 4', output.getvalue())
+        self.assertEqual(
+            top_post_ids(site_scope()), [posts[0].pk, posts[1].pk, posts[3].pk]
+        )
+        self.assertEqual(top_post_ids(group_scope(self.group.pk)),
+                         [posts[0].pk])
+        self.assertEqual(
+            TrendingEntry.objects.filter(scope=TOTAL_SCOPE).count(), 4
+        )
+        # Следующие события прибавляются к пересчитанным счётам.
+        record('comment', [(posts[2].pk, None, 5)])
+        self.assertEqual(top_post_ids(site_scope())[0], posts[2].pk)
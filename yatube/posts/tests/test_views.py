@@ -1,18 +1,24 @@
 import shutil
 import tempfile
 import time
+from http import HTTPStatus
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
+from django.core.cache import cache, caches
 from django.core.cache.utils import make_template_fragment_key
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from core.caches import is_shared, shared_timeout
+
 from . import paginator_test, context_test
-from ..models import Post, Group, Follow
+from ..lookups import get_cached
+from ..markers import follow_scope, get_marker, touch
+from ..models import ChangeMarker, Comment, Post, Group, Follow
+from ..views import NUM_OF_COMMENTS
 
 User = get_user_model()
 
@@ -365,3 +371,388 @@ class FollowTests(TestCase):
         )
         self.assertEqual(len(response.context['page_obj']), 0,
                          'Пост появился в ленте неподписанного юзера')
+
+
+class CommentsBatchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.user,
+        )
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Коммент {i}')
+            for i in range(NUM_OF_COMMENTS + 5)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_first_comments_batch(self):
+        """На странице поста выводится первая порция комментариев."""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), NUM_OF_COMMENTS,
+                         'Выведены не все комментарии первой порции')
+        self.assertTrue(comments.has_next, 'Нет ссылки на следующую порцию')
+        self.assertEqual(comments.object_list[0].text, 'Коммент 0',
+                         'Комментарии не упорядочены по дате')
+
+    def test_next_comments_batch(self):
+        """Следующая порция загружается одним запросом по курсору."""
+        first = Comment.objects.filter(post=self.post)[NUM_OF_COMMENTS - 1]
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(reverse(
+                'posts:comments_batch',
+                kwargs={'post_id': self.post.pk, 'after': first.pk}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 5)
+        self.assertFalse(comments.has_next)
+        self.assertEqual(comments.object_list[0].text,
+                         f'Коммент {NUM_OF_COMMENTS}')
+
+    def test_missing_post_batch(self):
+        """Порция комментариев несуществующего поста - 404."""
+        response = self.guest_client.get(reverse(
+            'posts:comments_batch',
+            kwargs={'post_id': self.post.pk + 1, 'after': 1}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class PostDetailCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.url = reverse('posts:post_detail',
+                           kwargs={'post_id': self.post.pk})
+
+    def test_cached_detail_skips_queries(self):
+        """Повторный показ поста берёт тело страницы из кеша."""
+        self.guest_client.get(self.url)
+        # Проверка ETag и загрузка самого поста.
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(self.url)
+        self.assertContains(response, self.post.text)
+
+    def test_cached_detail_keeps_comment_form(self):
+        """Форма комментария с CSRF выводится поверх кеша."""
+        self.guest_client.get(self.url)
+        response = self.authorized_client.get(self.url)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_detail_invalidated_by_comment(self):
+        """Новый комментарий сбрасывает кеш страницы поста."""
+        self.guest_client.get(self.url)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Свежий комментарий'})
+        response = self.guest_client.get(self.url)
+        self.assertContains(response, 'Свежий комментарий')
+
+    def test_detail_invalidated_by_edit(self):
+        """Правка поста сбрасывает кеш страницы поста."""
+        self.guest_client.get(self.url)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Отредактированный текст'})
+        response = self.guest_client.get(self.url)
+        self.assertContains(response, 'Отредактированный текст')
+
+    def test_detail_invalidated_by_author_change(self):
+        """Смена имени автора сбрасывает кеш страницы поста."""
+        self.guest_client.get(self.url)
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Лев'
+        user.save()
+        response = self.guest_client.get(self.url)
+        self.assertContains(response, 'Лев')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.user,
+            group=cls.group
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизменившиеся страницы отдают 304 после одного запроса."""
+        # Группа и автор берутся из кеша объектов (posts.lookups).
+        pages = {
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 0,
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}): 0,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}):
+            1,
+        }
+        for page, queries in pages.items():
+            with self.subTest(page=page):
+                response = self.guest_client.get(page)
+                etag = response['ETag']
+                last_modified = response['Last-Modified']
+                with self.assertNumQueries(queries):
+                    response = self.guest_client.get(
+                        page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                response = self.guest_client.get(
+                    page, HTTP_IF_MODIFIED_SINCE=last_modified)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+
+    def test_changed_page_rendered(self):
+        """После нового поста страница группы отдаётся заново."""
+        page = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        etag = self.guest_client.get(page)['ETag']
+        Post.objects.create(text='Новый', author=self.user, group=self.group)
+        response = self.guest_client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_user(self):
+        """ETag страницы различается для разных пользователей."""
+        page = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        etag = self.guest_client.get(page)['ETag']
+        response = self.follower_client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_follow_index_changes_with_followed_author(self):
+        """Пост автора из подписок меняет ленту подписчика."""
+        page = reverse('posts:follow_index')
+        etag = self.follower_client.get(page)['ETag']
+        response = self.follower_client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(text='Для подписчиков', author=self.user)
+        response = self.follower_client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_post_does_not_touch_followers(self):
+        """Пост меняет отметку автора, а не ленты всех подписчиков."""
+        marker = get_marker(follow_scope(self.follower.pk))
+        Post.objects.create(text='Для подписчиков', author=self.user)
+        self.assertEqual(get_marker(follow_scope(self.follower.pk)), marker)
+
+    def test_index_waits_for_fragment_cache(self):
+        """Главная не отдаёт ETag, пока фрагмент может быть устаревшим."""
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('ETag'))
+
+
+class MarkerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_marker_survives_cache_loss(self):
+        """Отметка хранится в базе, кеш перед ней можно потерять."""
+        touch('test')
+        marker = get_marker('test')
+        cache.clear()
+        self.assertEqual(get_marker('test'), marker)
+
+    def test_local_cache_timeout(self):
+        """В LocMemCache процесса отметка живёт LOCAL_CACHE_TIMEOUT."""
+        self.assertFalse(is_shared(cache))
+        self.assertEqual(shared_timeout(cache, None),
+                         settings.LOCAL_CACHE_TIMEOUT)
+        self.assertEqual(shared_timeout(cache, 1), 1)
+
+    def test_change_from_other_process(self):
+        """Отметку, изменённую другим процессом, видно после таймаута."""
+        marker = get_marker('test')
+        # Другой процесс пишет в базу и в свой LocMemCache.
+        ChangeMarker.objects.filter(scope='test').update(changed=marker + 1)
+        self.assertEqual(get_marker('test'), marker)
+        # Запись в кеше процесса истекла.
+        cache.clear()
+        self.assertEqual(get_marker('test'), marker + 1)
+
+
+@override_settings(PAGE_SKELETON_CACHE_TIMEOUT=60)
+class SkeletonCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.user,
+            group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_skeleton_shared_with_authorized_user(self):
+        """Авторизованный пользователь получает общий каркас страницы."""
+        page = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        response = self.guest_client.get(page)
+        self.assertContains(response, 'Войти')
+        response = self.reader_client.get(page)
+        self.assertTemplateNotUsed(response, 'posts/group_list.html',
+                                   'Каркас не взят из кеша')
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertNotContains(response, 'Войти')
+        self.assertNotContains(response, '<!--hole:')
+
+    def test_skeleton_keyed_by_page(self):
+        """Ключ каркаса - номер страницы, а не вся строка запроса."""
+        page = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.guest_client.get(page)
+        response = self.reader_client.get(page, {'page': 1, 'utm': 'x'})
+        self.assertTemplateNotUsed(response, 'posts/group_list.html',
+                                   'Каркас не взят из кеша')
+        for query in ({'page': 'abc'}, {'page': 10 ** 6}):
+            with self.subTest(query=query):
+                self.guest_client.get(page, query)
+                response = self.reader_client.get(page, query)
+                self.assertTemplateUsed(response, 'posts/group_list.html')
+
+    def test_follow_button_filled_per_user(self):
+        """Кнопка подписки заполняется для текущего пользователя."""
+        page = reverse('posts:profile',
+                       kwargs={'username': self.user.username})
+        self.guest_client.get(page)
+        response = self.reader_client.get(page)
+        self.assertContains(response, 'Подписаться')
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.reader_client.get(page)
+        self.assertTemplateNotUsed(response, 'posts/profile.html',
+                                   'Каркас не взят из кеша')
+        self.assertContains(response, 'Отписаться')
+
+    def test_comment_form_filled_per_user(self):
+        """Форма комментария с CSRF заполняется поверх каркаса."""
+        page = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.guest_client.get(page)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        response = self.reader_client.get(page)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html',
+                                   'Каркас не взят из кеша')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_profile_follows_group_slug(self):
+        """После смены slug группы профиль ссылается на новый адрес."""
+        page = reverse('posts:profile',
+                       kwargs={'username': self.user.username})
+        self.guest_client.get(page)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        response = self.guest_client.get(page)
+        self.assertContains(
+            response,
+            reverse('posts:group_list', kwargs={'slug': 'renamed'})
+        )
+        self.assertNotContains(
+            response,
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        )
+
+
+class ObjectCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        caches[settings.OBJECT_CACHE_ALIAS].clear()
+
+    def test_lookup_cached(self):
+        """Повторный поиск группы и автора не обращается к базе."""
+        get_cached(Group, 'slug', self.group.slug)
+        get_cached(User, 'username', self.user.username)
+        with self.assertNumQueries(0):
+            group = get_cached(Group, 'slug', self.group.slug)
+            author = get_cached(User, 'username', self.user.username)
+        self.assertEqual(group, self.group)
+        self.assertEqual(author, self.user)
+
+    def test_missing_cached(self):
+        """Отсутствие объекта тоже кешируется."""
+        url = reverse('posts:group_list', kwargs={'slug': 'missing'})
+        self.assertEqual(self.client.get(url).status_code,
+                         HTTPStatus.NOT_FOUND)
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_cached(Group, 'slug', 'missing'))
+        Group.objects.create(title='Новая', slug='missing')
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
+
+    @override_settings(LOCAL_CACHE_TIMEOUT=0)
+    def test_local_cache_timeout(self):
+        """Переименование в другом процессе видно после LOCAL_CACHE_TIMEOUT."""
+        get_cached(Group, 'slug', self.group.slug)
+        # Другой процесс сбросил только свой кеш объектов.
+        Group.objects.filter(pk=self.group.pk).update(slug='renamed')
+        self.assertIsNone(get_cached(Group, 'slug', self.group.slug))
+        self.assertEqual(get_cached(Group, 'slug', 'renamed'), self.group)
+
+    def test_shared_cache_used(self):
+        """С общим кешем объекты лежат в нём дольше LOCAL_CACHE_TIMEOUT."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        shared = {**settings.CACHES, 'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory,
+        }}
+        with override_settings(CACHES=shared, LOCAL_CACHE_TIMEOUT=0):
+            get_cached(Group, 'slug', self.group.slug)
+            with self.assertNumQueries(0):
+                self.assertEqual(
+                    get_cached(Group, 'slug', self.group.slug), self.group
+                )
+
+    def test_invalidated_on_save(self):
+        """После переименования старый адрес профиля отдаёт 404."""
+        user = User.objects.create_user(username='old-name')
+        get_cached(User, 'username', 'old-name')
+        user.username = 'renamed'
+        user.save()
+        self.assertIsNone(get_cached(User, 'username', 'old-name'))
+        self.assertEqual(get_cached(User, 'username', 'renamed').pk, user.pk)
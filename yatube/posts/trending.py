@@ -0,0 +1,216 @@
+"""Популярные посты: счёт с экспоненциальным затуханием.
+
+Событие веса w в момент t прибавляет к счёту поста
+w * 2 ** ((t - EPOCH) / TRENDING_HALF_LIFE). Это прямое затухание:
+старые вклады не пересчитываются, а новые весят больше, так что посты
+упорядочены так же, как если бы все счёты вдвое уменьшались за
+TRENDING_HALF_LIFE секунд. Хранится натуральный логарифм счёта, поэтому
+числа не переполняются. События - публикация поста, комментарий и
+просмотры из сброса posts.counters; веса - в TRENDING_WEIGHTS. Каждое
+событие меняет только строки TrendingEntry своего поста.
+
+Полный счёт каждого поста копится в списке TOTAL_SCOPE без ограничения
+размера. Для сайта и каждой группы хранится не больше TRENDING_SIZE
+лучших постов: пост попадает в полный список, только если его полный
+счёт выше последнего, и вытесняет последний. Вытесненный пост не теряет
+счёт и вернётся в список, когда наберёт больше. Страница популярного
+читает эти строки и сами посты, без подсчётов по комментариям.
+
+Посты и комментарии, записанные без сигналов (bulk_create, загрузка
+дампа), а также данные до появления популярного учитывает rebuild -
+manage.py rebuild_trending.
+"""
+import datetime as dt
+import heapq
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .markers import group_scope, site_scope
+from .models import Comment, Post, TrendingEntry, ViewCounter
+from .sharding import get_shards
+
+EPOCH = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+TOTAL_SCOPE = 'total'
+
+
+def log_weight(weight, when) -> float:
+    """Логарифм вклада события веса weight в момент when."""
+    age = (when - EPOCH).total_seconds()
+    return math.log(weight) + math.log(2) * age / settings.TRENDING_HALF_LIFE
+
+
+def log_add(first, second) -> float:
+    """log(e ** first + e ** second) без переполнения."""
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _scopes(group_id):
+    if group_id is None:
+        return (site_scope(),)
+    return (site_scope(), group_scope(group_id))
+
+
+def _add_totals(scores) -> dict:
+    """Прибавляет {id поста: логарифм вклада} к полным счётам постов.
+
+    Возвращает новые полные счёты этих постов.
+    """
+    entries = list(TrendingEntry.objects.select_for_update().filter(
+        scope=TOTAL_SCOPE, post_id__in=scores
+    ))
+    for entry in entries:
+        entry.score = log_add(entry.score, scores[entry.post_id])
+    TrendingEntry.objects.bulk_update(entries, ['score'])
+    totals = {entry.post_id: entry.score for entry in entries}
+    TrendingEntry.objects.bulk_create(
+        TrendingEntry(scope=TOTAL_SCOPE, post_id=post_id, score=score)
+        for post_id, score in scores.items() if post_id not in totals
+    )
+    return {**scores, **totals}
+
+
+def _update_scope(scope, totals):
+    """Ставит полные счёты {id поста: счёт} в ограниченный список scope."""
+    entries = list(TrendingEntry.objects.select_for_update().filter(
+        scope=scope, post_id__in=totals
+    ))
+    for entry in entries:
+        entry.score = totals[entry.post_id]
+    TrendingEntry.objects.bulk_update(entries, ['score'])
+    known = {entry.post_id for entry in entries}
+    size = settings.TRENDING_SIZE
+    ranked = TrendingEntry.objects.filter(scope=scope).order_by('-score')
+    floor = ranked.values_list('score', flat=True)[size - 1:size].first()
+    created = TrendingEntry.objects.bulk_create(
+        TrendingEntry(scope=scope, post_id=post_id, score=score)
+        for post_id, score in totals.items()
+        if post_id not in known and (floor is None or score > floor)
+    )
+    if created:
+        stale = list(ranked.values_list('pk', flat=True)[size:])
+        TrendingEntry.objects.filter(pk__in=stale).delete()
+
+
+def record(kind, events, when=None):
+    """Прибавляет события вида kind к счётам постов.
+
+    events - [(id поста, id группы или None, число событий)].
+    """
+    when = when or timezone.now()
+    weight = settings.TRENDING_WEIGHTS[kind]
+    scores, groups = {}, {}
+    for post_id, group_id, count in events:
+        if count <= 0:
+            continue
+        value = log_weight(weight * count, when)
+        scores[post_id] = (
+            log_add(scores[post_id], value) if post_id in scores else value
+        )
+        groups[post_id] = group_id
+    if not scores:
+        return
+    with transaction.atomic():
+        totals = _add_totals(scores)
+        by_scope = {}
+        for post_id, score in totals.items():
+            for scope in _scopes(groups[post_id]):
+                by_scope.setdefault(scope, {})[post_id] = score
+        for scope, values in by_scope.items():
+            _update_scope(scope, values)
+
+
+def regroup(post_id, old_group_id, new_group_id):
+    """Переносит счёт поста из списка старой группы в список новой."""
+    with transaction.atomic():
+        if old_group_id is not None:
+            TrendingEntry.objects.filter(
+                scope=group_scope(old_group_id), post_id=post_id
+            ).delete()
+        score = TrendingEntry.objects.filter(
+            scope=TOTAL_SCOPE, post_id=post_id
+        ).values_list('score', flat=True).first()
+        if new_group_id is not None and score is not None:
+            _update_scope(group_scope(new_group_id), {post_id: score})
+
+
+def _collect_totals():
+    """Полные счёты {id поста: счёт} и группы {id поста: id группы}.
+
+    Время просмотров не хранится, они считаются на момент публикации
+    поста.
+    """
+    weights = settings.TRENDING_WEIGHTS
+    totals, groups, published = {}, {}, {}
+
+    def add(post_id, weight, when):
+        value = log_weight(weight, when)
+        totals[post_id] = (
+            log_add(totals[post_id], value) if post_id in totals else value
+        )
+
+    for alias in get_shards():
+        for post_id, group_id, pub_date in Post.objects.using(
+            alias
+        ).values_list('pk', 'group_id', 'pub_date').iterator():
+            groups[post_id], published[post_id] = group_id, pub_date
+            add(post_id, weights['post'], pub_date)
+        for post_id, created in Comment.objects.using(alias).values_list(
+            'post_id', 'created'
+        ).iterator():
+            if post_id in published:
+                add(post_id, weights['comment'], created)
+    for post_id, views in ViewCounter.objects.filter(
+        kind=ViewCounter.POST, views__gt=0
+    ).values_list('object_id', 'views').iterator():
+        if post_id in published:
+            add(post_id, weights['view'] * views, published[post_id])
+    return totals, groups
+
+
+def rebuild() -> int:
+    """Пересчитывает все счёты по постам, комментариям и просмотрам.
+
+    Возвращает число постов со счётом.
+    """
+    totals, groups = _collect_totals()
+    ranked = {}
+    for post_id, score in totals.items():
+        for scope in _scopes(groups[post_id]):
+            ranked.setdefault(scope, []).append((score, post_id))
+    entries = [
+        TrendingEntry(scope=TOTAL_SCOPE, post_id=post_id, score=score)
+        for post_id, score in totals.items()
+    ]
+    for scope, scores in ranked.items():
+        entries.extend(
+            TrendingEntry(scope=scope, post_id=post_id, score=score)
+            for score, post_id in heapq.nlargest(
+                settings.TRENDING_SIZE, scores
+            )
+        )
+    with transaction.atomic():
+        TrendingEntry.objects.all().delete()
+        TrendingEntry.objects.bulk_create(entries, batch_size=1000)
+    return len(totals)
+
+
+def top_post_ids(scope) -> list:
+    return list(TrendingEntry.objects.filter(
+        scope=scope
+    ).order_by('-score', 'post_id').values_list('post_id', flat=True))
+
+
+def load_posts(post_ids) -> list:
+    """Посты с авторами и группами в порядке post_ids."""
+    posts = {}
+    for alias in get_shards():
+        posts.update(
+            (post.pk, post) for post in Post.objects.using(alias).filter(
+                pk__in=post_ids
+            ).select_related('author', 'group')
+        )
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
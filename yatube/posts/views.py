@@ -2,29 +2,50 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, render, redirect
 
+from core.sqlite import serialized_write
+
 from .forms import PostForm, CommentForm
 from .models import Group, Post, Follow
-from .common import paginator
+from .common import CommentsBatch, paginator
+from .counters import count_views
+from .lookups import get_cached_or_404
+from .conditional import (follow_scopes, group_scopes, index_scopes,
+                          page_condition, post_scopes, profile_scopes,
+                          profile_skeleton_scopes, skeleton_cache)
+from .markers import (author_scope, get_markers, group_scope, post_scope,
+                      site_scope)
+from .sharding import db_for_post, followed_authors, sharded_posts
+from .tasks import make_thumbnail
+from .trending import load_posts, top_post_ids
 
 User = get_user_model()
 
 NUM_OF_POSTS: int = 10
+NUM_OF_COMMENTS: int = 20
+# Время жизни фрагмента index_page в шаблоне posts/index.html.
+INDEX_CACHE_TIMEOUT: int = 20
 
 
+@page_condition(index_scopes, settle=INDEX_CACHE_TIMEOUT)
+@skeleton_cache(index_scopes, settle=INDEX_CACHE_TIMEOUT)
 def index(request):
     """Отображает главную страницу."""
     template = 'posts/index.html'
-    posts = Post.objects.select_related('author').all()
+    posts = sharded_posts(lambda posts: posts.select_related('author'))
     page_obj = paginator(posts, NUM_OF_POSTS, request)
     context = {'page_obj': page_obj}
     return render(request, template, context)
 
 
+@page_condition(group_scopes)
+@skeleton_cache(group_scopes)
 def group_posts(request, slug):
     """Отображает страницу группы."""
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author').all()
+    group = get_cached_or_404(Group, 'slug', slug)
+    posts = sharded_posts(
+        lambda posts: posts.filter(group=group).select_related('author')
+    )
     page_obj = paginator(posts, NUM_OF_POSTS, request)
     context = {
         'group': group,
@@ -33,28 +54,69 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+def render_popular(request, scope, group=None):
+    """Страница лучших постов списка scope (posts.trending)."""
+    template = 'posts/popular.html'
+    page_obj = paginator(top_post_ids(scope), NUM_OF_POSTS, request)
+    page_obj.object_list = load_posts(page_obj.object_list)
+    context = {
+        'group': group,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
+def popular(request):
+    """Популярные посты сайта."""
+    return render_popular(request, site_scope())
+
+
+def group_popular(request, slug):
+    """Популярные посты группы."""
+    group = get_cached_or_404(Group, 'slug', slug)
+    return render_popular(request, group_scope(group.pk), group)
+
+
+@page_condition(profile_scopes)
+@skeleton_cache(profile_skeleton_scopes)
 def profile(request, username):
     """Страница профиля."""
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    following = (request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author
-    ).exists())
+    author = get_cached_or_404(User, 'username', username)
     posts = author.posts.all()
     page_obj = paginator(posts, NUM_OF_POSTS, request)
     context = {
         'page_obj': page_obj,
         'author': author,
-        'following': following
     }
     return render(request, template, context)
 
 
+def post_cache_version(post):
+    """Версия закешированной страницы поста.
+
+    Меняется при правке поста, новом комментарии, изменении данных
+    автора или группы.
+    """
+    scopes = [post_scope(post.pk), author_scope(post.author_id)]
+    if post.group_id is not None:
+        scopes.append(group_scope(post.group_id))
+    return '-'.join(str(marker) for marker in get_markers(*scopes))
+
+
+@count_views
+@page_condition(post_scopes)
+@skeleton_cache(post_scopes)
 def post_detail(request, post_id):
     """Страница поста."""
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.using(db_for_post(post_id)).select_related(
+            'author', 'group'
+        ),
+        pk=post_id
+    )
+    comments = CommentsBatch(post.pk, NUM_OF_COMMENTS)
     form = CommentForm()
     if request.method == 'POST':
         if form.is_valid():
@@ -66,7 +128,23 @@ def post_detail(request, post_id):
     context = {
         'post': post,
         'comments': comments,
-        'form': form
+        'form': form,
+        'cache_version': post_cache_version(post),
+    }
+    return render(request, template, context)
+
+
+def comments_batch(request, post_id, after):
+    """Следующая порция комментариев поста."""
+    template = 'posts/includes/comments.html'
+    comments = CommentsBatch(post_id, NUM_OF_COMMENTS, after=after)
+    if not comments.object_list:
+        # Пустая порция - конец комментариев или поста нет.
+        get_object_or_404(Post.objects.using(db_for_post(post_id)),
+                          pk=post_id)
+    context = {
+        'post_id': post_id,
+        'comments': comments,
     }
     return render(request, template, context)
 
@@ -81,7 +159,7 @@ def post_create(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            serialized_write(post.save)()
             return redirect('posts:profile', username)
         return render(request, template, {'form': form})
     context = {'form': form}
@@ -93,7 +171,8 @@ def post_edit(request, post_id):
     """Редактирование поста."""
     template = 'posts/create_post.html'
     user = request.user
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.using(db_for_post(post_id)),
+                             pk=post_id)
     if user != post.author:
         return redirect('posts:post_detail', post_id)
     is_edit = True
@@ -102,7 +181,9 @@ def post_edit(request, post_id):
         files=request.FILES or None,
         instance=post)
     if form.is_valid():
-        post.save()
+        serialized_write(post.save)()
+        if 'image' in form.changed_data and post.image:
+            make_thumbnail.delay(post.pk, dedupe_key=f'thumbnail:{post.pk}')
         return redirect('posts:post_detail', post_id)
     return render(request, template, {
         'form': form,
@@ -114,18 +195,21 @@ def post_edit(request, post_id):
 def add_comment(request, post_id):
     """Создание комментария."""
     form = CommentForm(request.POST or None)
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.using(db_for_post(post_id)),
+                             pk=post_id)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        serialized_write(comment.save)()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@page_condition(follow_scopes)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    authors = followed_authors(request.user)
+    posts = sharded_posts(lambda posts: posts.filter(author__in=authors))
     page_obj = paginator(posts, NUM_OF_POSTS, request)
     context = {
         'page_obj': page_obj,
@@ -135,9 +219,9 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_cached_or_404(User, 'username', username)
     if author != request.user:
-        Follow.objects.get_or_create(
+        serialized_write(Follow.objects.get_or_create)(
             user=request.user,
             author=author
         )
@@ -146,6 +230,8 @@ def profile_follow(request, username):
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    Follow.objects.filter(author=author, user=request.user).delete()
+    author = get_cached_or_404(User, 'username', username)
+    serialized_write(
+        Follow.objects.filter(author=author, user=request.user).delete
+    )()
     return redirect('posts:follow_index')
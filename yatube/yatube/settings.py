@@ -46,17 +46,28 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'diagnostics.apps.DiagnosticsConfig',
+    'jobs.apps.JobsConfig',
+    'mailer.apps.MailerConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'diagnostics.tracing.TracingMiddleware',
+    'diagnostics.metrics.MetricsMiddleware',
+    'diagnostics.sqllog.QueryLogMiddleware',
+    'diagnostics.memory.MemoryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'diagnostics.profiling.ProfilingMiddleware',
+    'core.replicas.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.holes.HoleMiddleware',
+    'diagnostics.tracing.ViewTracingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -64,7 +75,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'diagnostics.metrics.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,6 +86,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
             ],
+            'builtins': ['diagnostics.templatetags.tracing'],
         },
     },
 ]
@@ -92,6 +104,214 @@ DATABASES = {
     }
 }
 
+# Прагмы каждого соединения с SQLite (core.sqlite.configure_connection).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Сколько раз повторять запись, упавшую с «database is locked».
+SQLITE_WRITE_RETRIES = 3
+# Выстраивать записи процесса в очередь (core.sqlite.serialized_write).
+SQLITE_SERIALIZE_WRITES = True
+
+# Реплики для чтения (core.replicas.ReplicaRouter). Локально реплики -
+# отдельные файлы SQLite, которые обновляет manage.py sync_replicas.
+DATABASE_REPLICAS = []
+for number in range(1, int(os.getenv('YATUBE_DB_REPLICAS', 0)) + 1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db_{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+# Шарды постов и комментариев (см. posts.sharding). По умолчанию всё
+# лежит в основной базе.
+POSTS_SHARDS = ['default']
+if int(os.getenv('YATUBE_POST_SHARDS', 0)):
+    POSTS_SHARDS = []
+    for number in range(1, int(os.getenv('YATUBE_POST_SHARDS')) + 1):
+        alias = f'shard_{number}'
+        DATABASES[alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, f'db_{alias}.sqlite3'),
+        }
+        POSTS_SHARDS.append(alias)
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.replicas.ReplicaRouter',
+]
+
+# Сколько секунд после записи клиент читает только из основной базы.
+REPLICA_PIN_SECONDS = 5
+
+
+# Профилирование запросов (diagnostics.profiling). Профиль снимается по
+# заголовку X-Profile с токеном из manage.py profile_token или для доли
+# PROFILING_SAMPLE_RATE запросов.
+PROFILING_ENABLED = bool(int(os.getenv('YATUBE_PROFILING', 0)))
+PROFILING_SAMPLE_RATE = float(os.getenv('YATUBE_PROFILING_SAMPLE_RATE', 0))
+PROFILING_MODE = 'sampling'
+PROFILING_INTERVAL = 0.005
+PROFILING_SPOOL_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_KEEP = 500
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+
+# Метрики для Prometheus (diagnostics.metrics) на /metrics/. При
+# нескольких процессах укажите общий каталог YATUBE_METRICS_DIR и очищайте
+# его при запуске сервера. Страницы /metrics/ и /memory/ отдаются по
+# заголовку "Authorization: Bearer <YATUBE_METRICS_TOKEN>". Без токена они
+# закрыты; METRICS_ALLOWED_IPS проверяет REMOTE_ADDR, за прокси это адрес
+# самого прокси, поэтому заполняйте список, только если сервер принимает
+# запросы напрямую.
+METRICS_DIR = os.getenv('YATUBE_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1
+METRICS_TOKEN = os.getenv('YATUBE_METRICS_TOKEN')
+METRICS_ALLOWED_IPS = []
+
+
+# Трассировка запросов (diagnostics.tracing). Записываются запросы
+# дольше TRACING_SLOW_MS, ответы 5xx и доля TRACING_SAMPLE_RATE остальных.
+TRACING_ENABLED = bool(int(os.getenv('YATUBE_TRACING', 0)))
+TRACING_FILE = os.path.join(BASE_DIR, 'traces.jsonl')
+TRACING_SLOW_MS = 500
+TRACING_SAMPLE_RATE = 0.01
+TRACING_MAX_SPANS = 2000
+THUMBNAIL_BACKEND = 'diagnostics.tracing.ThumbnailBackend'
+
+
+# Сводка SQL по отпечаткам и журнал медленных запросов (diagnostics.sqllog).
+# Включается YATUBE_SQL_STATS=1 или каталогом YATUBE_SQL_STATS_DIR, куда
+# пишутся сводки процессов.
+SQL_SLOW_MS = 100
+SQL_STATS_DIR = os.getenv('YATUBE_SQL_STATS_DIR')
+SQL_STATS_ENABLED = (bool(int(os.getenv('YATUBE_SQL_STATS', 0)))
+                     or bool(SQL_STATS_DIR))
+SQL_STATS_FLUSH_INTERVAL = 5
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'slow_queries.log'),
+            'delay': True,
+        },
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'diagnostics.sqllog': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'core.warmup': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+
+# Замеры памяти по view (diagnostics.memory), сводка на /memory/. Запросы
+# сверх бюджета view пишутся в журнал с местами выделений.
+MEMORY_PROFILING_ENABLED = bool(int(os.getenv('YATUBE_MEMORY_PROFILING', 0)))
+MEMORY_TRACE_FRAMES = 1
+MEMORY_TOP_SITES = 10
+MEMORY_DEFAULT_BUDGET = None
+MEMORY_BUDGETS = {
+    'posts:post_detail': 8 * 1024 * 1024,
+    'admin:posts_post_changelist': 16 * 1024 * 1024,
+}
+
+
+# Прогрев процесса в yatube/wsgi.py (core.warmup): фазы по порядку.
+WARMUP_ENABLED = bool(int(os.getenv('YATUBE_WARMUP', 1)))
+WARMUP_PHASES = [
+    'templates', 'urls', 'thumbnails', 'connections', 'index', 'pages',
+]
+# Сколько горячих страниц фаза pages кладёт в LocMemCache процесса.
+WARMUP_PAGES = {'index_pages': 2, 'authors': 20, 'posts': 50}
+
+
+# Очередь фоновых задач (jobs). Воркеры: manage.py run_jobs. При
+# JOBS_EAGER задачи выполняются сразу, без очереди.
+JOBS_EAGER = False
+JOBS_PROCESSES = 2
+JOBS_POLL_INTERVAL = 1
+JOBS_SCHEDULER_INTERVAL = 30
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_DELAY = 30
+JOBS_LOCK_TIMEOUT = 30 * 60
+JOBS_KEEP_DONE = 7 * 24 * 60 * 60
+JOBS_SCHEDULE = {
+    'prune-jobs': {'task': 'jobs.prune', 'cron': '30 3 * * *'},
+    # Подбирает письма, отложенные после ошибки отправки.
+    'send-mail': {'task': 'mailer.send', 'cron': '* * * * *',
+                  'dedupe_key': 'mailer:send'},
+    'weekly-digest': {'task': 'posts.send_digest', 'cron': '0 8 * * 1'},
+}
+
+
+# Исходящая почта (mailer): EMAIL_BACKEND кладёт письма в очередь, задача
+# mailer.send отправляет их пачками через MAILER_BACKEND. Для проверки
+# SMTP локально: manage.py run_smtp и YATUBE_MAILER_BACKEND=
+# django.core.mail.backends.smtp.EmailBackend.
+MAILER_BACKEND = os.getenv(
+    'YATUBE_MAILER_BACKEND',
+    'django.core.mail.backends.filebased.EmailBackend'
+)
+MAILER_BATCH_SIZE = 50
+MAILER_MAX_ATTEMPTS = 5
+MAILER_RETRY_DELAY = 60
+
+
+# Просмотры постов (posts.counters) копятся в процессе и пишутся в базу
+# фоновым потоком (его включает yatube/wsgi.py) раз в
+# VIEWS_FLUSH_INTERVAL секунд, 0 - поток не запускается. Читатели
+# считаются HyperLogLog размером 2 ** VIEWS_HLL_PRECISION байт.
+VIEWS_FLUSH_INTERVAL = 10
+VIEWS_HLL_PRECISION = 11
+
+
+# Популярные посты (posts.trending): вклад публикации, комментария и
+# просмотра с весами TRENDING_WEIGHTS вдвое теряет вес за
+# TRENDING_HALF_LIFE секунд; для сайта и каждой группы хранится
+# TRENDING_SIZE лучших постов.
+TRENDING_HALF_LIFE = 24 * 60 * 60
+TRENDING_SIZE = 100
+TRENDING_WEIGHTS = {'post': 5, 'comment': 3, 'view': 1}
+
+
+# Дайджест подписок (posts.digest): посты с прошлой рассылки, не больше
+# DIGEST_MAX_POSTS в письме; письма уходят пачками по DIGEST_BATCH_SIZE.
+SITE_URL = os.getenv('YATUBE_SITE_URL', 'http://localhost:8000')
+DIGEST_PERIOD = 7 * 24 * 60 * 60
+DIGEST_MAX_POSTS = 10
+DIGEST_BATCH_SIZE = 100
+
+
+# Сессии и пользователь сессии читаются из кеша (core.sessions, core.auth)
+# только с общим кешем по умолчанию (YATUBE_CACHE_BACKEND). С LocMemCache,
+# как в настройках по умолчанию, выход в одном процессе не дошёл бы до
+# остальных: сессия и пользователь читаются из базы, запросы не экономятся.
+SESSION_ENGINE = 'core.sessions'
+AUTHENTICATION_BACKENDS = [
+    'core.auth.CachedModelBackend',
+    # Для сессий, созданных до перехода на кешируемый бэкенд.
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -133,7 +353,11 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_BACKEND = 'mailer.backends.QueuedEmailBackend'
+
+EMAIL_HOST = os.getenv('YATUBE_EMAIL_HOST', 'localhost')
+
+EMAIL_PORT = int(os.getenv('YATUBE_EMAIL_PORT', 1025))
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -146,8 +370,38 @@ CSRF_FAILURE_VIEW = 'core.views.permission_denied'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кеш по умолчанию должен быть общим для процессов сервера (memcached,
+# файловый, в базе): YATUBE_CACHE_BACKEND и YATUBE_CACHE_LOCATION.
+# LocMemCache живёт в процессе, поэтому то, что сбрасывается из другого
+# процесса, в нём держится не дольше LOCAL_CACHE_TIMEOUT секунд или не
+# кешируется (core.caches). MeteredCache считает попадания в любом
+# бэкенде METERED_BACKEND (diagnostics.metrics).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'diagnostics.metrics.MeteredCache',
+        'METERED_BACKEND': os.getenv(
+            'YATUBE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'METERED_ALIAS': 'default',
+        'LOCATION': os.getenv('YATUBE_CACHE_LOCATION', ''),
+    },
+    # Группы и пользователи по slug и username (posts.lookups), пока кеш
+    # по умолчанию - LocMemCache; с общим кешем объекты лежат в нём.
+    'objects': {
+        'BACKEND': 'diagnostics.metrics.MeteredCache',
+        'METERED_BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'METERED_ALIAS': 'objects',
+        'LOCATION': 'objects',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
 }
+OBJECT_CACHE_ALIAS = 'objects'
+LOCAL_CACHE_TIMEOUT = 5
+
+# Время жизни общих каркасов страниц (posts.conditional.skeleton_cache),
+# 0 - кеш каркасов выключен. Персональные куски страниц заполняются
+# core.holes.HoleMiddleware при каждом запросе.
+PAGE_SKELETON_CACHE_TIMEOUT = 5 * 60
+# manage.py test выключает кеш каркасов (core.testing.TestRunner).
+TEST_RUNNER = 'core.testing.TestRunner'
@@ -29,6 +29,7 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('', include('diagnostics.urls', namespace='diagnostics')),
 ]
 
 if settings.DEBUG:
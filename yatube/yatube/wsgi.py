@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+if settings.VIEWS_FLUSH_INTERVAL:
+    from posts.counters import start_flushing
+    start_flushing()
+
+if settings.WARMUP_ENABLED:
+    from core.warmup import close_connections, warm_up
+    warm_up(application)
+    # Открытые при прогреве соединения не должны достаться дочерним
+    # процессам (gunicorn --preload): перед fork родитель их закрывает.
+    os.register_at_fork(before=close_connections)